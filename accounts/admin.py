@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CustomUser, Notification
+from .models import CustomUser, Notification, OutboundEmail
 from django.utils.html import format_html
 
 
@@ -22,4 +22,13 @@ class CustomUserAdmin(admin.ModelAdmin):
         if obj.profile_image:
             return format_html('<img src="{}" width="50" height="50" style="object-fit: cover; border-radius: 50%;" />',
                                 obj.profile_image.url)
-        return "No Image"
\ No newline at end of file
+        return "No Image"
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'created_at', 'sent_at')
+    search_fields = ('to_email', 'subject')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'sent_at')
+
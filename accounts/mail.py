@@ -0,0 +1,142 @@
+"""
+Outbound email queue.
+
+Request handlers call queue_email / queue_emails, which only INSERT into
+OutboundEmail and return immediately. The send_queued_emails worker calls
+deliver_queued_emails, which sends a batch over ONE mail connection and
+reschedules failures with exponential backoff.
+
+A batch is claimed (QUEUED → SENDING) in its own short transaction, sent
+with no transaction or row locks held, and then the results are written
+back. If a worker dies mid-batch its SENDING rows become claimable again
+after EMAIL_QUEUE_CLAIM_MINUTES.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(to_email, subject, body, from_email=None):
+    return OutboundEmail.objects.create(
+        to_email=to_email,
+        subject=subject[:255],
+        body=body,
+        from_email=from_email,
+    )
+
+
+def queue_emails(messages):
+    """
+    messages: iterable of (to_email, subject, body). One INSERT per 500.
+    """
+    return OutboundEmail.objects.bulk_create(
+        [
+            OutboundEmail(to_email=to_email, subject=subject[:255], body=body)
+            for to_email, subject, body in messages
+        ],
+        batch_size=500,
+    )
+
+
+def _claim_batch(batch_size, now):
+    """
+    Mark up to batch_size due emails SENDING and commit, so other workers
+    skip them while they are being sent. The claim doubles as a lease:
+    next_attempt_at is pushed out and a crashed worker's rows come back.
+    """
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status="QUEUED", next_attempt_at__isnull=True)
+                | Q(status__in=["QUEUED", "SENDING"], next_attempt_at__lte=now)
+            )
+            .order_by("id")[:batch_size]
+        )
+
+        lease = now + timedelta(minutes=settings.EMAIL_QUEUE_CLAIM_MINUTES)
+        for email in emails:
+            email.status = "SENDING"
+            email.attempts += 1
+            email.next_attempt_at = lease
+        OutboundEmail.objects.bulk_update(emails, ["status", "attempts", "next_attempt_at"])
+
+    return emails
+
+
+def deliver_queued_emails(batch_size=None, connection=None):
+    """
+    Send up to batch_size due emails, oldest first, over one connection.
+    Safe to run from several workers: each claims its own batch first.
+
+    Returns: (sent, failed)
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    now = timezone.now()
+    sent = failed = 0
+
+    emails = _claim_batch(batch_size, now)
+    if not emails:
+        return 0, 0
+
+    connection = connection or get_connection()
+
+    try:
+        connection.open()
+    except Exception as e:
+        # Server unreachable: push the whole batch back instead of
+        # burning an attempt per message
+        logger.warning("Could not open mail connection: %s", e)
+        OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            status="QUEUED",
+            attempts=F("attempts") - 1,
+            next_attempt_at=now + timedelta(seconds=30),
+            last_error=str(e),
+        )
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+                to=[email.to_email],
+                connection=connection,
+            )
+
+            try:
+                message.send()
+                email.status = "SENT"
+                email.sent_at = timezone.now()
+                email.next_attempt_at = None
+                email.last_error = None
+                sent += 1
+            except Exception as e:
+                logger.warning("Email %s to %s failed: %s", email.id, email.to_email, e)
+                email.last_error = str(e)
+                # Back off 1, 2, 4, 8... minutes before the next try
+                email.next_attempt_at = now + timedelta(minutes=2 ** (email.attempts - 1))
+                email.status = "FAILED" if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS else "QUEUED"
+                failed += 1
+    finally:
+        connection.close()
+
+        # Whatever was decided is recorded, even if the loop blew up
+        OutboundEmail.objects.bulk_update(
+            [email for email in emails if email.status != "SENDING"],
+            ["status", "last_error", "next_attempt_at", "sent_at"],
+        )
+
+    return sent, failed
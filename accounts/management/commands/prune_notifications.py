@@ -0,0 +1,58 @@
+"""
+prune_notifications.py
+----------------------
+Django management command to delete READ in-app notifications older than
+the retention window. Unread notifications are never pruned.
+
+Deletes in id chunks so a large backlog never holds long locks.
+Schedule it (cron) e.g. once a day.
+
+Usage:
+    python manage.py prune_notifications
+    python manage.py prune_notifications --days 30 --chunk-size 500
+    python manage.py prune_notifications --dry-run
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import Notification
+from accounts.notifications import prune_read_notifications
+
+
+class Command(BaseCommand):
+    help = "Deletes read notifications older than the retention window in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.NOTIFICATION_RETENTION_DAYS,
+            help="Keep read notifications newer than this many days.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Notifications deleted per DELETE statement.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count what would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+
+        if options["dry_run"]:
+            count = Notification.objects.filter(is_read=True, created_at__lt=before).count()
+            self.stdout.write(self.style.WARNING(f"[dry run] {count} notification(s) would be deleted"))
+            return
+
+        deleted = prune_read_notifications(before, batch_size=options["chunk_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Pruned {deleted} read notification(s)"))
@@ -115,6 +115,8 @@ class Command(BaseCommand):
         from groups.models import Group
         from expenses.models import Expense, ExpenseSplit
         from payments.models import Settlement
+        from groups.counters import repair_group_counters
+        from expenses.balances import rebuild_pairwise_balances
 
         self.stdout.write(self.style.WARNING("\n🌱 Starting Paynion demo data seed...\n"))
 
@@ -234,6 +236,10 @@ class Command(BaseCommand):
             except Group.DoesNotExist:
                 pass
 
+        # Seeded rows bypass the views, so rebuild the derived tables once
+        repair_group_counters()
+        rebuild_pairwise_balances()
+
         self.stdout.write(self.style.SUCCESS("\n✅ Seed complete! Your dashboard should now look full.\n"))
         self.stdout.write("   Demo user password: Demo@1234")
         self.stdout.write("   Demo emails: priya.sharma@paynion.demo, rahul.verma@paynion.demo, etc.\n")
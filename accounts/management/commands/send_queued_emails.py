@@ -0,0 +1,52 @@
+"""
+send_queued_emails.py
+---------------------
+Django management command (background worker) that delivers the
+OutboundEmail queue.
+
+Emails are sent in batches, each batch over a single SMTP connection.
+Failed sends are retried with backoff up to EMAIL_QUEUE_MAX_ATTEMPTS.
+Several copies can run at once - each claims different emails.
+
+Usage:
+    python manage.py send_queued_emails            # drain once and exit
+    python manage.py send_queued_emails --loop     # keep polling
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.mail import deliver_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Sends queued outbound emails."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new emails.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep when there is nothing to send (with --loop).",
+        )
+        parser.add_argument("--batch-size", type=int, default=None, help="Emails sent per connection.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = deliver_queued_emails(batch_size=options["batch_size"])
+            total_sent += sent
+            total_failed += failed
+
+            if sent:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Sent {total_sent} email(s), {total_failed} failed attempt(s)"
+        ))
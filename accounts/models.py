@@ -20,6 +20,11 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'full_name']   # keep username but don't use for login
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["full_name"]),   # member picker prefix search
+        ]
+
     def __str__(self):
         return self.email
 
@@ -33,9 +38,46 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"]),            # feed (keyset)
+            models.Index(fields=["user", "is_read"]),               # unread count / mark all read
+            models.Index(fields=["is_read", "created_at"]),         # retention prune
+        ]
+
     def __str__(self):
         return self.message
-    
 
 
+class OutboundEmail(models.Model):
+    """
+    Outgoing mail queue. Views only insert rows (queue_email); the
+    send_queued_emails worker delivers them in batches over one SMTP
+    connection and retries failures with backoff.
+    """
+    STATUS_CHOICES = [
+        ("QUEUED", "Queued"),
+        ("SENDING", "Sending"),
+        ("SENT", "Sent"),
+        ("FAILED", "Failed"),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="QUEUED")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.to_email}"
 
@@ -0,0 +1,117 @@
+"""
+In-app notifications: writing, the cached unread counter, the feed and
+retention.
+
+Every write goes through notify / notify_all / mark_read / mark_all_read so
+the per-user unread counter in the cache stays in step with the rows. Writes never
+store a value: once the transaction commits they delete the user's cached
+count, and the next unread_count() recounts it with one indexed COUNT. That
+stays correct on backends whose incr is a plain get-then-set (the database
+cache) and can't overwrite a concurrent writer's change.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from paynion.pagination import keyset_page
+from .models import Notification
+
+NOTIFICATION_PAGE_SIZE = 20
+
+
+def _cache_key(user_id):
+    return f"accounts:unread_notifications:{user_id}"
+
+
+def _invalidate_unread(*user_ids):
+    keys = [_cache_key(user_id) for user_id in set(user_ids)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# =================== WRITING ===================
+
+def notify(user, message):
+    notification = Notification.objects.create(user=user, message=message[:255])
+    _invalidate_unread(notification.user_id)
+    return notification
+
+
+def notify_all(notifications):
+    """
+    bulk_create unsaved Notification rows and drop each recipient's cached counter once.
+    """
+    notifications = Notification.objects.bulk_create(list(notifications))
+    if notifications:
+        _invalidate_unread(*(n.user_id for n in notifications))
+    return notifications
+
+
+def mark_read(user, notification_ids):
+    """
+    One UPDATE; the counter is only dropped if a row was actually unread.
+    Returns: number of notifications marked read
+    """
+    updated = Notification.objects.filter(
+        user=user, id__in=notification_ids, is_read=False
+    ).update(is_read=True)
+
+    if updated:
+        _invalidate_unread(user.id)
+    return updated
+
+
+def mark_all_read(user):
+    updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    _invalidate_unread(user.id)
+    return updated
+
+
+# =================== READING ===================
+
+def unread_count(user):
+    key = _cache_key(user.id)
+    count = cache.get(key)
+    if count is None:
+        unread = Notification.objects.filter(user=user, is_read=False)
+        count = unread.count()
+        # add, not set: never overwrite what a concurrent reader cached
+        if cache.add(key, count, settings.NOTIFICATION_UNREAD_CACHE_SECONDS):
+            # A write that committed between the COUNT and the add deleted a
+            # key that wasn't there yet - recount once and drop it if it moved
+            recount = unread.count()
+            if recount != count:
+                cache.delete(key)
+                count = recount
+    return count
+
+
+def notification_feed(user, cursor=None, page_size=NOTIFICATION_PAGE_SIZE, unread_only=False):
+    """
+    Returns: (notifications, next_cursor) newest first
+    """
+    notifications = Notification.objects.filter(user=user)
+    if unread_only:
+        notifications = notifications.filter(is_read=False)
+    return keyset_page(notifications, cursor, page_size)
+
+
+# =================== RETENTION ===================
+
+def prune_read_notifications(before, batch_size=1000):
+    """
+    Delete READ notifications created before `before`, batch_size rows per
+    DELETE. Unread rows are kept however old they are, so the cached
+    counters stay valid.
+
+    Returns: number of notifications deleted
+    """
+    deleted = 0
+    stale = Notification.objects.filter(is_read=True, created_at__lt=before)
+
+    while True:
+        ids = list(stale.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Notification.objects.filter(id__in=ids).delete()[0]
+
@@ -1,3 +1,220 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from groups.models import Group, GroupInvite
+from . import notifications
+from .mail import deliver_queued_emails, queue_email
+from .models import Notification, OutboundEmail
+from .notifications import (
+    NOTIFICATION_PAGE_SIZE,
+    mark_all_read,
+    mark_read,
+    notify,
+    prune_read_notifications,
+    unread_count,
+)
+
+User = get_user_model()
+
+# Query-count tests count the app's own queries; a DatabaseCache backend
+# would add its own lookups, so they run against an in-process cache
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class FlakyBackend(LocmemBackend):
+    """
+    locmem backend that refuses one recipient and counts connection opens.
+    """
+    opened = 0
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if "bounce@" in message.to[0]:
+                raise OSError("550 mailbox unavailable")
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    EMAIL_QUEUE_MAX_ATTEMPTS=2,
+)
+class OutboundEmailQueueTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="admin@paynion.test", username="admin", full_name="Admin", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.user)
+        self.client.force_login(self.user)
+
+    def test_invite_is_queued_not_sent(self):
+        response = self.client.post(
+            reverse("groups:send_invite", args=[self.group.id]), {"email": "friend@paynion.test"}
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+
+        invite = GroupInvite.objects.get()
+        queued = OutboundEmail.objects.get()
+        self.assertIn(f"http://testserver/groups/invite/accept/{invite.token}/", queued.body)
+
+        self.assertEqual(deliver_queued_emails(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ["friend@paynion.test"])
+
+    def test_batch_uses_one_connection_and_retries_failures(self):
+        for i in range(3):
+            queue_email(f"user{i}@paynion.test", "Hi", "Body")
+        queue_email("bounce@paynion.test", "Hi", "Body")
+
+        FlakyBackend.opened = 0
+        sent, failed = deliver_queued_emails(connection=FlakyBackend())
+
+        self.assertEqual((sent, failed), (3, 1))
+        self.assertEqual(FlakyBackend.opened, 1)
+
+        bounced = OutboundEmail.objects.get(to_email="bounce@paynion.test")
+        self.assertEqual(bounced.status, "QUEUED")
+        self.assertGreater(bounced.next_attempt_at, timezone.now())
+
+        # Not due yet: the backoff keeps it out of the next batch
+        self.assertEqual(deliver_queued_emails(connection=FlakyBackend()), (0, 0))
+
+        OutboundEmail.objects.filter(id=bounced.id).update(next_attempt_at=timezone.now())
+        deliver_queued_emails(connection=FlakyBackend())
+
+        bounced.refresh_from_db()
+        self.assertEqual(bounced.status, "FAILED")
+        self.assertEqual(bounced.attempts, 2)
+
+    def test_rows_are_claimed_before_sending(self):
+        email = queue_email("friend@paynion.test", "Hi", "Body")
+        seen = []
+
+        class PeekingBackend(LocmemBackend):
+            def send_messages(self, messages):
+                seen.append(OutboundEmail.objects.get(id=email.id).status)
+                return super().send_messages(messages)
+
+        self.assertEqual(deliver_queued_emails(connection=PeekingBackend()), (1, 0))
+        self.assertEqual(seen, ["SENDING"])
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("SENT", 1))
+
+    def test_claim_of_a_dead_worker_expires(self):
+        claimed = queue_email("friend@paynion.test", "Hi", "Body")
+        OutboundEmail.objects.filter(id=claimed.id).update(
+            status="SENDING", attempts=1, next_attempt_at=timezone.now() + timedelta(minutes=5)
+        )
+
+        self.assertEqual(deliver_queued_emails(), (0, 0))
+
+        OutboundEmail.objects.filter(id=claimed.id).update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_queued_emails(), (1, 0))
+
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.attempts), ("SENT", 2))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NotificationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x"
+        )
+        self.client.force_login(self.user)
+
+    def notify(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [notify(self.user, f"Note {i}") for i in range(count)]
+
+    def test_unread_counter_is_cached_and_dropped_on_writes(self):
+        self.assertEqual(unread_count(self.user), 0)
+        key = notifications._cache_key(self.user.id)
+
+        first, *_ = self.notify(3)
+        self.assertIsNone(cache.get(key))
+        with self.assertNumQueries(2):   # COUNT + the post-add recheck
+            self.assertEqual(unread_count(self.user), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_read(self.user, [first.id])
+            mark_read(self.user, [first.id])
+        self.assertEqual(unread_count(self.user), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_all_read(self.user), 2)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(unread_count(self.user), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_write_racing_the_recount_is_not_lost(self):
+        real_add = cache.add
+
+        def add_after_a_concurrent_write(*args, **kwargs):
+            # Committed while the key was missing, so its delete was a no-op
+            Notification.objects.create(user=self.user, message="Late")
+            return real_add(*args, **kwargs)
+
+        with mock.patch.object(notifications, "cache", mock.Mock(
+            wraps=cache, get=cache.get, add=add_after_a_concurrent_write
+        )):
+            self.assertEqual(unread_count(self.user), 1)
+
+        self.assertEqual(unread_count(self.user), 1)
+
+    def test_feed_pages_by_cursor(self):
+        self.notify(NOTIFICATION_PAGE_SIZE + 3)
+        url = reverse("accounts:notifications_api")
+
+        first = self.client.get(url).json()
+        rest = self.client.get(url, {"cursor": first["next_cursor"]}).json()
+
+        self.assertEqual(len(first["notifications"]), NOTIFICATION_PAGE_SIZE)
+        self.assertEqual(len(rest["notifications"]), 3)
+        self.assertIsNone(rest["next_cursor"])
+        self.assertEqual(first["unread_count"], NOTIFICATION_PAGE_SIZE + 3)
+
+    def test_mark_read_endpoint_is_idempotent_and_scoped(self):
+        notification, = self.notify(1)
+        url = reverse("accounts:mark_notification_read", args=[notification.id])
+
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 200)
+
+        other = User.objects.create_user(
+            email="other@paynion.test", username="other", full_name="Other", password="x"
+        )
+        self.client.force_login(other)
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+    def test_prune_keeps_unread_and_recent(self):
+        old_read, old_unread, new_read = self.notify(3)
+        Notification.objects.filter(id__in=[old_read.id, new_read.id]).update(is_read=True)
+        Notification.objects.filter(id__in=[old_read.id, old_unread.id]).update(
+            created_at=timezone.now() - timedelta(days=200)
+        )
+
+        deleted = prune_read_notifications(timezone.now() - timedelta(days=90), batch_size=1)
+
+        self.assertEqual(deleted, 1)
+        self.assertEqual(
+            set(Notification.objects.values_list("id", flat=True)), {old_unread.id, new_read.id}
+        )
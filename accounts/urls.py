@@ -9,9 +9,12 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/',views.dashboard, name='dashboard'),
     path('profile/', views.profile_view, name='profile'),
+    path("api/friend-balances/", views.friend_balances_api, name="friend_balances_api"),
     path("my-expenses/", views.my_paid_expenses, name="my_expenses"),
     path("edit-profile/", views.edit_profile, name="edit_profile"),
     path("notification/read/<int:notification_id>/",views.mark_notification_read,name="mark_notification_read"),
+    path("notification/read-all/", views.mark_all_notifications_read, name="mark_all_notifications_read"),
+    path("api/notifications/", views.notifications_api, name="notifications_api"),
     path("report/", views.report, name="report"),
     path("report/pdf/", views.report_pdf, name="report_pdf"),
 ]
\ No newline at end of file
@@ -6,14 +6,19 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from groups.models import Group, GroupInvite
-from expenses.models import Expense, ExpenseSplit
+from groups.invites import invalidate_pending_invites, pending_invite_token
+from groups.members import preview_prefetch
+from expenses.models import Expense, ExpenseSplit, ArchivedExpense
 from expenses.utils import calculate_group_balances
+from expenses.balances import friend_balances, group_breakdown
+from expenses.archive import report_expenses, archived_summary
 from django.db.models import Sum
 from django.conf import settings
 from django.urls import reverse
 from datetime import timedelta
 from django.utils import timezone
 from accounts.models import Notification
+from accounts.notifications import mark_all_read, mark_read, notification_feed, unread_count
 from django.db.models.functions import TruncMonth
 from django.http import JsonResponse
 from django.template.loader import get_template
@@ -29,6 +34,9 @@ import os
 
 User = get_user_model()
 
+TOP_DEBTORS_LIMIT = 5
+RECENT_EXPENSES_LIMIT = 4
+
 
 def signup_view(request):
     next_url = request.GET.get('next')
@@ -95,34 +103,39 @@ def dashboard(request):
     today = timezone.now().date()
 
     #  FETCH UNREAD NOTIFICATION (IMPORTANT)
+    # The cached counter spares the query for users with nothing unread
+    unread_notifications = unread_count(user)
     notification = (
         Notification.objects
         .filter(user=user, is_read=False)
         .first()
-    )
+    ) if unread_notifications else None
 
     #  INVITE REDIRECT 
-    pending_invites = GroupInvite.objects.filter(
-        email=user.email,
-        is_accepted=False
-    )
+    invite_token = pending_invite_token(user.email)
 
-    if pending_invites.exists():
-        invite = pending_invites.first()
-        return redirect("groups:accept_invite", token=invite.token)
+    if invite_token:
+        # The cached token can outlive a deleted invite; then there is none
+        if GroupInvite.objects.filter(token=invite_token, is_accepted=False).exists():
+            return redirect("groups:accept_invite", token=invite_token)
+        invalidate_pending_invites(user.email)
 
     #  SUMMARY CARDS 
+    # Expenses archived after a settle-up count towards the all-time figures
+    archived = archived_summary(user)
     total_groups = Group.objects.filter(members=user).count()
-    total_expenses = Expense.objects.filter(paid_by=user).count()
+    total_expenses = (
+        Expense.objects.filter(paid_by=user).count()
+        + ArchivedExpense.objects.filter(paid_by=user).count()
+    )
 
     # Compute real per-group data for Group Snapshots card
     groups_with_data = []
-    for group in Group.objects.filter(members=user).order_by('-created_at')[:3]:
-        total_spending = Expense.objects.filter(group=group).aggregate(
-            total=Sum('amount'))['total'] or 0
+    for group in Group.objects.filter(members=user).prefetch_related(preview_prefetch(3)).order_by('-created_at')[:3]:
+        total_spending = group.total_spending
         group_balances = calculate_group_balances(group)
         net_balance = group_balances.get(user, 0)
-        members = group.members.all()
+        members = group.preview_members
         # Progress %: how much of total spending is represented by abs(net_balance), capped at 100
         progress_pct = min(100, round(abs(net_balance) / float(total_spending) * 100, 1)) if total_spending else 0
         groups_with_data.append({
@@ -132,17 +145,13 @@ def dashboard(request):
             "abs_net_balance": round(abs(float(net_balance)), 2),
             "progress_pct": progress_pct,
             "members": members,
-            "member_count": members.count(),
+            "member_count": group.member_count,
         })
 
     # Keep full groups list for the total_groups count
     groups = Group.objects.filter(members=user).order_by('-created_at')
 
-    recent_expenses = (
-        Expense.objects
-        .filter(paid_by=user)
-        .order_by('-created_at')
-    )
+    recent_expenses = report_expenses(user, paid_by=user, limit=RECENT_EXPENSES_LIMIT)
 
     #  ACCOUNT AGE 
     account_age_days = (today - user.date_joined.date()).days
@@ -274,6 +283,12 @@ def dashboard(request):
     total_need_to_pay = sum(float(val) if val else 0 for val in need_values)
     total_will_get_back = sum(float(val) if val else 0 for val in getback_values)
 
+    if start_date is None:
+        # "All Time" also covers the archived expenses
+        total_paid += float(archived["total_paid"])
+        total_need_to_pay += float(archived["need_to_pay"])
+        total_will_get_back += float(archived["get_back"])
+
     # ============================================
     # NEW CHART DATA - "YOU OWE VS YOU ARE OWED"
     # ============================================
@@ -479,7 +494,7 @@ def dashboard(request):
     ).exclude(
         expense__paid_by=user
     ).aggregate(total=Sum('amount'))['total'] or 0
-    total_pay = float(all_need_to_pay)
+    total_pay = float(all_need_to_pay + archived["need_to_pay"])
 
     # Calculate I Will Get Back (sum of all positive balances)
     all_will_get_back = ExpenseSplit.objects.filter(
@@ -487,16 +502,17 @@ def dashboard(request):
     ).exclude(
         user=user
     ).aggregate(total=Sum('amount'))['total'] or 0
-    total_get = float(all_will_get_back)
+    total_get = float(all_will_get_back + archived["get_back"])
 
     # Calculate Total Spending (sum of all related expense amounts)
     all_expenses_total = Expense.objects.filter(
         paid_by=user
     ).aggregate(total=Sum('amount'))['total'] or 0
-    total_spending = float(all_expenses_total)
+    total_spending = float(all_expenses_total + archived["total_paid"])
 
     context = {
         "notification": notification,   # PASS TO TEMPLATE
+        "unread_notifications": unread_notifications,
         "total_groups": total_groups,
         "total_expenses": total_expenses,
         "groups": groups,
@@ -542,10 +558,14 @@ def profile_view(request):
 
     groups = Group.objects.filter(members=user)
 
+    # All-time totals: hot rows plus the archived totals
+    archived = archived_summary(user)
+
     # Total Paid by Me
     total_paid_by_me = Expense.objects.filter(
         paid_by=user
     ).aggregate(total=Sum('amount'))['total'] or 0
+    total_paid_by_me += archived["total_paid"]
 
     # Total I Need to Pay
     total_need_to_pay = ExpenseSplit.objects.filter(
@@ -553,6 +573,7 @@ def profile_view(request):
     ).exclude(
         expense__paid_by=user
     ).aggregate(total=Sum('amount'))['total'] or 0
+    total_need_to_pay += archived["need_to_pay"]
 
     # Total I Will Get Back
     total_get_back = ExpenseSplit.objects.filter(
@@ -560,6 +581,18 @@ def profile_view(request):
     ).exclude(
         user=user
     ).aggregate(total=Sum('amount'))['total'] or 0
+    total_get_back += archived["get_back"]
+
+    # Friends who owe me the most (maintained pairwise balances, no scan)
+    owed_to_me = sorted(
+        ((friend_id, amount) for friend_id, amount in friend_balances(user).items() if amount > 0),
+        key=lambda item: -item[1],
+    )[:TOP_DEBTORS_LIMIT]
+    friends = User.objects.in_bulk([friend_id for friend_id, _ in owed_to_me])
+    top_debtors = [
+        {"user": friends[friend_id], "amount": amount}
+        for friend_id, amount in owed_to_me
+    ]
 
     context = {
         "user": user,
@@ -567,16 +600,54 @@ def profile_view(request):
         "total_paid_by_me": total_paid_by_me,
         "total_need_to_pay": total_need_to_pay,
         "total_get_back": total_get_back,
+        "top_debtors": top_debtors,
     }
 
     return render(request, "accounts/profile.html", context)
 
 
 
+@login_required
+def friend_balances_api(request):
+    """
+    ?friend=<id> adds a per-group breakdown for that friend.
+    ?limit=<n> returns only the n largest balances.
+    """
+    balances = friend_balances(request.user)
+    ordered = sorted(balances.items(), key=lambda item: -abs(item[1]))
+
+    limit = request.GET.get("limit", "")
+    if limit.isdigit():
+        ordered = ordered[:int(limit)]
+
+    friends = User.objects.in_bulk([friend_id for friend_id, _ in ordered])
+    data = {
+        "balances": [
+            {
+                "id": friend_id,
+                "full_name": friends[friend_id].full_name,
+                "amount": f"{amount:.2f}",
+                "direction": "owes_you" if amount > 0 else "you_owe",
+            }
+            for friend_id, amount in ordered
+        ]
+    }
+
+    friend = request.GET.get("friend", "")
+    if friend.isdigit():
+        data["groups"] = [
+            {"group_id": group_id, "amount": f"{amount:.2f}"}
+            for group_id, amount in group_breakdown(request.user, int(friend)).items()
+        ]
+
+    return JsonResponse(data)
+
+
+
 @login_required
 def my_paid_expenses(request):
     user = request.user
-    expenses = Expense.objects.filter(paid_by=request.user).select_related("group")
+    expenses = report_expenses(user, paid_by=user)
     return render(request, 'accounts/my_paid_expenses.html', {'expenses': expenses})
 
 
@@ -619,17 +690,45 @@ def edit_profile(request):
 @login_required
 @require_POST
 def mark_notification_read(request, notification_id):
-    try:
-        notification = Notification.objects.get(
-            id=notification_id,
-            user=request.user
-        )
-        notification.is_read = True
-        notification.save()
+    # Single conditional UPDATE; a repeat click is a no-op, not an error
+    if mark_read(request.user, [notification_id]):
         return JsonResponse({"status": "ok"})
-    except Notification.DoesNotExist:
-        return JsonResponse({"status": "error"}, status=404)
-    
+
+    if Notification.objects.filter(id=notification_id, user=request.user).exists():
+        return JsonResponse({"status": "ok"})
+    return JsonResponse({"status": "error"}, status=404)
+
+
+@login_required
+@require_POST
+def mark_all_notifications_read(request):
+    return JsonResponse({"status": "ok", "marked": mark_all_read(request.user)})
+
+
+@login_required
+def notifications_api(request):
+    """
+    ?cursor=<next_cursor>   older page
+    ?unread=1               unread notifications only
+    """
+    notifications, next_cursor = notification_feed(
+        request.user, request.GET.get("cursor"), unread_only=request.GET.get("unread") == "1"
+    )
+
+    return JsonResponse({
+        "notifications": [
+            {
+                "id": notification.id,
+                "message": notification.message,
+                "is_read": notification.is_read,
+                "created_at": notification.created_at.isoformat(),
+            }
+            for notification in notifications
+        ],
+        "next_cursor": next_cursor,
+        "unread_count": unread_count(request.user),
+    })
+
 
 
 
@@ -641,19 +740,12 @@ def report(request):
     from_date = request.GET.get("from")
     to_date = request.GET.get("to")
 
-    expenses = Expense.objects.filter(group__members=user)
-
-    if from_date and to_date:
-        expenses = expenses.filter(created_at__date__range=[from_date, to_date])
-
-    expenses = expenses.order_by("-created_at")
+    # Hot rows, plus archived ones when the range reaches back that far
+    expenses = report_expenses(user, from_date, to_date)
+    archived = archived_summary(user)
 
     # ---------------- SUMMARY ----------------
-    total_paid = (
-        expenses
-        .filter(paid_by=user)
-        .aggregate(Sum("amount"))["amount__sum"] or 0
-    )
+    total_paid = sum(expense.amount for expense in expenses if expense.paid_by_id == user.id)
 
     need_to_pay = (
         ExpenseSplit.objects
@@ -669,6 +761,9 @@ def report(request):
         .aggregate(Sum("amount"))["amount__sum"] or 0
     )
 
+    need_to_pay += archived["need_to_pay"]
+    will_get_back += archived["get_back"]
+
     balance = will_get_back - need_to_pay
 
     # ---------------- GROUP WISE REPORT ----------------
@@ -694,12 +789,14 @@ def report(request):
             user=user
         ).exclude(expense__paid_by=user).aggregate(Sum("amount"))["amount__sum"] or 0
 
+        cold = archived["groups"].get(group.id, {})
+
         group_report.append({
             "group": group.title,
-            "total": total,
-            "paid": paid,
-            "get_back": get_back,
-            "need_pay": need_pay,
+            "total": total + cold.get("total", 0),
+            "paid": paid + cold.get("paid", 0),
+            "get_back": get_back + cold.get("get_back", 0),
+            "need_pay": need_pay + cold.get("need_pay", 0),
         })
 
 
@@ -725,9 +822,10 @@ def report(request):
 def report_pdf(request):
     user = request.user
 
-    expenses = Expense.objects.filter(group__members=user).order_by("-created_at")
+    expenses = report_expenses(user, request.GET.get("from"), request.GET.get("to"))
+    archived = archived_summary(user)
 
-    total_paid = expenses.filter(paid_by=user).aggregate(Sum("amount"))["amount__sum"] or 0
+    total_paid = sum(expense.amount for expense in expenses if expense.paid_by_id == user.id)
 
     need_to_pay = (
         ExpenseSplit.objects
@@ -743,6 +841,9 @@ def report_pdf(request):
         .aggregate(Sum("amount"))["amount__sum"] or 0
     )
 
+    need_to_pay += archived["need_to_pay"]
+    will_get_back += archived["get_back"]
+
     balance = will_get_back - need_to_pay
 
     template = get_template("accounts/report_pdf.html")
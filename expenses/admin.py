@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import Expense, ExpenseSplit
+from .models import (
+    Expense,
+    ExpenseSplit,
+    PairwiseBalance,
+    ArchivedExpense,
+    ArchivedMemberTotals,
+    GroupBalanceSnapshot,
+)
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
@@ -20,3 +27,36 @@ class ExpenseSplitAdmin(admin.ModelAdmin):
         'user__full_name',
         'expense__description',
     )
+
+
+
+@admin.register(PairwiseBalance)
+class PairwiseBalanceAdmin(admin.ModelAdmin):
+    list_display = ('group', 'user_a', 'user_b', 'net_amount', 'updated_at',)
+    search_fields = ('group__title', 'user_a__full_name', 'user_b__full_name',)
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(ArchivedExpense)
+class ArchivedExpenseAdmin(admin.ModelAdmin):
+    list_display = ('description', 'amount', 'paid_by', 'group', 'created_at', 'archived_at',)
+    search_fields = ('description', 'paid_by__full_name', 'group__title',)
+    list_filter = ('group',)
+    readonly_fields = ('created_at', 'archived_at',)
+
+
+@admin.register(ArchivedMemberTotals)
+class ArchivedMemberTotalsAdmin(admin.ModelAdmin):
+    list_display = ('group', 'user', 'total_paid', 'need_to_pay', 'get_back', 'archived_through',)
+    search_fields = ('group__title', 'user__full_name',)
+
+
+@admin.register(GroupBalanceSnapshot)
+class GroupBalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('group', 'taken_at', 'reason',)
+    list_filter = ('reason',)
+    search_fields = ('group__title',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
@@ -1,11 +1,15 @@
-import pytesseract
 from PIL import Image
+from pypdf import PdfReader
 import re
 import os
+import time
+import logging
+from contextlib import contextmanager
+from .ocr_backends import get_ocr_backend, warm_up_ocr_backend
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
-pytesseract.pytesseract.tesseract_cmd = (
-    r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-)
+logger = logging.getLogger(__name__)
 
 # =================== IMPROVED OCR EXTRACTION ===================
 
@@ -251,9 +255,189 @@ def _find_amount_by_currency(text, min_amount, max_amount):
     return max(candidates) if candidates else None
 
 
-def extract_bill_data(image_path):
+# =================== TIERED OCR ===================
+# Tier 1 ("fast"): OCR a downscaled copy with image_to_data, which also
+#                  gives per-word confidences.
+# Tier 2 ("full"): plain full-resolution image_to_string, only used when
+#                  tier 1 did not find a total it is confident about.
+
+FAST_PASS_MAX_WIDTH = 1000        # px, width of the downscaled copy
+FAST_PASS_MIN_CONFIDENCE = 70     # tesseract word confidence (0-100)
+
+
+def _ocr_lines_with_confidence(img):
+    """
+    OCR an image with image_to_data and rebuild it line by line.
+
+    Returns: list of (line_text, confidence) where confidence is the
+    LOWEST word confidence on that line (one bad digit = bad amount).
+    """
+    data = get_ocr_backend().image_to_data(img)
+
+    lines = {}
+    order = []
+
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        conf = float(data["conf"][i])
+
+        # conf == -1 marks layout rows (blocks/paragraphs), not words
+        if not word or conf < 0:
+            continue
+
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        if key not in lines:
+            lines[key] = {"words": [], "conf": conf}
+            order.append(key)
+
+        lines[key]["words"].append(word)
+        lines[key]["conf"] = min(lines[key]["conf"], conf)
+
+    return [(" ".join(lines[key]["words"]), lines[key]["conf"]) for key in order]
+
+
+def _amount_confidence(lines, amount):
+    """
+    Confidence of the OCR line(s) the amount was read from.
+    Uses the same per-line number rule as _find_amount_by_keyword.
+
+    Returns: float (0 if the amount can't be traced back to a line)
+    """
+    best = 0.0
+
+    for line_text, conf in lines:
+        numbers = re.findall(r'\d+(?:[.,]\d{2})?', normalize_ocr_text(line_text))
+
+        for number in numbers:
+            try:
+                value = float(number.replace(',', '.'))
+            except ValueError:
+                continue
+
+            if abs(value - amount) < 0.005:
+                best = max(best, conf)
+
+    return best
+
+
+@contextmanager
+def _stage(timings, name):
+    """
+    Add the time spent inside the block to timings[name] (milliseconds).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def _tiered_ocr(img, timings):
+    """
+    Run the cheap pass first and escalate to full resolution only when needed.
+
+    Returns: (raw_text, normalized_text, amount, tier)
+    """
+    with _stage(timings, "preprocess"):
+        if img.width > FAST_PASS_MAX_WIDTH:
+            ratio = FAST_PASS_MAX_WIDTH / float(img.width)
+            small = img.resize((FAST_PASS_MAX_WIDTH, int(img.height * ratio)), Image.LANCZOS)
+        else:
+            # Already small: the "fast" pass IS the full-resolution pass
+            small = img
+
+    with _stage(timings, "ocr"):
+        lines = _ocr_lines_with_confidence(small)
+
+    with _stage(timings, "parse"):
+        raw_text = "\n".join(line_text for line_text, _ in lines)
+        normalized_text = normalize_ocr_text(raw_text)
+        amount = extract_amount(raw_text, normalized_text)
+
+        if small is img:
+            return raw_text, normalized_text, amount, "full"
+
+        if amount is not None and _amount_confidence(lines, amount) >= FAST_PASS_MIN_CONFIDENCE:
+            return raw_text, normalized_text, amount, "fast"
+
+    # ============ ESCALATE: FULL RESOLUTION ============
+    with _stage(timings, "ocr"):
+        raw_text = get_ocr_backend().image_to_string(img)
+
+    with _stage(timings, "parse"):
+        normalized_text = normalize_ocr_text(raw_text)
+        amount = extract_amount(raw_text, normalized_text)
+
+    return raw_text, normalized_text, amount, "full"
+
+
+# =================== PDF BILLS ===================
+# E-bills (Swiggy, Zomato, utilities) usually carry a text layer, so the
+# text can be read directly without OCR. Scanned PDFs have no text layer
+# and fall back to OCR of the page images embedded in them.
+
+PDF_MIN_TEXT_CHARS = 20   # less than this = treat as a scanned PDF
+PDF_MAX_OCR_PAGES = 3     # bills are short, don't OCR a whole statement
+
+
+def _is_pdf(path):
+    with open(path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+
+def _strip_thousands_separators(text):
+    """
+    1,921.50 → 1921.50 (digital bills print amounts with separators,
+    which the amount regex would otherwise read as 1,92).
     """
-    Main function to extract bill data from an image.
+    return re.sub(r'(?<=\d),(?=\d{3}(?!\d))', '', text)
+
+
+def _read_pdf(pdf_path, timings):
+    """
+    Read a PDF bill, preferring the embedded text layer over OCR.
+
+    Returns: (raw_text, normalized_text, amount, tier)
+    """
+    with _stage(timings, "decode"):
+        reader = PdfReader(pdf_path)
+
+    # Reading the text layer stands in for the OCR stage
+    with _stage(timings, "ocr"):
+        raw_text = "\n".join(page.extract_text() or "" for page in reader.pages)
+
+    if len(raw_text.strip()) >= PDF_MIN_TEXT_CHARS:
+        with _stage(timings, "parse"):
+            raw_text = _strip_thousands_separators(raw_text)
+            normalized_text = normalize_ocr_text(raw_text)
+            amount = extract_amount(raw_text, normalized_text)
+        return raw_text, normalized_text, amount, "pdf_text"
+
+    # ============ SCANNED PDF: OCR THE PAGE IMAGES ============
+    result = ("", "", None, "full")
+
+    for page in reader.pages[:PDF_MAX_OCR_PAGES]:
+        for image_file in page.images:
+            with _stage(timings, "decode"):
+                img = image_file.image
+                img.load()
+
+            with _stage(timings, "preprocess"):
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+
+            result = _tiered_ocr(img, timings)
+            if result[2] is not None:
+                return result
+
+    return result
+
+
+def extract_bill_data(image_path, cleanup=True):
+    """
+    Main function to extract bill data from an image or a PDF bill.
+    The file is deleted afterwards unless cleanup=False.
     
     Returns:
     {
@@ -261,36 +445,52 @@ def extract_bill_data(image_path):
         "title": str,  # Shop/Restaurant name
         "amount": float,  # Detected amount
         "raw_text": str,  # Full OCR text (for debugging)
+        "tier": str,  # Tier that answered ("pdf_text" / "fast" / "full")
+        "ocr_ms": float,  # Time spent reading text (OCR or PDF text layer)
+        "timings": dict,  # ms per stage: decode, preprocess, ocr, parse
         "message": str  # Error message if applicable
     }
     """
+    timings = {"decode": 0.0, "preprocess": 0.0, "ocr": 0.0, "parse": 0.0}
+
     try:
-        # Open and prepare image
-        img = Image.open(image_path)
-        
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        
-        # Extract text using OCR
-        raw_text = pytesseract.image_to_string(img)
+        started = time.perf_counter()
+
+        if _is_pdf(image_path):
+            # Text layer first, OCR only for scanned PDFs
+            raw_text, normalized_text, amount, tier = _read_pdf(image_path, timings)
+        else:
+            # Open and prepare image
+            with _stage(timings, "decode"):
+                img = Image.open(image_path)
+                img.load()
+
+            with _stage(timings, "preprocess"):
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+
+            # Extract text using tiered OCR
+            raw_text, normalized_text, amount, tier = _tiered_ocr(img, timings)
+
+        ocr_ms = round((time.perf_counter() - started) * 1000, 1)
+        timings = {stage: round(ms, 1) for stage, ms in timings.items()}
+
+        logger.info("Bill text read by %s tier in %.1f ms", tier, ocr_ms)
         
         if not raw_text.strip():
             return {
                 "success": False,
+                "tier": tier,
+                "ocr_ms": ocr_ms,
+                "timings": timings,
                 "message": "Could not read text from image"
             }
         
-        # Normalize OCR output
-        normalized_text = normalize_ocr_text(raw_text)
-        
         # Extract description
         description = extract_description(raw_text)
         
-        # Extract amount
-        amount = extract_amount(raw_text, normalized_text)
-        
         # Clean up temp file if exists
-        if os.path.exists(image_path):
+        if cleanup and os.path.exists(image_path):
             try:
                 os.remove(image_path)
             except:
@@ -299,6 +499,9 @@ def extract_bill_data(image_path):
         if amount is None:
             return {
                 "success": False,
+                "tier": tier,
+                "ocr_ms": ocr_ms,
+                "timings": timings,
                 "message": "Unable to detect bill amount"
             }
         
@@ -306,13 +509,76 @@ def extract_bill_data(image_path):
             "success": True,
             "title": description,
             "amount": round(amount, 2),
-            "raw_text": raw_text
+            "raw_text": raw_text,
+            "tier": tier,
+            "ocr_ms": ocr_ms,
+            "timings": timings
         }
         
     except Exception as e:
         return {
             "success": False,
+            "timings": {stage: round(ms, 1) for stage, ms in timings.items()},
             "message": f"Error processing image: {str(e)}"
         }
 
 
+
+
+# =================== BATCH EXTRACTION ===================
+
+_batch_pool = None
+
+
+def _get_batch_pool(max_workers=None):
+    """
+    Lazily create one process pool per web worker and reuse it,
+    so a batch does not pay the process start-up cost every time.
+    """
+    global _batch_pool
+
+    if _batch_pool is None:
+        # Each pool process loads the OCR engine once, up front
+        _batch_pool = ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            initializer=warm_up_ocr_backend
+        )
+
+    return _batch_pool
+
+
+def extract_bill_data_batch(image_paths, max_workers=None):
+    """
+    Run extract_bill_data over many images in parallel (one process per core).
+
+    Yields (index, result) tuples in COMPLETION order, not input order,
+    so the caller can stream each bill back as soon as it is done.
+    `index` is the position of the image in `image_paths`.
+    """
+    global _batch_pool
+
+    pool = _get_batch_pool(max_workers)
+    futures = {
+        pool.submit(extract_bill_data, path): index
+        for index, path in enumerate(image_paths)
+    }
+
+    for future in as_completed(futures):
+        index = futures[future]
+
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM) - drop the pool so the next batch starts fresh
+            _batch_pool = None
+            result = {
+                "success": False,
+                "message": "OCR worker crashed while processing image"
+            }
+        except Exception as e:
+            result = {
+                "success": False,
+                "message": f"Error processing image: {str(e)}"
+            }
+
+        yield index, result
@@ -0,0 +1,228 @@
+"""
+Archive tier for settled expense history.
+
+Expenses created before their group's last_settled_at checkpoint no longer
+affect balances. archive_expenses moves them (and their splits) into
+ArchivedExpense / ArchivedExpenseSplit in chunks, keeping their ids, and
+adds them to each member's ArchivedMemberTotals row.
+
+Reports read through report_expenses / archived_summary, which only touch
+the archive when the requested date range reaches back into it.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from heapq import merge
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Sum, Value
+from django.db.models.functions import Greatest
+
+from groups.models import Group
+from .models import (
+    Expense,
+    ArchivedExpense,
+    ArchivedExpenseSplit,
+    ArchivedMemberTotals,
+)
+
+
+# =================== WRITING THE ARCHIVE ===================
+
+def _add_member_totals(group_id, totals):
+    """
+    totals: {user_id: {"total_paid", "need_to_pay", "get_back", "archived_through"}}
+    """
+    for user_id, row in totals.items():
+        rows = ArchivedMemberTotals.objects.filter(group_id=group_id, user_id=user_id)
+        changes = {
+            "total_paid": F("total_paid") + row["total_paid"],
+            "need_to_pay": F("need_to_pay") + row["need_to_pay"],
+            "get_back": F("get_back") + row["get_back"],
+            "archived_through": Greatest("archived_through", Value(row["archived_through"])),
+        }
+        if rows.update(**changes):
+            continue
+
+        try:
+            with transaction.atomic():
+                ArchivedMemberTotals.objects.create(group_id=group_id, user_id=user_id, **row)
+        except IntegrityError:
+            rows.update(**changes)
+
+
+def _archive_chunk(group_id, expenses):
+    archived, archived_splits = [], []
+    totals = defaultdict(lambda: {
+        "total_paid": Decimal("0"),
+        "need_to_pay": Decimal("0"),
+        "get_back": Decimal("0"),
+        "archived_through": None,
+    })
+
+    for expense in expenses:
+        archived.append(ArchivedExpense(
+            id=expense.id,
+            group_id=expense.group_id,
+            amount=expense.amount,
+            description=expense.description,
+            paid_by_id=expense.paid_by_id,
+            split_type=expense.split_type,
+            created_at=expense.created_at,
+        ))
+
+        payer = totals[expense.paid_by_id]
+        payer["total_paid"] += expense.amount
+
+        for split in expense.splits.all():
+            archived_splits.append(ArchivedExpenseSplit(
+                expense_id=expense.id, user_id=split.user_id, amount=split.amount
+            ))
+            if split.user_id != expense.paid_by_id:
+                totals[split.user_id]["need_to_pay"] += split.amount
+                payer["get_back"] += split.amount
+
+        for user_id in {expense.paid_by_id} | {split.user_id for split in expense.splits.all()}:
+            through = totals[user_id]["archived_through"]
+            if through is None or expense.created_at > through:
+                totals[user_id]["archived_through"] = expense.created_at
+
+    with transaction.atomic():
+        ArchivedExpense.objects.bulk_create(archived)
+        ArchivedExpenseSplit.objects.bulk_create(archived_splits, batch_size=1000)
+        _add_member_totals(group_id, totals)
+        Expense.objects.filter(id__in=[expense.id for expense in expenses]).delete()
+
+    return len(archived), len(archived_splits)
+
+
+def archive_expenses(before, chunk_size=500, group_ids=None, dry_run=False):
+    """
+    Move expenses created at or before BOTH their group's last_settled_at
+    and `before` into the archive.
+
+    Returns: dict of counters
+    """
+    stats = {"groups": 0, "expenses": 0, "splits": 0}
+
+    groups = Group.objects.filter(last_settled_at__isnull=False)
+    if group_ids:
+        groups = groups.filter(id__in=group_ids)
+
+    for group_id, last_settled_at in groups.values_list("id", "last_settled_at").iterator():
+        cutoff = min(last_settled_at, before)
+        candidates = Expense.objects.filter(group_id=group_id, created_at__lte=cutoff)
+
+        if dry_run:
+            count = candidates.count()
+            stats["expenses"] += count
+            stats["groups"] += 1 if count else 0
+            continue
+
+        moved_any = False
+        while True:
+            chunk = list(candidates.order_by("id").prefetch_related("splits")[:chunk_size])
+            if not chunk:
+                break
+
+            expenses, splits = _archive_chunk(group_id, chunk)
+            stats["expenses"] += expenses
+            stats["splits"] += splits
+            moved_any = True
+
+        stats["groups"] += 1 if moved_any else 0
+
+    return stats
+
+
+# =================== READING THROUGH THE ARCHIVE ===================
+
+def archived_through(user):
+    """
+    Newest archived expense date in any of `user`'s groups, or None.
+    """
+    return (
+        ArchivedMemberTotals.objects
+        .filter(group__members=user)
+        .aggregate(latest=Max("archived_through"))["latest"]
+    )
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def report_expenses(user, from_date=None, to_date=None, paid_by=None, limit=None):
+    """
+    Expenses in `user`'s groups, newest first - hot rows plus archived rows
+    when the range (or no range) reaches back past the archive boundary.
+
+    paid_by: only expenses this user paid for, in any group
+    limit:   only the newest `limit` expenses
+    """
+    scope = {"paid_by": paid_by} if paid_by is not None else {"group__members": user}
+
+    hot = Expense.objects.filter(**scope).select_related("group", "paid_by")
+    if from_date and to_date:
+        hot = hot.filter(created_at__date__range=[from_date, to_date])
+    hot = hot.order_by("-created_at")
+    if limit is not None:
+        hot = hot[:limit]
+
+    boundary = archived_through(user)
+    if boundary is None or (from_date and to_date and _as_date(from_date) > boundary.date()):
+        return list(hot)
+
+    cold = ArchivedExpense.objects.filter(**scope).select_related("group", "paid_by")
+    if from_date and to_date:
+        cold = cold.filter(created_at__date__range=[from_date, to_date])
+    cold = cold.order_by("-created_at")
+    if limit is not None:
+        cold = cold[:limit]
+
+    expenses = merge(hot, cold, key=lambda expense: expense.created_at, reverse=True)
+    return list(expenses)[:limit]
+
+
+def archived_summary(user):
+    """
+    All-time archived figures for `user`, from ArchivedMemberTotals only.
+
+    Returns: {
+        "total_paid", "need_to_pay", "get_back": Decimal,
+        "groups": {group_id: {"total", "paid", "get_back", "need_pay"}},
+    }
+    """
+    zero = Decimal("0")
+    summary = {"total_paid": zero, "need_to_pay": zero, "get_back": zero, "groups": {}}
+
+    for row in ArchivedMemberTotals.objects.filter(user=user).values(
+        "group_id", "total_paid", "need_to_pay", "get_back"
+    ):
+        summary["total_paid"] += row["total_paid"]
+        summary["need_to_pay"] += row["need_to_pay"]
+        summary["get_back"] += row["get_back"]
+        summary["groups"][row["group_id"]] = {
+            "total": zero,
+            "paid": row["total_paid"],
+            "get_back": row["get_back"],
+            "need_pay": row["need_to_pay"],
+        }
+
+    if summary["groups"]:
+        group_totals = (
+            ArchivedMemberTotals.objects
+            .filter(group_id__in=summary["groups"])
+            .values("group_id")
+            .annotate(total=Sum("total_paid"))
+            .order_by()
+        )
+        for row in group_totals:
+            summary["groups"][row["group_id"]]["total"] = row["total"]
+
+    return summary
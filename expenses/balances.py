@@ -0,0 +1,190 @@
+"""
+Maintained pairwise balances (see PairwiseBalance).
+
+Every write path that changes who owes whom calls into here:
+    - expense splits written / removed  → record_expense_splits
+    - settlement confirmed              → record_settlements
+
+The table is an all-time ledger: expense debts minus confirmed settlement
+payments. rebuild_pairwise_balances recomputes it from scratch.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+
+from .models import ExpenseSplit, ArchivedExpenseSplit, PairwiseBalance
+
+
+def _pair(debtor_id, creditor_id, amount):
+    """
+    Store (debtor owes creditor `amount`) in canonical user_a < user_b order.
+    """
+    if creditor_id < debtor_id:
+        return (creditor_id, debtor_id), amount      # user_b owes user_a
+    return (debtor_id, creditor_id), -amount          # user_a owes user_b
+
+
+def apply_pairwise_deltas(group_id, debts):
+    """
+    debts: iterable of (debtor_id, creditor_id, amount)
+    """
+    deltas = defaultdict(Decimal)
+    for debtor_id, creditor_id, amount in debts:
+        if debtor_id == creditor_id or not amount:
+            continue
+        key, delta = _pair(debtor_id, creditor_id, Decimal(amount))
+        deltas[key] += delta
+
+    for (a, b), delta in deltas.items():
+        if not delta:
+            continue
+
+        rows = PairwiseBalance.objects.filter(group_id=group_id, user_a_id=a, user_b_id=b)
+        if rows.update(net_amount=F("net_amount") + delta):
+            continue
+
+        try:
+            with transaction.atomic():
+                PairwiseBalance.objects.create(group_id=group_id, user_a_id=a, user_b_id=b, net_amount=delta)
+        except IntegrityError:
+            # Someone created the row between our UPDATE and INSERT
+            rows.update(net_amount=F("net_amount") + delta)
+
+
+def record_expense_splits(expense, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) the debts of `expense`'s current splits.
+    Call with -1 BEFORE splits are deleted and +1 AFTER they are written.
+    """
+    splits = ExpenseSplit.objects.filter(expense=expense).values_list("user_id", "amount")
+
+    apply_pairwise_deltas(expense.group_id, [
+        (user_id, expense.paid_by_id, sign * amount)
+        for user_id, amount in splits
+    ])
+
+
+def record_settlements(settlements):
+    """
+    A confirmed payment from payer to receiver reduces what payer owes.
+    """
+    by_group = defaultdict(list)
+    for settlement in settlements:
+        by_group[settlement.group_id].append(
+            (settlement.payer_id, settlement.receiver_id, -settlement.amount)
+        )
+
+    for group_id, debts in by_group.items():
+        apply_pairwise_deltas(group_id, debts)
+
+
+def rebuild_pairwise_balances(group_ids=None):
+    """
+    Recompute the table from ExpenseSplit (hot and archived) and
+    PaymentHistory.
+
+    Returns: number of pair rows written
+    """
+    from payments.models import PaymentHistory
+
+    splits = ExpenseSplit.objects.exclude(user_id=F("expense__paid_by_id"))
+    payments = PaymentHistory.objects.all()
+    if group_ids is not None:
+        splits = splits.filter(expense__group_id__in=group_ids)
+        payments = payments.filter(settlement__group_id__in=group_ids)
+
+    totals = defaultdict(Decimal)
+
+    rows = (
+        splits.values("expense__group_id", "user_id", "expense__paid_by_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    for row in rows:
+        key, delta = _pair(row["user_id"], row["expense__paid_by_id"], row["total"])
+        totals[(row["expense__group_id"],) + key] += delta
+
+    # Archived history still counts towards who owes whom
+    archived = ArchivedExpenseSplit.objects.exclude(user_id=F("expense__paid_by_id"))
+    if group_ids is not None:
+        archived = archived.filter(expense__group_id__in=group_ids)
+
+    rows = (
+        archived.values("expense__group_id", "user_id", "expense__paid_by_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    for row in rows:
+        key, delta = _pair(row["user_id"], row["expense__paid_by_id"], row["total"])
+        totals[(row["expense__group_id"],) + key] += delta
+
+    rows = (
+        payments.values("settlement__group_id", "paid_by_id", "received_by_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    for row in rows:
+        key, delta = _pair(row["paid_by_id"], row["received_by_id"], -row["total"])
+        totals[(row["settlement__group_id"],) + key] += delta
+
+    with transaction.atomic():
+        existing = PairwiseBalance.objects.all()
+        if group_ids is not None:
+            existing = existing.filter(group_id__in=group_ids)
+        existing.delete()
+
+        PairwiseBalance.objects.bulk_create(
+            [
+                PairwiseBalance(group_id=group_id, user_a_id=a, user_b_id=b, net_amount=amount)
+                for (group_id, a, b), amount in totals.items()
+                if amount
+            ],
+            batch_size=1000,
+        )
+
+    return sum(1 for amount in totals.values() if amount)
+
+
+def friend_balances(user):
+    """
+    Net position of `user` against everyone they share a group with,
+    summed over groups. One indexed query.
+
+    Returns: {friend_id: amount}  (amount > 0 → friend owes user)
+    """
+    rows = (
+        PairwiseBalance.objects
+        .filter(Q(user_a=user) | Q(user_b=user))
+        .exclude(net_amount=0)
+        .values("user_a_id", "user_b_id")
+        .annotate(total=Sum("net_amount"))
+        .order_by()
+    )
+
+    balances = defaultdict(Decimal)
+    for row in rows:
+        if row["user_a_id"] == user.id:
+            balances[row["user_b_id"]] += row["total"]
+        else:
+            balances[row["user_a_id"]] -= row["total"]
+
+    return {friend_id: amount for friend_id, amount in balances.items() if amount}
+
+
+def group_breakdown(user, friend_id):
+    """
+    Per-group drill-down for one friend. Returns: {group_id: amount}
+    """
+    a, b = sorted((user.id, friend_id))
+    sign = 1 if a == user.id else -1
+
+    return {
+        group_id: sign * amount
+        for group_id, amount in PairwiseBalance.objects
+        .filter(user_a_id=a, user_b_id=b)
+        .exclude(net_amount=0)
+        .values_list("group_id", "net_amount")
+    }
@@ -1,6 +1,8 @@
 from django import forms
+from django.urls import reverse
 from .models import Expense
 from django.contrib.auth import get_user_model
+from groups.forms import MEMBER_PICKER_THRESHOLD, use_member_picker
 from groups.models import Group
 
 User = get_user_model()
@@ -13,6 +15,9 @@ class ExpenseForm(forms.ModelForm):
         required=True
     )
 
+    # Large groups only: skip picking hundreds of people one by one
+    split_all = forms.BooleanField(required=False, label="Everyone in the group")
+
     # AI Bill Image Field
     bill_image = forms.ImageField(
         required=False,
@@ -33,8 +38,49 @@ class ExpenseForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         group = kwargs.pop("group", None)
         super().__init__(*args, **kwargs)
+        self.group = group
 
         if group:
             self.fields["split_between"].queryset = group.members.all()
         else:
             self.fields["split_between"].queryset = User.objects.none()
+
+        # member_count is a maintained column, so this check is free
+        self.large_group = bool(group) and group.member_count > MEMBER_PICKER_THRESHOLD
+        if self.large_group:
+            self.fields["split_between"].required = False
+            use_member_picker(
+                self.fields["split_between"],
+                reverse("groups:member_search") + f"?group={group.id}",
+            )
+        else:
+            del self.fields["split_all"]
+
+    @property
+    def split_members(self):
+        """
+        Members that get a percentage / custom amount row in the template:
+        everyone in a normal group, only the picked ones in a large group.
+        """
+        if not self.group:
+            return User.objects.none()
+        if not self.large_group:
+            return self.group.members.all()
+
+        picked = self.data.getlist(self.add_prefix("split_between")) if self.is_bound else []
+        return self.group.members.filter(id__in=[pk for pk in picked if pk.isdigit()])
+
+    def clean(self):
+        cleaned = super().clean()
+
+        if not self.large_group:
+            return cleaned
+
+        if cleaned.get("split_all"):
+            if cleaned.get("split_type") != "equal":
+                raise forms.ValidationError("\"Everyone in the group\" only works with an equal split.")
+            cleaned["split_between"] = self.group.members.all()
+        elif not cleaned.get("split_between"):
+            self.add_error("split_between", "Pick at least one member.")
+
+        return cleaned
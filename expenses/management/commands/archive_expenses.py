@@ -0,0 +1,75 @@
+"""
+archive_expenses.py
+-------------------
+Django management command to move settled expense history out of the hot
+Expense / ExpenseSplit tables.
+
+An expense is archived when it was created before its group's
+last_settled_at checkpoint AND is older than --older-than-days. Rows move in
+chunks (one transaction each) into ArchivedExpense / ArchivedExpenseSplit
+with their original ids, and each member's ArchivedMemberTotals row is
+updated so reports can still show all-time figures.
+
+Usage:
+    python manage.py archive_expenses
+    python manage.py archive_expenses --older-than-days 180 --chunk-size 200
+    python manage.py archive_expenses --group 12 --dry-run
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from expenses.archive import archive_expenses
+
+
+class Command(BaseCommand):
+    help = "Moves expenses from before each group's settled checkpoint into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=settings.EXPENSE_ARCHIVE_AFTER_DAYS,
+            help="Only archive expenses older than this many days.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Expenses moved per transaction.",
+        )
+        parser.add_argument(
+            "--group",
+            type=int,
+            action="append",
+            dest="groups",
+            help="Only archive this group (repeatable).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count what would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["older_than_days"])
+
+        self.stdout.write(self.style.WARNING(
+            f"\n📦 Archiving settled expenses created before {before:%d %b %Y}..."
+        ))
+
+        stats = archive_expenses(
+            before,
+            chunk_size=options["chunk_size"],
+            group_ids=options["groups"],
+            dry_run=options["dry_run"],
+        )
+
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"\n✅ {prefix}{stats['expenses']} expense(s) and {stats['splits']} split(s) "
+            f"from {stats['groups']} group(s) archived.\n"
+        ))
@@ -0,0 +1,188 @@
+"""
+benchmark_ocr.py
+----------------
+Django management command to measure bill OCR latency and accuracy.
+
+Runs the full extract_bill_data pipeline over every image/PDF in a corpus
+directory and reports per-stage timings (decode, preprocess, ocr, parse),
+p50/p95 latency and amount accuracy. Results are written as JSON so two
+runs (e.g. before/after an OCR change) can be diffed.
+
+Labels are read from <corpus>/labels.csv with the columns:
+    filename,amount
+Files without a label are still timed but left out of the accuracy figure.
+
+Usage:
+    python manage.py benchmark_ocr path/to/receipts/
+    python manage.py benchmark_ocr path/to/receipts/ --repeat 3 --output bench.json
+"""
+
+import csv
+import json
+import os
+import platform
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from expenses.ai_utils import extract_bill_data
+from expenses.ocr_backends import get_ocr_backend
+
+BILL_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff", ".pdf")
+STAGES = ("decode", "preprocess", "ocr", "parse")
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile (no numpy needed). Returns None for no values.
+    """
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def load_labels(labels_path):
+    if not os.path.exists(labels_path):
+        return {}
+
+    with open(labels_path, newline="", encoding="utf-8") as f:
+        return {
+            row["filename"].strip(): float(row["amount"])
+            for row in csv.DictReader(f)
+            if row.get("filename") and row.get("amount")
+        }
+
+
+class Command(BaseCommand):
+    help = "Benchmarks bill OCR latency and amount accuracy over a labelled receipt corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument("corpus", type=str, help="Directory of receipt images / PDFs.")
+        parser.add_argument(
+            "--labels",
+            type=str,
+            default=None,
+            help="CSV with filename,amount columns (default: <corpus>/labels.csv).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            help="Run every file this many times (latency is reported over all runs).",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default="ocr_benchmark.json",
+            help="Where to write the machine-readable results.",
+        )
+
+    def handle(self, *args, **options):
+        corpus = options["corpus"]
+        if not os.path.isdir(corpus):
+            raise CommandError(f"Corpus directory '{corpus}' does not exist.")
+
+        labels = load_labels(options["labels"] or os.path.join(corpus, "labels.csv"))
+        files = sorted(
+            name for name in os.listdir(corpus)
+            if name.lower().endswith(BILL_EXTENSIONS)
+        )
+        if not files:
+            raise CommandError(f"No receipt images found in '{corpus}'.")
+
+        self.stdout.write(self.style.WARNING(
+            f"\n⏱  Benchmarking {len(files)} receipts x {options['repeat']} run(s)...\n"
+        ))
+
+        runs = []
+        for _ in range(options["repeat"]):
+            for name in files:
+                started = time.perf_counter()
+                result = extract_bill_data(os.path.join(corpus, name), cleanup=False)
+                total_ms = (time.perf_counter() - started) * 1000
+
+                expected = labels.get(name)
+                amount = result.get("amount")
+                correct = None
+                if expected is not None:
+                    correct = amount is not None and abs(amount - expected) < 0.01
+
+                runs.append({
+                    "file": name,
+                    "success": result["success"],
+                    "amount": amount,
+                    "expected": expected,
+                    "correct": correct,
+                    "tier": result.get("tier"),
+                    "total_ms": round(total_ms, 1),
+                    "timings": result.get("timings", {}),
+                    "message": result.get("message"),
+                })
+
+                mark = {True: "✓", False: "✗", None: "·"}[correct]
+                self.stdout.write(
+                    f"   {mark} {name}: {amount} (expected {expected}) "
+                    f"[{result.get('tier')}] {total_ms:.0f} ms"
+                )
+
+        summary = self.summarize(runs)
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "corpus": os.path.abspath(corpus),
+            "backend": get_ocr_backend().name,
+            "python": platform.python_version(),
+            "repeat": options["repeat"],
+            "summary": summary,
+            "runs": runs,
+        }
+
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        self.stdout.write("\n📊 Summary")
+        accuracy = summary["accuracy"]
+        self.stdout.write(
+            f"   Accuracy: {accuracy * 100:.1f}% ({summary['correct']}/{summary['labelled']})"
+            if accuracy is not None else "   Accuracy: n/a (no labels)"
+        )
+        self.stdout.write(
+            f"   Latency:  p50 {summary['latency_ms']['p50']} ms · p95 {summary['latency_ms']['p95']} ms"
+        )
+        for stage in STAGES:
+            stage_summary = summary["stages_ms"][stage]
+            self.stdout.write(f"   {stage:<10} p50 {stage_summary['p50']} ms · p95 {stage_summary['p95']} ms")
+        self.stdout.write(f"   Tiers:    {summary['tiers']}")
+        self.stdout.write(self.style.SUCCESS(f"\n✅ Results written to {options['output']}\n"))
+
+    def summarize(self, runs):
+        labelled = [run for run in runs if run["correct"] is not None]
+        correct = sum(1 for run in labelled if run["correct"])
+        latencies = [run["total_ms"] for run in runs]
+
+        tiers = {}
+        for run in runs:
+            tiers[run["tier"]] = tiers.get(run["tier"], 0) + 1
+
+        return {
+            "runs": len(runs),
+            "labelled": len(labelled),
+            "correct": correct,
+            "accuracy": round(correct / len(labelled), 4) if labelled else None,
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "mean": round(sum(latencies) / len(latencies), 1),
+            },
+            "stages_ms": {
+                stage: {
+                    "p50": percentile([run["timings"].get(stage, 0.0) for run in runs], 50),
+                    "p95": percentile([run["timings"].get(stage, 0.0) for run in runs], 95),
+                }
+                for stage in STAGES
+            },
+            "tiers": tiers,
+        }
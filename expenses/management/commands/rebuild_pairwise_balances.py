@@ -0,0 +1,37 @@
+"""
+rebuild_pairwise_balances.py
+----------------------------
+Django management command to recompute the PairwiseBalance table from
+ExpenseSplit and PaymentHistory.
+
+Run once after deploying the table, and whenever the maintained balances
+are suspected to have drifted.
+
+Usage:
+    python manage.py rebuild_pairwise_balances
+    python manage.py rebuild_pairwise_balances --group 12 --group 15
+"""
+
+from django.core.management.base import BaseCommand
+
+from expenses.balances import rebuild_pairwise_balances
+
+
+class Command(BaseCommand):
+    help = "Recomputes pairwise balances between users from expenses and settlements."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--group",
+            type=int,
+            action="append",
+            dest="groups",
+            help="Only rebuild this group (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("\n🔄 Rebuilding pairwise balances..."))
+
+        written = rebuild_pairwise_balances(options["groups"])
+
+        self.stdout.write(self.style.SUCCESS(f"\n✅ {written} pair balance(s) written.\n"))
@@ -0,0 +1,61 @@
+"""
+snapshot_group_balances.py
+--------------------------
+Django management command to write periodic GroupBalanceSnapshot
+checkpoints, so "balances as of" queries never replay more than one
+interval of history.
+
+A group only gets a new snapshot if something happened since its latest
+one. Schedule it (cron) e.g. once a day.
+
+Usage:
+    python manage.py snapshot_group_balances
+    python manage.py snapshot_group_balances --group 12
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from expenses.models import Expense
+from expenses.snapshots import take_group_snapshot
+from groups.models import Group
+from payments.models import PaymentHistory
+
+
+class Command(BaseCommand):
+    help = "Writes a balance snapshot for every group with activity since its last one."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--group",
+            type=int,
+            action="append",
+            dest="groups",
+            help="Only snapshot this group (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        groups = Group.objects.annotate(last_snapshot=Max("balance_snapshots__taken_at"))
+        if options["groups"]:
+            groups = groups.filter(id__in=options["groups"])
+
+        written = 0
+        for group in groups.iterator():
+            if not self.has_activity(group, since=group.last_snapshot):
+                continue
+            take_group_snapshot(group, reason="PERIODIC", at=now)
+            written += 1
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Wrote {written} balance snapshot(s)"))
+
+    def has_activity(self, group, since):
+        expenses = Expense.objects.filter(group=group)
+        payments = PaymentHistory.objects.filter(settlement__group=group)
+        if since is not None:
+            expenses = expenses.filter(created_at__gt=since)
+            payments = payments.filter(confirmed_at__gt=since)
+
+        return expenses.exists() or payments.exists()
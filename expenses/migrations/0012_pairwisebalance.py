@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 07:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0011_alter_expense_id_alter_expensesplit_id'),
+        ('groups', '0009_group_last_settled_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PairwiseBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('net_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pairwise_balances', to='groups.group')),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_a', 'user_b'], name='expenses_pa_user_a__33244d_idx'), models.Index(fields=['user_b', 'user_a'], name='expenses_pa_user_b__29f2ae_idx')],
+                'constraints': [models.UniqueConstraint(fields=('group', 'user_a', 'user_b'), name='unique_pairwise_balance')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-19 07:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0013_expense_archive'),
+        ('groups', '0010_invite_expiry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('balances', models.JSONField(default=dict)),
+                ('reason', models.CharField(choices=[('SETTLEMENT', 'Settlement confirmed'), ('PERIODIC', 'Periodic checkpoint')], max_length=20)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['group', 'created_at'], name='expenses_ex_group_i_884b32_idx'),
+        ),
+        migrations.AddField(
+            model_name='groupbalancesnapshot',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='groups.group'),
+        ),
+        migrations.AddIndex(
+            model_name='groupbalancesnapshot',
+            index=models.Index(fields=['group', 'taken_at'], name='expenses_gr_group_i_d0dcda_idx'),
+        ),
+    ]
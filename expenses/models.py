@@ -22,6 +22,9 @@ class Expense(models.Model):
 
     class Meta:
         ordering = ["-created_at"]   # newest expense first
+        indexes = [
+            models.Index(fields=["group", "created_at"]),
+        ]
 
     def __str__(self):
         return f"{self.description} - ₹{self.amount}"
@@ -34,3 +37,121 @@ class ExpenseSplit(models.Model):
 
     def __str__(self):
         return f"{self.user.full_name} owes ₹{self.amount}"
+
+
+class PairwiseBalance(models.Model):
+    """
+    Running net debt between two members of a group, kept up to date on
+    every split write and settlement confirmation so "who owes whom"
+    never has to scan ExpenseSplit.
+
+    Each pair is stored once with user_a.id < user_b.id.
+    net_amount > 0  → user_b owes user_a
+    net_amount < 0  → user_a owes user_b
+    """
+
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="pairwise_balances")
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    net_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["group", "user_a", "user_b"], name="unique_pairwise_balance"),
+        ]
+        indexes = [
+            models.Index(fields=["user_a", "user_b"]),
+            models.Index(fields=["user_b", "user_a"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_a_id} ↔ {self.user_b_id} ({self.group_id}): {self.net_amount}"
+
+
+class GroupBalanceSnapshot(models.Model):
+    """
+    Immutable all-time net position of every member of a group at
+    `taken_at` (paid - share of expenses + settlements paid - received).
+    Written when a settlement is confirmed and by the periodic
+    snapshot_group_balances command; balances_as_of replays only what
+    happened after the nearest one.
+    """
+    REASON_CHOICES = [
+        ("SETTLEMENT", "Settlement confirmed"),
+        ("PERIODIC", "Periodic checkpoint"),
+    ]
+
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="balance_snapshots")
+    taken_at = models.DateTimeField()
+    balances = models.JSONField(default=dict)      # {"<user_id>": "<decimal>"}
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["group", "taken_at"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Balance snapshots are immutable.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.group_id} @ {self.taken_at:%Y-%m-%d %H:%M} ({self.reason})"
+
+
+# =================== ARCHIVE TIER ===================
+# Expenses from before a group's settled checkpoint are moved here by the
+# archive_expenses command. Rows keep their original ids.
+
+class ArchivedExpense(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="archived_expenses")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.CharField(max_length=255)
+    paid_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_paid_expenses")
+    split_type = models.CharField(max_length=20, choices=Expense.SPLIT_TYPES, default="equal")
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["group", "created_at"]),
+            models.Index(fields=["paid_by", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.description} - ₹{self.amount} (archived)"
+
+
+class ArchivedExpenseSplit(models.Model):
+    expense = models.ForeignKey(ArchivedExpense, on_delete=models.CASCADE, related_name="splits")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_expense_splits")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.user.full_name} owed ₹{self.amount} (archived)"
+
+
+class ArchivedMemberTotals(models.Model):
+    """
+    Per-member running totals of everything archived for a group, so
+    all-time summaries can add one row instead of scanning the archive.
+    """
+
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="archived_totals")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_totals")
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    need_to_pay = models.DecimalField(max_digits=14, decimal_places=2, default=0)   # my shares of others' expenses
+    get_back = models.DecimalField(max_digits=14, decimal_places=2, default=0)      # others' shares of my expenses
+    archived_through = models.DateTimeField(null=True, blank=True)                  # newest archived created_at
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["group", "user"], name="unique_archived_member_totals"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.group_id}: archived through {self.archived_through}"
@@ -0,0 +1,208 @@
+"""
+Pluggable OCR engines for bill scanning.
+
+- TesserocrBackend:   libtesseract loaded IN-PROCESS through tesserocr.
+                      Language data is loaded once per worker thread and
+                      reused, so there is no subprocess or temp file per call.
+- PytesseractBackend: the tesseract CLI through pytesseract (fallback when
+                      tesserocr is not installed). Spawns one process per call.
+
+tesserocr is an optional dependency (it needs libtesseract to build), so it
+is not pinned in requirements.txt. The backend in use is logged at startup.
+
+Configuration (environment variables):
+    OCR_BACKEND      "auto" (default), "tesserocr" or "pytesseract"
+    OCR_LANG         tesseract language, default "eng"
+    TESSERACT_CMD    path to the tesseract binary (pytesseract only)
+    TESSDATA_PREFIX  path to the tessdata directory (tesserocr only)
+"""
+
+import os
+import shutil
+import logging
+import threading
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Default install location of the UB Mannheim build on Windows
+WINDOWS_TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+
+class OCRBackend:
+    """
+    Interface every OCR engine implements.
+
+    image_to_data() returns the same dict shape as
+    pytesseract.image_to_data(output_type=Output.DICT), limited to the
+    keys the bill parser needs: text, conf, block_num, par_num, line_num.
+    """
+
+    name = "base"
+
+    def image_to_string(self, img):
+        raise NotImplementedError
+
+    def image_to_data(self, img):
+        raise NotImplementedError
+
+    def warm_up(self):
+        """
+        Run one tiny OCR call so the engine (and its language data)
+        is loaded before the first real bill arrives.
+        """
+        self.image_to_string(Image.new("RGB", (64, 32), "white"))
+
+
+class PytesseractBackend(OCRBackend):
+    name = "pytesseract"
+
+    def __init__(self, lang="eng"):
+        import pytesseract
+
+        self.pytesseract = pytesseract
+        self.lang = lang
+
+        cmd = find_tesseract_cmd()
+        if cmd:
+            pytesseract.pytesseract.tesseract_cmd = cmd
+
+    def image_to_string(self, img):
+        return self.pytesseract.image_to_string(img, lang=self.lang)
+
+    def image_to_data(self, img):
+        return self.pytesseract.image_to_data(
+            img, lang=self.lang, output_type=self.pytesseract.Output.DICT
+        )
+
+
+class TesserocrBackend(OCRBackend):
+    name = "tesserocr"
+
+    def __init__(self, lang="eng"):
+        import tesserocr
+
+        self.tesserocr = tesserocr
+        self.lang = lang
+        self.tessdata = os.getenv("TESSDATA_PREFIX") or tesserocr.get_languages()[0]
+        # PyTessBaseAPI is not thread-safe: one engine per thread, reused forever
+        self._local = threading.local()
+
+        # Load the engine now so missing tessdata / language files fail here
+        # (RuntimeError) instead of on the first bill
+        self._api()
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+
+        if api is None:
+            api = self.tesserocr.PyTessBaseAPI(path=self.tessdata, lang=self.lang)
+            self._local.api = api
+
+        return api
+
+    def image_to_string(self, img):
+        api = self._api()
+        api.SetImage(img)
+        return api.GetUTF8Text()
+
+    def image_to_data(self, img):
+        RIL = self.tesserocr.RIL
+        api = self._api()
+        api.SetImage(img)
+        api.Recognize()
+
+        data = {"text": [], "conf": [], "block_num": [], "par_num": [], "line_num": []}
+        block = par = line = 0
+
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+
+        for word in self.tesserocr.iterate_level(iterator, RIL.WORD):
+            if word.IsAtBeginningOf(RIL.BLOCK):
+                block += 1
+            if word.IsAtBeginningOf(RIL.PARA):
+                par += 1
+            if word.IsAtBeginningOf(RIL.TEXTLINE):
+                line += 1
+
+            data["text"].append(word.GetUTF8Text(RIL.WORD) or "")
+            data["conf"].append(word.Confidence(RIL.WORD))
+            data["block_num"].append(block)
+            data["par_num"].append(par)
+            data["line_num"].append(line)
+
+        return data
+
+
+def find_tesseract_cmd():
+    """
+    Locate the tesseract binary: TESSERACT_CMD, then PATH, then the
+    default Windows install. Returns None if nothing is found.
+    """
+    cmd = os.getenv("TESSERACT_CMD")
+    if cmd:
+        return cmd
+
+    cmd = shutil.which("tesseract")
+    if cmd:
+        return cmd
+
+    if os.path.exists(WINDOWS_TESSERACT_CMD):
+        return WINDOWS_TESSERACT_CMD
+
+    return None
+
+
+BACKENDS = {
+    TesserocrBackend.name: TesserocrBackend,
+    PytesseractBackend.name: PytesseractBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_ocr_backend():
+    """
+    Return the process-wide OCR backend, creating it on first use.
+    """
+    global _backend
+
+    if _backend is not None:
+        return _backend
+
+    with _backend_lock:
+        if _backend is None:
+            choice = os.getenv("OCR_BACKEND", "auto").lower()
+            lang = os.getenv("OCR_LANG", "eng")
+
+            if choice == "auto":
+                try:
+                    _backend = TesserocrBackend(lang)
+                except ImportError:
+                    logger.info("tesserocr not installed, falling back to pytesseract")
+                    _backend = PytesseractBackend(lang)
+                except RuntimeError as e:
+                    # tesserocr is installed but can't load its language data
+                    logger.warning("tesserocr unavailable (%s), falling back to pytesseract", e)
+                    _backend = PytesseractBackend(lang)
+            else:
+                _backend = BACKENDS[choice](lang)
+
+            logger.info("Using %s OCR backend", _backend.name)
+
+    return _backend
+
+
+def warm_up_ocr_backend():
+    """
+    Load the OCR engine at worker start. Never raises: a missing engine
+    should only fail bill scans, not stop the app from booting.
+    """
+    try:
+        get_ocr_backend().warm_up()
+    except Exception as e:
+        logger.warning("OCR warm-up failed: %s", e)
@@ -0,0 +1,99 @@
+"""
+Point-in-time group balances.
+
+balances_as_of(group, at) loads the newest GroupBalanceSnapshot at or
+before `at` and replays only the expenses (hot and archived) and confirmed
+settlement payments after it, so a historical query costs a handful of
+aggregate queries however old the group is.
+
+Snapshots are immutable: editing an expense older than a snapshot does not
+rewrite it (the snapshot records what the balances were at the time).
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import (
+    Expense,
+    ExpenseSplit,
+    ArchivedExpense,
+    ArchivedExpenseSplit,
+    GroupBalanceSnapshot,
+)
+
+
+def _add(balances, rows, user_key, sign):
+    for row in rows:
+        balances[row[user_key]] += sign * row["total"]
+
+
+def _replay(group_id, balances, since, until):
+    """
+    Apply everything in (since, until] to `balances` ({user_id: Decimal}).
+    """
+    from payments.models import PaymentHistory
+
+    def window(field):
+        bounds = {f"{field}__lte": until}
+        if since is not None:
+            bounds[f"{field}__gt"] = since
+        return bounds
+
+    for expenses, splits in ((Expense, ExpenseSplit), (ArchivedExpense, ArchivedExpenseSplit)):
+        _add(balances, (
+            expenses.objects.filter(group_id=group_id, **window("created_at"))
+            .values("paid_by_id").annotate(total=Sum("amount")).order_by()
+        ), "paid_by_id", 1)
+        _add(balances, (
+            splits.objects.filter(expense__group_id=group_id, **window("expense__created_at"))
+            .values("user_id").annotate(total=Sum("amount")).order_by()
+        ), "user_id", -1)
+
+    payments = (
+        PaymentHistory.objects.filter(settlement__group_id=group_id, **window("confirmed_at"))
+        .values("paid_by_id", "received_by_id").annotate(total=Sum("amount")).order_by()
+    )
+    for row in payments:
+        balances[row["paid_by_id"]] += row["total"]
+        balances[row["received_by_id"]] -= row["total"]
+
+
+def balances_as_of(group, at=None):
+    """
+    Returns: ({user_id: Decimal}, snapshot used or None)
+    """
+    at = at or timezone.now()
+    group_id = getattr(group, "id", group)
+
+    snapshot = (
+        GroupBalanceSnapshot.objects
+        .filter(group_id=group_id, taken_at__lte=at)
+        .order_by("-taken_at", "-id")
+        .first()
+    )
+
+    balances = defaultdict(Decimal)
+    since = None
+    if snapshot is not None:
+        for user_id, amount in snapshot.balances.items():
+            balances[int(user_id)] = Decimal(amount)
+        since = snapshot.taken_at
+
+    _replay(group_id, balances, since, at)
+
+    return {user_id: amount for user_id, amount in balances.items() if amount}, snapshot
+
+
+def take_group_snapshot(group, reason="PERIODIC", at=None):
+    at = at or timezone.now()
+    balances, _ = balances_as_of(group, at)
+
+    return GroupBalanceSnapshot.objects.create(
+        group_id=getattr(group, "id", group),
+        taken_at=at,
+        balances={str(user_id): str(amount) for user_id, amount in balances.items()},
+        reason=reason,
+    )
@@ -1,3 +1,455 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from groups.models import Group
+from payments.models import Settlement
+from payments.services import bulk_settle
+from . import ai_utils, ocr_backends
+from .archive import archive_expenses, report_expenses
+from .balances import friend_balances, rebuild_pairwise_balances
+from .models import Expense, ExpenseSplit, ArchivedExpense, ArchivedMemberTotals, GroupBalanceSnapshot
+from .snapshots import balances_as_of, take_group_snapshot
+
+User = get_user_model()
+
+
+class ExpenseArchiveTests(TestCase):
+
+    def setUp(self):
+        self.me = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.me)
+        self.group.members.add(self.me, self.friend)
+
+        self.old = [self.expense(self.me, "100.00", days_ago=200), self.expense(self.friend, "40.00", days_ago=150)]
+        self.recent = self.expense(self.me, "60.00", days_ago=1)
+
+        self.group.last_settled_at = timezone.now() - timedelta(days=100)
+        self.group.save()
+        self.client.force_login(self.me)
+
+    def expense(self, paid_by, amount, days_ago):
+        expense = Expense.objects.create(
+            group=self.group, amount=Decimal(amount), description=f"{amount} spend", paid_by=paid_by
+        )
+        for user in (self.me, self.friend):
+            ExpenseSplit.objects.create(expense=expense, user=user, amount=Decimal(amount) / 2)
+        Expense.objects.filter(id=expense.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return expense
+
+    def archive(self):
+        return archive_expenses(timezone.now() - timedelta(days=90), chunk_size=1)
+
+    def test_moves_only_settled_and_old_expenses(self):
+        stats = self.archive()
+
+        self.assertEqual((stats["expenses"], stats["splits"]), (2, 4))
+        self.assertEqual(list(Expense.objects.values_list("id", flat=True)), [self.recent.id])
+        self.assertEqual(
+            sorted(ArchivedExpense.objects.values_list("id", flat=True)), sorted(e.id for e in self.old)
+        )
+
+        mine = ArchivedMemberTotals.objects.get(group=self.group, user=self.me)
+        self.assertEqual(
+            (mine.total_paid, mine.need_to_pay, mine.get_back),
+            (Decimal("100.00"), Decimal("20.00"), Decimal("50.00")),
+        )
+
+    def test_reports_are_unchanged_by_archiving(self):
+        before = self.client.get(reverse("accounts:report")).context
+        self.archive()
+        after = self.client.get(reverse("accounts:report")).context
+
+        for key in ("total_paid", "need_to_pay", "will_get_back", "balance"):
+            self.assertEqual(after[key], before[key], key)
+        self.assertEqual([e.id for e in after["expenses"]], [e.id for e in before["expenses"]])
+        self.assertEqual(after["group_report"], before["group_report"])
+
+    def test_dashboard_and_profile_totals_are_unchanged_by_archiving(self):
+        pages = [
+            (reverse("accounts:dashboard"), {"weeks": "all"}, (
+                "total_expenses", "total_paid", "total_need_to_pay", "total_will_get_back",
+                "total_pay", "total_get", "total_spending",
+            )),
+            (reverse("accounts:profile"), {}, ("total_paid_by_me", "total_need_to_pay", "total_get_back")),
+            (reverse("accounts:my_expenses"), {}, ()),
+        ]
+        before = [self.client.get(url, params).context for url, params, _ in pages]
+        self.archive()
+        after = [self.client.get(url, params).context for url, params, _ in pages]
+
+        for (url, _, keys), old, new in zip(pages, before, after):
+            for key in keys:
+                self.assertEqual(new[key], old[key], f"{url} {key}")
+
+        self.assertEqual(
+            [e.id for e in after[0]["recent_expenses"]], [e.id for e in before[0]["recent_expenses"]]
+        )
+        self.assertEqual([e.id for e in after[2]["expenses"]], [self.recent.id, self.old[0].id])
+
+    def test_recent_range_skips_the_archive(self):
+        self.archive()
+        today = timezone.now().date()
+
+        with self.assertNumQueries(2):
+            expenses = report_expenses(self.me, str(today - timedelta(days=7)), str(today))
+
+        self.assertEqual([e.id for e in expenses], [self.recent.id])
+
+    def test_pairwise_rebuild_counts_archived_splits(self):
+        rebuild_pairwise_balances()
+        before = friend_balances(self.me)
+
+        self.archive()
+        rebuild_pairwise_balances()
+
+        self.assertEqual(friend_balances(self.me), before)
+
+
+class BalanceSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.me = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.group = Group.objects.create(title="Flat", created_by=self.me)
+        self.group.members.add(self.me, self.friend)
+
+    def expense(self, amount, days_ago):
+        expense = Expense.objects.create(
+            group=self.group, amount=Decimal(amount), description="Rent", paid_by=self.me
+        )
+        for user in (self.me, self.friend):
+            ExpenseSplit.objects.create(expense=expense, user=user, amount=Decimal(amount) / 2)
+        Expense.objects.filter(id=expense.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_as_of_replays_from_nearest_snapshot(self):
+        self.expense("100.00", days_ago=10)
+        take_group_snapshot(self.group, at=timezone.now() - timedelta(days=8))
+        self.expense("40.00", days_ago=5)
+
+        past, snapshot = balances_as_of(self.group, timezone.now() - timedelta(days=7))
+        self.assertIsNotNone(snapshot)
+        self.assertEqual(past, {self.me.id: Decimal("50.00"), self.friend.id: Decimal("-50.00")})
+
+        now, _ = balances_as_of(self.group)
+        self.assertEqual(now, {self.me.id: Decimal("70.00"), self.friend.id: Decimal("-70.00")})
+
+        before_anything, snapshot = balances_as_of(self.group, timezone.now() - timedelta(days=30))
+        self.assertEqual((before_anything, snapshot), ({}, None))
+
+    def test_settlement_confirmation_writes_snapshot(self):
+        self.expense("100.00", days_ago=1)
+        settlement = Settlement.objects.create(
+            group=self.group, payer=self.friend, receiver=self.me, amount=Decimal("50.00")
+        )
+
+        bulk_settle(self.group, [settlement.id])
+
+        snapshot = GroupBalanceSnapshot.objects.get(group=self.group)
+        self.assertEqual(snapshot.reason, "SETTLEMENT")
+        self.assertEqual(balances_as_of(self.group)[0], {})
+
+    def test_snapshots_are_immutable(self):
+        snapshot = take_group_snapshot(self.group)
+
+        with self.assertRaises(ValueError):
+            snapshot.save()
+
+    def test_api(self):
+        self.expense("100.00", days_ago=3)
+        self.client.force_login(self.me)
+        url = reverse("groups:group_balances_as_of", args=[self.group.id])
+
+        today = self.client.get(url).json()
+        last_week = self.client.get(url, {"at": str((timezone.now() - timedelta(days=7)).date())}).json()
+
+        self.assertEqual(today["balances"][0], {"user_id": self.me.id, "full_name": "Me", "amount": "50.00"})
+        self.assertEqual(last_week["balances"], [])
+
+
+class OCRBackendSelectionTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ocr_backends, "_backend", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_tesserocr(self, api_error=None):
+        def api(path, lang):
+            if api_error:
+                raise api_error
+            return mock.Mock()
+
+        return types.SimpleNamespace(get_languages=lambda: ("/tessdata", ["eng"]), PyTessBaseAPI=api)
+
+    def select(self, tesserocr):
+        with mock.patch.dict(sys.modules, {"tesserocr": tesserocr}), \
+                mock.patch.dict("os.environ", {"OCR_BACKEND": "auto"}):
+            return ocr_backends.get_ocr_backend()
+
+    def test_auto_prefers_tesserocr(self):
+        self.assertEqual(self.select(self.fake_tesserocr()).name, "tesserocr")
+
+    def test_auto_falls_back_when_tesserocr_is_missing(self):
+        self.assertEqual(self.select(None).name, "pytesseract")
+
+    def test_auto_falls_back_when_tessdata_is_missing(self):
+        backend = self.select(self.fake_tesserocr(RuntimeError("Failed to init API, possibly an invalid tessdata path")))
+        self.assertEqual(backend.name, "pytesseract")
+
+    def test_chosen_backend_is_logged(self):
+        with self.assertLogs("expenses.ocr_backends", "INFO") as logs:
+            self.select(None)
+
+        self.assertEqual(logs.output, [
+            "INFO:expenses.ocr_backends:tesserocr not installed, falling back to pytesseract",
+            "INFO:expenses.ocr_backends:Using pytesseract OCR backend",
+        ])
+
+
+class BatchBillScanTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x"
+        )
+        self.client.force_login(self.user)
+
+    def test_batch_yields_in_completion_order_with_input_index(self):
+        delays = {"slow.jpg": 0.2, "fast.jpg": 0.0, "mid.jpg": 0.1}
+
+        def fake_extract(path):
+            time.sleep(delays[path])
+            return {"success": True, "path": path}
+
+        with mock.patch.object(ai_utils, "extract_bill_data", fake_extract), \
+                mock.patch.object(ai_utils, "_get_batch_pool", return_value=ThreadPoolExecutor(3)):
+            results = list(ai_utils.extract_bill_data_batch(["slow.jpg", "fast.jpg", "mid.jpg"]))
+
+        self.assertEqual([index for index, _ in results], [1, 2, 0])
+        self.assertEqual([result["path"] for _, result in results], ["fast.jpg", "mid.jpg", "slow.jpg"])
+
+    def test_crashed_worker_fails_only_its_bill_and_resets_the_pool(self):
+        class CrashingPool:
+            def submit(self, fn, path):
+                future = Future()
+                if path == "bad.jpg":
+                    future.set_exception(BrokenProcessPool())
+                else:
+                    future.set_result({"success": True})
+                return future
+
+        with mock.patch.object(ai_utils, "_batch_pool", CrashingPool()):
+            results = dict(ai_utils.extract_bill_data_batch(["ok.jpg", "bad.jpg"]))
+            self.assertIsNone(ai_utils._batch_pool)
+
+        self.assertTrue(results[0]["success"])
+        self.assertFalse(results[1]["success"])
+
+    def test_view_streams_one_line_per_bill_and_removes_temp_files(self):
+        saved = []
+
+        def fake_batch(paths, max_workers=None):
+            saved.extend(paths)
+            yield 1, {"success": False, "message": "Unable to detect bill amount"}
+            yield 0, {"success": True, "amount": 120.0, "title": "Cafe", "tier": "fast"}
+
+        bills = [SimpleUploadedFile(name, b"img", content_type="image/jpeg") for name in ("a.jpg", "b.jpg")]
+        with mock.patch("expenses.views.extract_bill_data_batch", fake_batch):
+            response = self.client.post(reverse("expenses:scan_bill_batch"), {"bills": bills})
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(lines, [
+            {"index": 1, "name": "b.jpg", "success": False, "message": "Unable to detect bill amount"},
+            {"index": 0, "name": "a.jpg", "success": True, "amount": 120.0, "description": "Cafe", "tier": "fast"},
+        ])
+        self.assertFalse(any(os.path.exists(path) for path in saved))
+
+
+class FakeOCRBackend:
+    """
+    image_to_data answers with fixed lines at a fixed confidence;
+    image_to_string records the image size it was given.
+    """
+    name = "fake"
+
+    def __init__(self, lines, conf, full_text=""):
+        self.lines, self.conf, self.full_text = lines, conf, full_text
+        self.data_sizes, self.string_sizes = [], []
+
+    def image_to_data(self, img):
+        self.data_sizes.append(img.size)
+        data = {"text": [], "conf": [], "block_num": [], "par_num": [], "line_num": []}
+        for line_num, line in enumerate(self.lines, start=1):
+            for word in line.split():
+                data["text"].append(word)
+                data["conf"].append(self.conf)
+                data["block_num"].append(1)
+                data["par_num"].append(1)
+                data["line_num"].append(line_num)
+        return data
+
+    def image_to_string(self, img):
+        self.string_sizes.append(img.size)
+        return self.full_text
+
+
+class TieredOCRTests(SimpleTestCase):
+
+    def run_tiers(self, backend, width):
+        img = Image.new("RGB", (width, width), "white")
+        with mock.patch.object(ai_utils, "get_ocr_backend", return_value=backend):
+            return ai_utils._tiered_ocr(img, {})
+
+    def test_confident_fast_pass_skips_full_resolution(self):
+        backend = FakeOCRBackend(["Cafe Mocha", "Total 450.00"], conf=95)
+
+        _, _, amount, tier = self.run_tiers(backend, 2000)
+
+        self.assertEqual((amount, tier), (450.0, "fast"))
+        self.assertEqual(backend.data_sizes, [(ai_utils.FAST_PASS_MAX_WIDTH, ai_utils.FAST_PASS_MAX_WIDTH)])
+        self.assertEqual(backend.string_sizes, [])
+
+    def test_low_confidence_escalates_to_full_resolution(self):
+        backend = FakeOCRBackend(["Cafe Mocha", "Total 458.00"], conf=40, full_text="Cafe Mocha\nTotal 450.00")
+
+        _, _, amount, tier = self.run_tiers(backend, 2000)
+
+        self.assertEqual((amount, tier), (450.0, "full"))
+        self.assertEqual(backend.string_sizes, [(2000, 2000)])
+
+    def test_missing_amount_escalates(self):
+        backend = FakeOCRBackend(["Cafe Mocha"], conf=95, full_text="Cafe Mocha\nTotal 99.00")
+
+        self.assertEqual(self.run_tiers(backend, 2000)[2:], (99.0, "full"))
+
+    def test_small_image_is_read_once(self):
+        backend = FakeOCRBackend(["Cafe Mocha", "Total 450.00"], conf=20)
+
+        self.assertEqual(self.run_tiers(backend, 600)[2:], (450.0, "full"))
+        self.assertEqual(backend.string_sizes, [])
+
+
+def text_pdf(lines):
+    """
+    Minimal one-page PDF whose text layer holds `lines`.
+    """
+    text = " ".join(f"({line}) Tj 0 -20 Td" for line in lines)
+    stream = f"BT /F1 12 Tf 50 750 Td {text} ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    pdf, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+class PDFBillTests(SimpleTestCase):
+
+    def write(self, data=None, image=None):
+        handle, path = tempfile.mkstemp(suffix=".pdf")
+        os.close(handle)
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        if image is not None:
+            image.save(path, "PDF")
+        else:
+            with open(path, "wb") as f:
+                f.write(data)
+        return path
+
+    def test_text_layer_is_read_without_ocr(self):
+        path = self.write(text_pdf(["Swiggy Order Summary", "Grand Total: 1,921.50"]))
+
+        with mock.patch.object(ai_utils, "get_ocr_backend") as backend:
+            result = ai_utils.extract_bill_data(path, cleanup=False)
+
+        backend.assert_not_called()
+        self.assertEqual((result["success"], result["amount"], result["tier"]), (True, 1921.5, "pdf_text"))
+
+    def test_scanned_pdf_ocrs_the_embedded_page_image(self):
+        path = self.write(image=Image.new("RGB", (800, 1000), "white"))
+        backend = FakeOCRBackend(["Cafe Mocha", "Total 450.00"], conf=95)
+
+        with mock.patch.object(ai_utils, "get_ocr_backend", return_value=backend):
+            result = ai_utils.extract_bill_data(path, cleanup=False)
+
+        self.assertEqual((result["success"], result["amount"], result["tier"]), (True, 450.0, "full"))
+        self.assertEqual(backend.data_sizes, [(800, 1000)])
+
+
+class BenchmarkOCRCommandTests(SimpleTestCase):
+
+    def test_reports_accuracy_tiers_and_latency(self):
+        corpus = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, corpus)
+        for name in ("a.jpg", "b.png", "c.pdf", "notes.txt"):
+            open(os.path.join(corpus, name), "wb").close()
+        with open(os.path.join(corpus, "labels.csv"), "w") as f:
+            f.write("filename,amount\na.jpg,100.00\nb.png,50.00\n")
+
+        answers = {"a.jpg": 100.0, "b.png": 55.0, "c.pdf": 10.0}
+
+        def fake_extract(path, cleanup=True):
+            return {
+                "success": True, "amount": answers[os.path.basename(path)], "tier": "fast",
+                "timings": {"decode": 1.0, "preprocess": 1.0, "ocr": 5.0, "parse": 1.0},
+            }
+
+        output = os.path.join(corpus, "bench.json")
+        with mock.patch("expenses.management.commands.benchmark_ocr.extract_bill_data", fake_extract), \
+                mock.patch("expenses.management.commands.benchmark_ocr.get_ocr_backend",
+                           return_value=types.SimpleNamespace(name="fake")):
+            call_command("benchmark_ocr", corpus, "--repeat", "2", "--output", output, stdout=io.StringIO())
+
+        with open(output) as f:
+            report = json.load(f)
+
+        summary = report["summary"]
+        self.assertEqual(report["backend"], "fake")
+        self.assertEqual((summary["runs"], summary["labelled"], summary["correct"]), (6, 4, 2))
+        self.assertEqual(summary["accuracy"], 0.5)
+        self.assertEqual(summary["tiers"], {"fast": 6})
+        self.assertEqual(summary["stages_ms"]["ocr"], {"p50": 5.0, "p95": 5.0})
 
-# Create your tests here.
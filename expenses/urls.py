@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import add_expense, delete_expense, edit_expense, scan_bill
+from .views import add_expense, delete_expense, edit_expense, scan_bill, scan_bill_batch
 
 app_name = "expenses"
 
@@ -8,4 +8,5 @@ urlpatterns = [
     path("delete/<int:expense_id>/", delete_expense, name="delete_expense"),    
     path("edit/<int:expense_id>/", edit_expense, name="edit_expense"),
     path("scan-bill/", scan_bill, name="scan_bill"),
+    path("scan-bill/batch/", scan_bill_batch, name="scan_bill_batch"),
 ]
@@ -1,8 +1,14 @@
-from django.db.models import Sum
+from django.db.models import Sum, Q, F
+from django.contrib.auth import get_user_model
+from groups.models import Group
 from .models import Expense, ExpenseSplit   
 from collections import defaultdict
 from decimal import Decimal
 
+User = get_user_model()
+
+CENT = Decimal("0.01")
+
 
 def calculate_user_balance(user):
     paid = Expense.objects.filter(paid_by=user).aggregate(total=Sum('amount'))['total'] or 0
@@ -16,7 +22,7 @@ from collections import defaultdict
 def calculate_group_balances(group):
     balances = defaultdict(float)
 
-    expenses = group.expenses.all()
+    expenses = group.expenses.select_related("paid_by").prefetch_related("splits__user")
 
     if group.last_settled_at:
         expenses = expenses.filter(created_at__gt=group.last_settled_at)
@@ -36,17 +42,30 @@ def calculate_group_balances(group):
 
 
 def calculate_settlements(balances):
+    """
+    Greedy who-pays-whom for one group's balances ({user or user id: amount}).
 
+    Amounts are worked in Decimal paise and both sides are taken largest
+    first (ties by pk), so the same balances always give the same transfers
+    whatever order the dict was built in.
+    """
     creditors = []
     debtors = []
 
     # Separate users
     for user, amount in balances.items():
+        amount = Decimal(str(amount)).quantize(CENT)
         if amount > 0:
             creditors.append([user, amount])
         elif amount < 0:
             debtors.append([user, -amount])  # store positive debt
 
+    def largest_first(entry):
+        return -entry[1], getattr(entry[0], "pk", entry[0])
+
+    creditors.sort(key=largest_first)
+    debtors.sort(key=largest_first)
+
     settlements = []
 
     i = j = 0
@@ -72,3 +91,85 @@ def calculate_settlements(balances):
             j += 1
 
     return settlements
+
+
+
+
+def calculate_user_settle_up(user):
+    """
+    Who `user` owes / is owed across ALL their groups, in four queries
+    (groups, paid totals, owed totals, counterparties) however many
+    groups they are in.
+
+    Each group is settled on its own (same transfers group_detail shows),
+    then the transfers are netted per counterparty so the user gets one
+    payment per person instead of one per person per group.
+
+    Returns: {
+        "transfers": [{"from": User, "to": User, "amount": Decimal}],
+        "breakdown": {counterparty_id: [{"group": Group, "amount": Decimal}]},
+    }
+    amount in breakdown is positive when the counterparty owes `user`.
+    """
+    groups = {g.id: g for g in Group.objects.filter(members=user).only("id", "title", "last_settled_at")}
+
+    # Only expenses after each group's own checkpoint
+    since_checkpoint = (
+        Q(expense__group__last_settled_at__isnull=True)
+        | Q(expense__created_at__gt=F("expense__group__last_settled_at"))
+    )
+
+    paid = (
+        Expense.objects
+        .filter(
+            Q(group__last_settled_at__isnull=True) | Q(created_at__gt=F("group__last_settled_at")),
+            group_id__in=groups,
+        )
+        .values("group_id", "paid_by_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    owed = (
+        ExpenseSplit.objects
+        .filter(since_checkpoint, expense__group_id__in=groups)
+        .values("expense__group_id", "user_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+
+    group_balances = defaultdict(lambda: defaultdict(Decimal))
+    for row in paid:
+        group_balances[row["group_id"]][row["paid_by_id"]] += row["total"]
+    for row in owed:
+        group_balances[row["expense__group_id"]][row["user_id"]] -= row["total"]
+
+    net = defaultdict(Decimal)
+    breakdown = defaultdict(list)
+
+    for group_id, balances in group_balances.items():
+        for s in calculate_settlements(dict(balances)):
+            if s["to"] == user.id:
+                counterparty, amount = s["from"], s["amount"]
+            elif s["from"] == user.id:
+                counterparty, amount = s["to"], -s["amount"]
+            else:
+                continue
+
+            net[counterparty] += amount
+            breakdown[counterparty].append({"group": groups[group_id], "amount": amount})
+
+    net = {pk: amount for pk, amount in net.items() if amount}
+    people = User.objects.in_bulk(list(net))
+
+    transfers = []
+    for pk, amount in sorted(net.items(), key=lambda item: (-abs(item[1]), item[0])):
+        if amount > 0:
+            transfers.append({"from": people[pk], "to": user, "amount": amount})
+        else:
+            transfers.append({"from": user, "to": people[pk], "amount": -amount})
+
+    return {
+        "transfers": transfers,
+        "breakdown": {pk: breakdown[pk] for pk in net},
+    }
+
@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from .models import Expense, ExpenseSplit
+from .balances import record_expense_splits
 from .forms import ExpenseForm
 from .services import (
     handle_equal_split,
@@ -10,12 +11,16 @@ from .services import (
     handle_custom_split
 )
 from groups.models import Group
+from groups import activity, counters
 from accounts.models import Notification
+from accounts.notifications import notify_all
 import os
 import uuid
-from .ai_utils import extract_bill_data
-from django.http import JsonResponse
+import json
+from .ai_utils import extract_bill_data, extract_bill_data_batch
+from django.http import JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.db import transaction
 
 User = get_user_model()
 
@@ -28,32 +33,40 @@ def add_expense(request, group_id):
         form = ExpenseForm(request.POST, group=group)
 
         if form.is_valid():
-            expense = form.save(commit=False)
-            expense.group = group
-            expense.paid_by = request.user
-            expense.save()
-
             users = form.cleaned_data["split_between"]
 
-            # Clear old splits (safety)
-            expense.splits.all().delete()
-
-            if expense.split_type == "equal":
-                handle_equal_split(expense, users)
-
-            elif expense.split_type == "percentage":
-                handle_percentage_split(expense, users, request.POST)
-
-            elif expense.split_type == "custom":
-                handle_custom_split(expense, users, request.POST)
-
-            # CREATE NOTIFICATIONS (IMPORTANT PART)
-            for member in users:
-                if member != request.user:
-                    Notification.objects.create(
-                        user=member,
-                        message=f"₹{expense.amount} added in group '{group.title}'"
-                    )
+            # Expense, splits and pairwise balances land together or not at all
+            with transaction.atomic():
+                expense = form.save(commit=False)
+                expense.group = group
+                expense.paid_by = request.user
+                expense.save()
+
+                # Clear old splits (safety)
+                expense.splits.all().delete()
+
+                if expense.split_type == "equal":
+                    handle_equal_split(expense, users)
+
+                elif expense.split_type == "percentage":
+                    handle_percentage_split(expense, users, request.POST)
+
+                elif expense.split_type == "custom":
+                    handle_custom_split(expense, users, request.POST)
+
+                record_expense_splits(expense)
+                counters.expense_added(group, expense.amount)
+                activity.record(
+                    group, "EXPENSE_ADDED", request.user, expense,
+                    amount=f"{expense.amount:.2f}", description=expense.description,
+                )
+
+            # CREATE NOTIFICATIONS (IMPORTANT PART) - one INSERT for everyone
+            notify_all(
+                Notification(user=member, message=f"₹{expense.amount} added in group '{group.title}'")
+                for member in users
+                if member != request.user
+            )
 
             return redirect("groups:group_detail", group.id)
 
@@ -84,13 +97,22 @@ def delete_expense(request, expense_id):
     if request.method == "POST":
 
         # Send notification to other users
-        for split in split_users:
-            Notification.objects.create(
-                user=split.user,
+        notify_all(
+            Notification(
+                user_id=split.user_id,
                 message=f"Expense '{expense.description}' was deleted in group {group.title}"
             )
-
-        expense.delete()
+            for split in split_users
+        )
+
+        with transaction.atomic():
+            record_expense_splits(expense, sign=-1)
+            counters.expense_removed(group, expense.amount)
+            activity.record(
+                group, "EXPENSE_DELETED", request.user, expense,
+                amount=f"{expense.amount:.2f}", description=expense.description,
+            )
+            expense.delete()
 
     return redirect("groups:group_detail", group_id=group.id)
 
@@ -101,24 +123,38 @@ def delete_expense(request, expense_id):
 def edit_expense(request, expense_id):
     expense = get_object_or_404(Expense, id=expense_id)
     group = expense.group
+    old_amount = expense.amount   # the bound form overwrites the instance
 
     if request.method == "POST":
         form = ExpenseForm(request.POST, instance=expense, group=group)
 
         if form.is_valid():
-            expense = form.save(commit=False)
-            expense.group = group
-            expense.save()
-
-            expense.splits.all().delete()
             users = form.cleaned_data["split_between"]
 
-            if expense.split_type == "equal":
-                handle_equal_split(expense, users)
-            elif expense.split_type == "percentage":
-                handle_percentage_split(expense, users, request.POST)
-            elif expense.split_type == "custom":
-                handle_custom_split(expense, users, request.POST)
+            with transaction.atomic():
+                # Take the old splits out of the pairwise balances first
+                record_expense_splits(expense, sign=-1)
+
+                expense = form.save(commit=False)
+                expense.group = group
+                expense.save()
+
+                expense.splits.all().delete()
+
+                if expense.split_type == "equal":
+                    handle_equal_split(expense, users)
+                elif expense.split_type == "percentage":
+                    handle_percentage_split(expense, users, request.POST)
+                elif expense.split_type == "custom":
+                    handle_custom_split(expense, users, request.POST)
+
+                record_expense_splits(expense)
+                counters.expense_amount_changed(group, old_amount, expense.amount)
+                activity.record(
+                    group, "EXPENSE_UPDATED", request.user, expense,
+                    amount=f"{expense.amount:.2f}", old_amount=f"{old_amount:.2f}",
+                    description=expense.description,
+                )
 
             messages.success(request, "Expense updated successfully")
             return redirect("groups:group_detail", group.id)
@@ -134,6 +170,24 @@ def edit_expense(request, expense_id):
 
 
 
+def _save_temp_bill(bill):
+    """
+    Save an uploaded bill to MEDIA_ROOT/temp and return the file path.
+    """
+    temp_dir = os.path.join(settings.MEDIA_ROOT, "temp")
+    if not os.path.exists(temp_dir):
+        os.makedirs(temp_dir)
+
+    temp_filename = f"{uuid.uuid4()}_{os.path.basename(bill.name)}"
+    temp_path = os.path.join(temp_dir, temp_filename)
+
+    with open(temp_path, "wb+") as f:
+        for chunk in bill.chunks():
+            f.write(chunk)
+
+    return temp_path
+
+
 @login_required
 def scan_bill(request):
     """
@@ -156,21 +210,8 @@ def scan_bill(request):
     
     try:
         bill = request.FILES["bill"]
-        
-        # Create temp directory if it doesn't exist
-        temp_dir = os.path.join(settings.MEDIA_ROOT, "temp")
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-        
-        # Save uploaded file temporarily
-        import uuid
-        temp_filename = f"{uuid.uuid4()}_{bill.name}"
-        temp_path = os.path.join(temp_dir, temp_filename)
-        
-        with open(temp_path, "wb+") as f:
-            for chunk in bill.chunks():
-                f.write(chunk)
-        
+        temp_path = _save_temp_bill(bill)
+
         # Extract bill data using AI
         result = extract_bill_data(temp_path)
         
@@ -191,11 +232,75 @@ def scan_bill(request):
         return JsonResponse({
             "success": True,
             "amount": result["amount"],  # Numeric value, not string
-            "description": result["title"]
+            "description": result["title"],
+            "tier": result["tier"]  # OCR tier that answered
         })
         
     except Exception as e:
         return JsonResponse({
             "success": False,
             "message": f"Error processing bill: {str(e)}"
-        })
\ No newline at end of file
+        })
+
+
+@login_required
+def scan_bill_batch(request):
+    """
+    Batch version of scan_bill for many receipts in one upload.
+
+    Expects: POST request with one or more "bills" file fields
+    Returns: NDJSON stream, one line per bill in the order they finish:
+        {"index": 0, "name": "a.jpg", "success": true, "amount": 120.0, "description": "..."}
+    """
+    if request.method != "POST":
+        return JsonResponse({
+            "success": False,
+            "message": "Only POST requests allowed"
+        })
+
+    bills = request.FILES.getlist("bills")
+
+    if not bills:
+        return JsonResponse({
+            "success": False,
+            "message": "No bill images provided"
+        })
+
+    if len(bills) > settings.OCR_BATCH_MAX_FILES:
+        return JsonResponse({
+            "success": False,
+            "message": f"You can scan at most {settings.OCR_BATCH_MAX_FILES} bills at once"
+        })
+
+    names = [bill.name for bill in bills]
+    temp_paths = [_save_temp_bill(bill) for bill in bills]
+
+    def stream_results():
+        try:
+            for index, result in extract_bill_data_batch(
+                temp_paths, max_workers=settings.OCR_BATCH_WORKERS
+            ):
+                line = {"index": index, "name": names[index], "success": result["success"]}
+
+                if result["success"]:
+                    line["amount"] = result["amount"]
+                    line["description"] = result["title"]
+                    line["tier"] = result["tier"]
+                else:
+                    line["message"] = result.get("message", "Failed to extract bill data")
+
+                yield json.dumps(line) + "\n"
+        finally:
+            # Clean up temp files (if not already cleaned by extract_bill_data)
+            for temp_path in temp_paths:
+                if os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+
+    response = StreamingHttpResponse(stream_results(), content_type="application/x-ndjson")
+    # Stop proxies (nginx) from buffering the stream until the last bill is done
+    response["X-Accel-Buffering"] = "no"
+    response["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,118 @@
+"""
+Group activity timeline.
+
+Write paths call record / record_all inside their own transaction, so an
+event exists exactly when the change it describes does. Rows are never
+updated, which lets the feed page on the primary key alone:
+
+    feed(group)                 newest page
+    feed(group, before=<id>)    older page
+    feed(group, since=<id>)     what happened after <id>, oldest first
+    feed(group, since=<id>, after=<id>)
+                                rest of a since= burst, after the last event
+                                already delivered
+
+Each is one range scan on the (group, id) index.
+
+Polling caveat: ids are handed out at INSERT but become visible at COMMIT,
+so a slow transaction can commit an event BELOW an id a poll has already
+returned. The since= cursor therefore never moves past events younger than
+FEED_SETTLE_SECONDS; those are sent again on the next poll and clients
+dedupe on the event id. When such a burst is bigger than one page, the
+client pages through it with after= and keeps polling from since=.
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import GroupActivity
+
+FEED_PAGE_SIZE = 50
+FEED_SETTLE_SECONDS = 60   # longer than any transaction that writes events
+
+
+def _group_id(group):
+    return getattr(group, "id", group)
+
+
+def entry(group, verb, actor=None, target=None, **data):
+    """
+    Unsaved GroupActivity row - for record_all.
+    target: the expense / settlement / user the event is about
+    """
+    return GroupActivity(
+        group_id=_group_id(group),
+        actor_id=getattr(actor, "id", actor),
+        verb=verb,
+        target_id=getattr(target, "id", target),
+        data=data,
+    )
+
+
+def record(group, verb, actor=None, target=None, **data):
+    row = entry(group, verb, actor, target, **data)
+    row.save()
+    return row
+
+
+def record_all(entries):
+    return GroupActivity.objects.bulk_create(list(entries))
+
+
+def feed(group, since=None, before=None, after=None, limit=FEED_PAGE_SIZE):
+    """
+    Returns: (events, next_cursor, has_more)
+      since  - next_cursor is the newest delivered id older than
+               FEED_SETTLE_SECONDS (poll again with it; newer events in
+               this batch come again and must be deduped on id). With
+               has_more, fetch the rest now with since=<same> and
+               after=<last event id>; those pages keep next_cursor at since.
+      before - next_cursor is the oldest id delivered, None on the last page
+    """
+    events = GroupActivity.objects.filter(group_id=_group_id(group))
+
+    if since is not None:
+        start = since if after is None else max(since, after)
+        rows = list(events.filter(id__gt=start).order_by("id")[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # Only a page that starts right at the cursor can move it
+        cursor = since
+        if start == since:
+            settled_before = timezone.now() - timedelta(seconds=FEED_SETTLE_SECONDS)
+            for row in rows:
+                if row.created_at > settled_before:
+                    break
+                cursor = row.id
+        return rows, cursor, has_more
+
+    if before is not None:
+        events = events.filter(id__lt=before)
+
+    rows = list(events.order_by("-id")[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (rows[-1].id if has_more else None), has_more
+
+
+def member_entries(group, actor, before_ids, after_ids):
+    """
+    MEMBER_ADDED / MEMBER_REMOVED entries for a member set a form rewrote.
+    before_ids / after_ids: sets of user ids
+    """
+    return (
+        [entry(group, "MEMBER_ADDED", actor, pk) for pk in sorted(after_ids - before_ids)]
+        + [entry(group, "MEMBER_REMOVED", actor, pk) for pk in sorted(before_ids - after_ids)]
+    )
+
+
+def settlement_entry(settlement, verb, actor=None):
+    return entry(
+        settlement.group_id, verb, actor, settlement,
+        amount=f"{settlement.amount:.2f}",
+        payer=settlement.payer_id,
+        receiver=settlement.receiver_id,
+        mode=settlement.payment_mode,
+    )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Group, GroupInvite
+from .models import Group, GroupInvite, GroupActivity
 
 # Register your models here.
 
@@ -16,4 +16,13 @@ class GroupInviteAdmin(admin.ModelAdmin):
     list_display = ('email', 'group', 'invited_by', 'is_accepted', 'created_at')
     search_fields = ('email', 'group__title', 'invited_by__full_name')
     list_filter = ('is_accepted', 'created_at')
-    ordering = ('-created_at',)
\ No newline at end of file
+    ordering = ('-created_at',)
+
+@admin.register(GroupActivity)
+class GroupActivityAdmin(admin.ModelAdmin):
+    list_display = ('group', 'verb', 'actor', 'target_id', 'created_at')
+    list_filter = ('verb',)
+    search_fields = ('group__title', 'actor__full_name')
+
+    def has_change_permission(self, request, obj=None):
+        return False
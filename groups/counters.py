@@ -0,0 +1,134 @@
+"""
+Denormalized Group counters: member_count, expense_count, total_spending.
+
+Every write path that changes membership or expenses goes through here so
+the columns move with a single F() UPDATE and list pages never have to
+COUNT / SUM per group. repair_group_counters recomputes them from scratch.
+
+total_spending and expense_count are lifetime figures: archiving an expense
+does not change them.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Group
+
+
+def _bump(group, **deltas):
+    group_id = getattr(group, "id", group)
+    Group.objects.filter(id=group_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items() if delta}
+    )
+
+
+# =================== MEMBERSHIP ===================
+
+def _lock(group):
+    # Membership check, write and bump happen under the group row lock, so
+    # two requests adding (or removing) the same person count them once
+    Group.objects.select_for_update().filter(id=group.id).values_list("id", flat=True).first()
+
+
+def add_members(group, users):
+    """
+    Add `users` to `group`, counting only the ones not already in it.
+    Returns: list of users actually added
+    """
+    users = list({user.id: user for user in users}.values())
+    if not users:
+        return []
+
+    with transaction.atomic():
+        _lock(group)
+        existing = set(
+            group.members.filter(id__in=[user.id for user in users]).values_list("id", flat=True)
+        )
+        new_members = [user for user in users if user.id not in existing]
+
+        if new_members:
+            group.members.add(*new_members)
+            _bump(group, member_count=len(new_members))
+
+    return new_members
+
+
+def remove_member(group, user):
+    with transaction.atomic():
+        _lock(group)
+        if not group.members.filter(id=user.id).exists():
+            return False
+        group.members.remove(user)
+        _bump(group, member_count=-1)
+    return True
+
+
+def recount_members(group):
+    """
+    For forms that rewrite the whole member set (create / edit group).
+    """
+    Group.objects.filter(id=group.id).update(member_count=Coalesce(
+        Subquery(
+            Group.members.through.objects
+            .filter(group_id=OuterRef("id"))
+            .values("group_id")
+            .annotate(n=Count("id"))
+            .values("n")
+        ),
+        Value(0),
+    ))
+
+
+# =================== EXPENSES ===================
+
+def expense_added(group, amount):
+    _bump(group, expense_count=1, total_spending=amount)
+
+
+def expense_removed(group, amount):
+    _bump(group, expense_count=-1, total_spending=-amount)
+
+
+def expense_amount_changed(group, old_amount, new_amount):
+    _bump(group, total_spending=new_amount - old_amount)
+
+
+# =================== REPAIR ===================
+
+def repair_group_counters(group_ids=None):
+    """
+    Recompute every counter in ONE UPDATE with correlated subqueries.
+    Returns: number of groups updated
+    """
+    from expenses.models import Expense, ArchivedExpense
+
+    def per_group(model, aggregate, output_field=None):
+        return Coalesce(
+            Subquery(
+                model.objects
+                .filter(group_id=OuterRef("id"))
+                .values("group_id")
+                .annotate(value=aggregate)
+                .values("value")
+            ),
+            Value(0),
+            output_field=output_field,
+        )
+
+    groups = Group.objects.all()
+    if group_ids is not None:
+        groups = groups.filter(id__in=group_ids)
+
+    amount_field = Group._meta.get_field("total_spending")
+
+    return groups.update(
+        member_count=per_group(Group.members.through, Count("id")),
+        expense_count=(
+            per_group(Expense, Count("id")) + per_group(ArchivedExpense, Count("id"))
+        ),
+        total_spending=(
+            per_group(Expense, Sum("amount"), amount_field)
+            + per_group(ArchivedExpense, Sum("amount"), amount_field)
+        ),
+    )
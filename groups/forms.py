@@ -1,5 +1,28 @@
+import csv
+import io
+import re
+
 from django import forms
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.urls import reverse
 from .models import Group
+from .widgets import MemberPickerWidget
+
+User = get_user_model()
+
+BULK_ADD_MAX_EMAILS = 500
+
+# Above this many candidates, member fields switch from one checkbox per
+# user to the search-as-you-type MemberPickerWidget
+MEMBER_PICKER_THRESHOLD = 50
+
+
+def use_member_picker(field, search_url):
+    field.widget = MemberPickerWidget(search_url=search_url)
+    field.widget.choices = field.choices
+
 
 class GroupCreateForm(forms.ModelForm):
     class Meta:
@@ -12,4 +35,61 @@ class GroupCreateForm(forms.ModelForm):
             "title": "Group Title",
             "description": "Group Description",
             "members": "Select Members"
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # OFFSET/LIMIT probe instead of COUNT(*) over the whole user table
+        if User.objects.all()[MEMBER_PICKER_THRESHOLD:].exists():
+            use_member_picker(self.fields["members"], reverse("groups:member_search"))
+
+
+class BulkMemberForm(forms.Form):
+    """
+    Pasted list (comma / semicolon / newline separated) and/or a CSV file.
+    The CSV may have an "email" column; otherwise every cell is scanned.
+    """
+    emails = forms.CharField(widget=forms.Textarea(attrs={"rows": 4}), required=False)
+    csv_file = forms.FileField(required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        candidates = re.split(r"[\s,;]+", cleaned.get("emails") or "")
+
+        csv_file = cleaned.get("csv_file")
+        if csv_file:
+            text = io.TextIOWrapper(csv_file, encoding="utf-8-sig", newline="")
+            try:
+                rows = list(csv.reader(text))
+            except (UnicodeDecodeError, csv.Error):
+                raise ValidationError("Could not read the CSV file. Save it as UTF-8 CSV and try again.")
+            header = [cell.strip().lower() for cell in rows[0]] if rows else []
+            if "email" in header:
+                column = header.index("email")
+                candidates += [row[column] for row in rows[1:] if len(row) > column]
+            else:
+                candidates += [cell for row in rows for cell in row]
+
+        emails, invalid = [], []
+        seen = set()
+        for candidate in candidates:
+            email = candidate.strip().lower()
+            if not email or email in seen:
+                continue
+            seen.add(email)
+            try:
+                validate_email(email)
+                emails.append(email)
+            except ValidationError:
+                invalid.append(candidate.strip())
+
+        if not emails:
+            raise ValidationError("No valid email addresses found.")
+        if len(emails) > BULK_ADD_MAX_EMAILS:
+            raise ValidationError(f"At most {BULK_ADD_MAX_EMAILS} emails can be added at once.")
+
+        cleaned["email_list"] = emails
+        cleaned["invalid"] = invalid
+        return cleaned
+
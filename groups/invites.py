@@ -0,0 +1,52 @@
+"""
+Cached per-user "pending invite" lookup.
+
+The dashboard checks for an open invite on every load. The answer (the
+oldest open invite's token, or "none") is cached per email and dropped
+whenever an invite for that email is created, accepted or rejected.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import GroupInvite
+
+NO_INVITE = ""
+
+
+def _cache_key(email):
+    return f"groups:pending_invite:{email.strip().lower()}"
+
+
+def pending_invite_token(email):
+    """
+    Returns: token (str) of the oldest open, unexpired invite, or None
+    """
+    key = _cache_key(email)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached or None
+
+    now = timezone.now()
+    invite = (
+        GroupInvite.objects
+        .filter(email__iexact=email, is_accepted=False, expires_at__gt=now)
+        .order_by("id")
+        .values("token", "expires_at")
+        .first()
+    )
+
+    timeout = settings.PENDING_INVITE_CACHE_SECONDS
+    if invite is None:
+        cache.set(key, NO_INVITE, timeout)
+        return None
+
+    # Never serve the token past the invite's own expiry
+    seconds_left = int((invite["expires_at"] - now).total_seconds())
+    cache.set(key, str(invite["token"]), max(1, min(timeout, seconds_left)))
+    return str(invite["token"])
+
+
+def invalidate_pending_invites(*emails):
+    cache.delete_many([_cache_key(email) for email in emails if email])
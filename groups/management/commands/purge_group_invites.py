@@ -0,0 +1,53 @@
+"""
+purge_group_invites.py
+----------------------
+Django management command to delete group invites that are no longer
+useful: accepted ones and ones past their expires_at.
+
+Deletes in id chunks so a large backlog never holds long locks.
+Schedule it (cron) e.g. once a day.
+
+Usage:
+    python manage.py purge_group_invites
+    python manage.py purge_group_invites --chunk-size 500
+    python manage.py purge_group_invites --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from groups.models import GroupInvite
+
+
+class Command(BaseCommand):
+    help = "Deletes accepted and expired group invites in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Invites deleted per DELETE statement.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count what would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        stale = GroupInvite.objects.filter(Q(is_accepted=True) | Q(expires_at__lte=timezone.now()))
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"[dry run] {stale.count()} invite(s) would be deleted"))
+            return
+
+        deleted = 0
+        while True:
+            ids = list(stale.order_by("id").values_list("id", flat=True)[:options["chunk_size"]])
+            if not ids:
+                break
+            deleted += GroupInvite.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Purged {deleted} group invite(s)"))
@@ -0,0 +1,34 @@
+"""
+repair_group_counters.py
+------------------------
+Django management command to recompute the denormalized Group counters
+(member_count, expense_count, total_spending) from the source tables.
+
+Runs as a single UPDATE with correlated subqueries. Use it after bulk
+imports / manual data fixes, or on a schedule as a safety net.
+
+Usage:
+    python manage.py repair_group_counters
+    python manage.py repair_group_counters --group 12 --group 15
+"""
+
+from django.core.management.base import BaseCommand
+
+from groups.counters import repair_group_counters
+
+
+class Command(BaseCommand):
+    help = "Recomputes member_count, expense_count and total_spending for groups."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--group",
+            type=int,
+            action="append",
+            dest="groups",
+            help="Only repair this group (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        updated = repair_group_counters(options["groups"])
+        self.stdout.write(self.style.SUCCESS(f"✓ Recomputed counters for {updated} group(s)"))
@@ -0,0 +1,57 @@
+"""
+Member lookups that stay cheap however big a group (or the user table) gets.
+
+Pickers search by name / email prefix instead of rendering every user, and
+list pages show a few avatars plus the denormalized member_count instead of
+loading whole member lists.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, Q
+
+User = get_user_model()
+
+MEMBER_SEARCH_LIMIT = 20
+MEMBER_PREVIEW_SIZE = 5
+
+
+def search_users(query, group=None, limit=MEMBER_SEARCH_LIMIT):
+    """
+    Active users whose full name or email starts with `query`
+    (case-insensitive), optionally only members of `group`.
+    Both lookups are prefix matches so they can use an index.
+    """
+    users = User.objects.filter(is_active=True)
+    if group is not None:
+        users = users.filter(group_members=group)
+
+    query = (query or "").strip()
+    if query:
+        users = users.filter(Q(full_name__istartswith=query) | Q(email__istartswith=query))
+
+    return list(users.order_by("full_name", "id")[:limit])
+
+
+def preview_prefetch(size=MEMBER_PREVIEW_SIZE):
+    """
+    Prefetch only the first `size` members of each group into
+    group.preview_members (one windowed query for the whole page).
+    """
+    return Prefetch(
+        "members",
+        queryset=User.objects.order_by("id")[:size],
+        to_attr="preview_members",
+    )
+
+
+def member_preview(group, size=MEMBER_PREVIEW_SIZE):
+    return list(group.members.order_by("id")[:size]), group.member_count
+
+
+def member_json(user):
+    return {
+        "id": user.id,
+        "full_name": user.full_name,
+        "email": user.email,
+        "avatar": user.profile_image.url if user.profile_image else None,
+    }
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-19 07:09
+
+import groups.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0009_group_last_settled_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupinvite',
+            name='expires_at',
+            field=models.DateTimeField(default=groups.models.default_invite_expiry),
+        ),
+        migrations.AddIndex(
+            model_name='groupinvite',
+            index=models.Index(fields=['email', 'is_accepted'], name='groups_grou_email_fbc0fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupinvite',
+            index=models.Index(fields=['expires_at'], name='groups_grou_expires_d923f1_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-19 07:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Group = apps.get_model("groups", "Group")
+    Expense = apps.get_model("expenses", "Expense")
+    ArchivedExpense = apps.get_model("expenses", "ArchivedExpense")
+    amount_field = Group._meta.get_field("total_spending")
+
+    def per_group(model, aggregate, output_field=None):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(group_id=OuterRef("id"))
+                .values("group_id").annotate(value=aggregate).values("value")
+            ),
+            Value(0),
+            output_field=output_field,
+        )
+
+    Group.objects.update(
+        member_count=per_group(Group.members.through, Count("id")),
+        expense_count=per_group(Expense, Count("id")) + per_group(ArchivedExpense, Count("id")),
+        total_spending=(
+            per_group(Expense, Sum("amount"), amount_field)
+            + per_group(ArchivedExpense, Sum("amount"), amount_field)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0010_invite_expiry'),
+        ('expenses', '0013_expense_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='expense_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='total_spending',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 07:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0011_group_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('EXPENSE_ADDED', 'Expense added'), ('EXPENSE_UPDATED', 'Expense updated'), ('EXPENSE_DELETED', 'Expense deleted'), ('PAYMENT_REQUESTED', 'Marked as paid'), ('PAYMENT_REJECTED', 'Payment rejected'), ('SETTLED', 'Settlement confirmed'), ('MEMBER_ADDED', 'Member added'), ('MEMBER_JOINED', 'Member joined'), ('MEMBER_REMOVED', 'Member removed')], max_length=20)),
+                ('target_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='groups.group')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'id'], name='groups_grou_group_i_7d4bd1_idx')],
+            },
+        ),
+    ]
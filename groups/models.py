@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
 import uuid
 
 User = settings.AUTH_USER_MODEL
@@ -14,12 +16,21 @@ class Group(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_settled_at = models.DateTimeField(null=True, blank=True)
 
+    # Denormalized counters (groups.counters keeps them in step)
+    member_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    total_spending = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
     def __str__(self):
         return self.title
 
 
 
 
+def default_invite_expiry():
+    return timezone.now() + timedelta(days=settings.GROUP_INVITE_TTL_DAYS)
+
+
 class GroupInvite(models.Model):
     email = models.EmailField()
     group = models.ForeignKey("Group", on_delete=models.CASCADE)
@@ -27,6 +38,58 @@ class GroupInvite(models.Model):
     invited_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     is_accepted = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_invite_expiry)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["email", "is_accepted"]),
+            models.Index(fields=["expires_at"]),
+        ]
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
 
     def __str__(self):
         return f"{self.email} → {self.group.title}"
+
+
+
+
+class GroupActivity(models.Model):
+    """
+    Append-only timeline of a group: one row per expense, settlement and
+    membership event, written by groups.activity in the same transaction
+    as the change itself. Ordered (and paged) by id.
+    """
+    VERB_CHOICES = [
+        ("EXPENSE_ADDED", "Expense added"),
+        ("EXPENSE_UPDATED", "Expense updated"),
+        ("EXPENSE_DELETED", "Expense deleted"),
+        ("PAYMENT_REQUESTED", "Marked as paid"),
+        ("PAYMENT_REJECTED", "Payment rejected"),
+        ("SETTLED", "Settlement confirmed"),
+        ("MEMBER_ADDED", "Member added"),
+        ("MEMBER_JOINED", "Member joined"),
+        ("MEMBER_REMOVED", "Member removed"),
+    ]
+
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="activity")
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    verb = models.CharField(max_length=20, choices=VERB_CHOICES)
+    target_id = models.PositiveBigIntegerField(null=True, blank=True)   # expense / settlement / user id
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["group", "id"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Group activity is append-only.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.group_id} #{self.id} {self.verb}"
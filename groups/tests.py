@@ -1,3 +1,530 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import OutboundEmail
+from payments.models import Settlement
+from payments.services import accept_settlement_payment, request_settlement_payment
+from expenses.forms import ExpenseForm
+from expenses.models import Expense, ExpenseSplit
+from .activity import feed
+from .counters import add_members, remove_member, repair_group_counters
+from .forms import GroupCreateForm
+from .invites import pending_invite_token
+from .models import Group, GroupActivity, GroupInvite
+from .views import EXPENSE_PAGE_SIZE
+
+User = get_user_model()
+
+# Query-count tests count the app's own queries; a DatabaseCache backend
+# would add its own lookups, so they run against an in-process cache
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkAddMembersTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@paynion.test", username="admin", full_name="Admin", password="x"
+        )
+        self.group = Group.objects.create(title="Office lunch", created_by=self.admin)
+        self.group.members.add(self.admin)
+        self.users = [
+            User.objects.create_user(
+                email=f"user{i}@paynion.test", username=f"user{i}", full_name=f"User {i}", password="x"
+            )
+            for i in range(3)
+        ]
+        self.client.force_login(self.admin)
+
+    def post(self, **data):
+        return self.client.post(reverse("groups:bulk_add_members", args=[self.group.id]), data)
+
+    def test_adds_users_and_invites_the_rest(self):
+        self.group.members.add(self.users[0])
+
+        self.post(emails="user0@paynion.test, USER1@paynion.test\nuser2@paynion.test;new@paynion.test not-an-email")
+
+        self.assertEqual(self.group.members.count(), 4)
+        self.assertEqual(list(GroupInvite.objects.values_list("email", flat=True)), ["new@paynion.test"])
+        self.assertEqual(OutboundEmail.objects.get().to_email, "new@paynion.test")
+
+    def test_query_count_does_not_grow_with_list_size(self):
+        emails = "\n".join([u.email for u in self.users] + [f"guest{i}@paynion.test" for i in range(40)])
+
+        with self.assertNumQueries(17):
+            self.post(emails=emails)
+
+        self.assertEqual(GroupInvite.objects.count(), 40)
+        self.assertEqual(OutboundEmail.objects.count(), 40)
+
+    def test_reads_csv_email_column(self):
+        upload = SimpleUploadedFile(
+            "people.csv", b"name,email\nOne,user1@paynion.test\nNew,new@paynion.test\n", content_type="text/csv"
+        )
+
+        self.post(csv_file=upload)
+
+        self.assertTrue(self.group.members.filter(id=self.users[1].id).exists())
+        self.assertTrue(GroupInvite.objects.filter(email="new@paynion.test").exists())
+
+    def test_existing_open_invite_is_not_duplicated(self):
+        self.post(emails="new@paynion.test")
+        self.post(emails="new@paynion.test")
+
+        self.assertEqual(GroupInvite.objects.count(), 1)
+
+    def test_expired_invite_is_sent_again(self):
+        self.post(emails="new@paynion.test")
+        GroupInvite.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.post(emails="new@paynion.test")
+
+        self.assertEqual(GroupInvite.objects.count(), 2)
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+        self.assertEqual(GroupInvite.objects.filter(expires_at__gt=timezone.now()).count(), 1)
+
+    def test_emails_match_case_insensitively(self):
+        mixed = User.objects.create_user(
+            email="Mixed.Case@Paynion.test", username="mixed", full_name="Mixed", password="x"
+        )
+        GroupInvite.objects.create(email="Guest@Paynion.test", group=self.group)
+
+        self.post(emails="mixed.case@paynion.test, guest@paynion.test")
+
+        self.assertTrue(self.group.members.filter(id=mixed.id).exists())
+        self.assertEqual(GroupInvite.objects.count(), 1)
+
+    def test_non_utf8_csv_is_a_form_error(self):
+        upload = SimpleUploadedFile("people.csv", "email\ncafé@paynion.test\n".encode("latin-1"))
+
+        response = self.post(csv_file=upload)
+
+        self.assertIn("UTF-8", " ".join(str(m) for m in get_messages(response.wsgi_request)))
+        self.assertFalse(GroupInvite.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PendingInviteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(
+            email="admin@paynion.test", username="admin", full_name="Admin", password="x"
+        )
+        self.guest = User.objects.create_user(
+            email="guest@paynion.test", username="guest", full_name="Guest", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.admin)
+
+    def invite(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse("groups:send_invite", args=[self.group.id]), {"email": self.guest.email})
+        return GroupInvite.objects.latest("id")
+
+    def test_flag_is_cached_and_invalidated_on_create_and_accept(self):
+        self.assertIsNone(pending_invite_token(self.guest.email))
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(pending_invite_token(self.guest.email))
+
+        invite = self.invite()
+        self.assertEqual(pending_invite_token(self.guest.email), str(invite.token))
+
+        self.client.force_login(self.guest)
+        self.client.post(reverse("groups:accept_invite", args=[invite.token]), {"action": "accept"})
+
+        self.assertIsNone(pending_invite_token(self.guest.email))
+        self.assertTrue(self.group.members.filter(id=self.guest.id).exists())
+
+    def test_invite_accepts_differently_cased_email(self):
+        invite = GroupInvite.objects.create(email="GUEST@paynion.test", group=self.group)
+
+        self.assertEqual(pending_invite_token(self.guest.email), str(invite.token))
+
+        self.client.force_login(self.guest)
+        self.client.post(reverse("groups:accept_invite", args=[invite.token]), {"action": "accept"})
+
+        self.assertTrue(self.group.members.filter(id=self.guest.id).exists())
+
+    def test_deleted_invite_clears_the_cached_flag(self):
+        invite = self.invite()
+        self.assertEqual(pending_invite_token(self.guest.email), str(invite.token))
+        GroupInvite.objects.filter(id=invite.id).delete()   # e.g. group deleted
+
+        self.client.force_login(self.guest)
+        response = self.client.get(reverse("groups:accept_invite", args=[invite.token]))
+        self.assertRedirects(response, reverse("accounts:dashboard"), fetch_redirect_response=False)
+
+        GroupInvite.objects.create(email=self.guest.email, group=self.group)
+        stale = GroupInvite.objects.get()
+        pending_invite_token(self.guest.email)
+        stale.delete()
+
+        self.assertEqual(self.client.get(reverse("accounts:dashboard")).status_code, 200)
+        self.assertIsNone(pending_invite_token(self.guest.email))
+
+    def test_expired_invite_is_ignored_and_refused(self):
+        invite = self.invite()
+        GroupInvite.objects.filter(id=invite.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+        cache.clear()
+
+        self.assertIsNone(pending_invite_token(self.guest.email))
+
+        self.client.force_login(self.guest)
+        self.client.post(reverse("groups:accept_invite", args=[invite.token]), {"action": "accept"})
+        self.assertFalse(self.group.members.filter(id=self.guest.id).exists())
+
+    def test_purge_removes_expired_and_accepted(self):
+        keep = GroupInvite.objects.create(email="a@paynion.test", group=self.group)
+        GroupInvite.objects.create(email="b@paynion.test", group=self.group, is_accepted=True)
+        for i in range(5):
+            GroupInvite.objects.create(
+                email=f"old{i}@paynion.test", group=self.group,
+                expires_at=timezone.now() - timedelta(days=1),
+            )
+
+        call_command("purge_group_invites", chunk_size=2, stdout=io.StringIO())
+
+        self.assertEqual(list(GroupInvite.objects.values_list("id", flat=True)), [keep.id])
+
+
+class GroupCounterTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@paynion.test", username="admin", full_name="Admin", password="x"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.client.force_login(self.admin)
+        self.client.post(reverse("groups:create_group"), {
+            "title": "Trip", "description": "", "members": [self.admin.id],
+        })
+        self.group = Group.objects.get()
+
+    def counters(self):
+        self.group.refresh_from_db()
+        return self.group.member_count, self.group.expense_count, self.group.total_spending
+
+    def test_write_paths_keep_counters_in_step(self):
+        self.assertEqual(self.counters(), (1, 0, 0))
+
+        self.client.post(reverse("groups:add_member", args=[self.group.id]), {"email": self.friend.email})
+        self.client.post(reverse("groups:add_member", args=[self.group.id]), {"email": self.friend.email})
+        self.assertEqual(self.counters()[0], 2)
+
+        expense_form = {"description": "Fuel", "split_type": "equal", "split_between": [self.admin.id, self.friend.id]}
+        self.client.post(reverse("expenses:add_expense", args=[self.group.id]), {**expense_form, "amount": "120.00"})
+        expense = Expense.objects.get()
+        self.client.post(reverse("expenses:edit_expense", args=[expense.id]), {**expense_form, "amount": "150.00"})
+        self.assertEqual(self.counters(), (2, 1, Decimal("150.00")))
+
+        self.client.post(reverse("expenses:delete_expense", args=[expense.id]))
+        self.client.get(reverse("groups:remove_member", args=[self.group.id, self.friend.id]))
+        self.assertEqual(self.counters(), (1, 0, Decimal("0.00")))
+
+    def test_repeated_and_existing_users_are_counted_once(self):
+        added = add_members(self.group, [self.friend, self.friend, self.admin])
+
+        self.assertEqual(added, [self.friend])
+        self.assertEqual(self.counters()[0], 2)
+
+        self.assertTrue(remove_member(self.group, self.friend))
+        self.assertFalse(remove_member(self.group, self.friend))
+        self.assertEqual(self.counters()[0], 1)
+
+    def test_repair_recomputes_from_source(self):
+        self.group.members.add(self.friend)
+        Expense.objects.create(group=self.group, amount=Decimal("99.50"), description="x", paid_by=self.admin)
+
+        repair_group_counters()
+
+        self.assertEqual(self.counters(), (2, 1, Decimal("99.50")))
+
+    def test_group_list_reads_counters(self):
+        Group.objects.filter(id=self.group.id).update(total_spending=Decimal("1234.00"))
+
+        response = self.client.get(reverse("groups:view_all_group"))
+
+        self.assertContains(response, "₹1234")
+
+
+class GroupDetailFeedTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@paynion.test", username="admin", full_name="Admin", password="x"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.group = Group.objects.create(title="Flat", created_by=self.admin)
+        self.group.members.add(self.admin, self.friend)
+        self.client.force_login(self.admin)
+
+    def add_expenses(self, count):
+        for i in range(count):
+            payer = self.admin if i % 2 else self.friend
+            expense = Expense.objects.create(
+                group=self.group, amount=Decimal("10.00"), description=f"Item {i}", paid_by=payer
+            )
+            ExpenseSplit.objects.bulk_create([
+                ExpenseSplit(expense=expense, user=self.admin, amount=Decimal("5.00")),
+                ExpenseSplit(expense=expense, user=self.friend, amount=Decimal("5.00")),
+            ])
+
+    def detail_queries(self):
+        url = reverse("groups:group_detail", args=[self.group.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_load_more_walks_the_whole_feed(self):
+        self.add_expenses(EXPENSE_PAGE_SIZE + 5)
+
+        response = self.client.get(reverse("groups:group_detail", args=[self.group.id]))
+        self.assertEqual(len(response.context["expenses"]), EXPENSE_PAGE_SIZE)
+        self.assertContains(response, "Load more")
+
+        rest = self.client.get(
+            reverse("groups:group_expenses_api", args=[self.group.id]),
+            {"cursor": response.context["next_cursor"]},
+        ).json()
+
+        seen = [e.id for e in response.context["expenses"]] + [e["id"] for e in rest["expenses"]]
+        self.assertEqual(sorted(seen), sorted(Expense.objects.values_list("id", flat=True)))
+        self.assertIsNone(rest["next_cursor"])
+
+    def test_page_cost_does_not_grow_with_history(self):
+        self.add_expenses(5)
+        small = self.detail_queries()
+
+        self.add_expenses(60)
+        self.assertEqual(self.detail_queries(), small)
+
+    def test_feed_is_members_only(self):
+        outsider = User.objects.create_user(
+            email="out@paynion.test", username="out", full_name="Out", password="x"
+        )
+        self.client.force_login(outsider)
+
+        response = self.client.get(reverse("groups:group_expenses_api", args=[self.group.id]))
+
+        self.assertEqual(response.status_code, 403)
+
+
+class GroupActivityTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@paynion.test", username="admin", full_name="Admin", password="x"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.admin)
+        self.group.members.add(self.admin)
+        self.client.force_login(self.admin)
+
+    def verbs(self):
+        return list(GroupActivity.objects.order_by("id").values_list("verb", flat=True))
+
+    def test_write_paths_append_events(self):
+        self.client.post(reverse("groups:add_member", args=[self.group.id]), {"email": self.friend.email})
+        self.client.post(reverse("expenses:add_expense", args=[self.group.id]), {
+            "description": "Fuel", "amount": "100.00", "split_type": "equal",
+            "split_between": [self.admin.id, self.friend.id],
+        })
+        settlement = Settlement.objects.create(
+            group=self.group, payer=self.friend, receiver=self.admin, amount=Decimal("50.00")
+        )
+        request_settlement_payment(settlement.id, self.friend, "CASH")
+        accept_settlement_payment(settlement.id, self.admin)
+        self.client.get(reverse("groups:remove_member", args=[self.group.id, self.friend.id]))
+
+        self.assertEqual(self.verbs(), [
+            "MEMBER_ADDED", "EXPENSE_ADDED", "PAYMENT_REQUESTED", "SETTLED", "MEMBER_REMOVED",
+        ])
+        settled = GroupActivity.objects.get(verb="SETTLED")
+        self.assertEqual(settled.actor, self.admin)
+        self.assertEqual(settled.data, {
+            "amount": "50.00", "payer": self.friend.id, "receiver": self.admin.id, "mode": "CASH",
+        })
+
+    def test_create_and_edit_group_record_member_changes(self):
+        self.client.post(reverse("groups:create_group"), {
+            "title": "Flat", "description": "", "members": [self.admin.id, self.friend.id],
+        })
+        flat = Group.objects.get(title="Flat")
+        self.client.post(reverse("groups:edit_group", args=[flat.id]), {
+            "title": "Flat", "description": "", "members": [self.admin.id],
+        })
+
+        events = flat.activity.order_by("id").values_list("verb", "target_id")
+        self.assertEqual(list(events), [
+            ("MEMBER_ADDED", self.admin.id), ("MEMBER_ADDED", self.friend.id),
+            ("MEMBER_REMOVED", self.friend.id),
+        ])
+
+    def test_feed_pages_back_and_polls_forward(self):
+        for i in range(5):
+            GroupActivity.objects.create(group=self.group, verb="EXPENSE_ADDED", target_id=i)
+
+        page, before, has_more = feed(self.group, limit=3)
+        self.assertEqual([e.target_id for e in page], [4, 3, 2])
+        self.assertTrue(has_more)
+
+        older, before, has_more = feed(self.group, before=before, limit=3)
+        self.assertEqual([e.target_id for e in older], [1, 0])
+        self.assertIsNone(before)
+
+        cursor = page[0].id
+        self.assertEqual(feed(self.group, since=cursor)[:2], ([], cursor))
+
+        GroupActivity.objects.create(group=self.group, verb="MEMBER_ADDED", actor=self.admin, target_id=self.admin.id)
+        response = self.client.get(
+            reverse("groups:group_activity_api", args=[self.group.id]), {"since": cursor}
+        ).json()
+        self.assertEqual([e["verb"] for e in response["events"]], ["MEMBER_ADDED"])
+        self.assertEqual(response["users"], {str(self.admin.id): "Admin"})
+
+    def test_poll_cursor_waits_for_late_commits(self):
+        # Explicit ids stand in for the order the INSERTs got them in
+        high, = GroupActivity.objects.bulk_create([GroupActivity(id=1000, group=self.group, verb="EXPENSE_ADDED")])
+
+        events, cursor, _ = feed(self.group, since=0)
+        self.assertEqual((events, cursor), ([high], 0))
+
+        # A transaction that took id 900 earlier commits only now
+        low, = GroupActivity.objects.bulk_create([GroupActivity(id=900, group=self.group, verb="EXPENSE_ADDED")])
+        events, cursor, _ = feed(self.group, since=cursor)
+        self.assertEqual((events, cursor), ([low, high], 0))
+
+        GroupActivity.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        events, cursor, _ = feed(self.group, since=cursor)
+        self.assertEqual((events, cursor), ([low, high], high.id))
+        self.assertEqual(feed(self.group, since=cursor)[:2], ([], high.id))
+
+    def test_poll_pages_through_a_burst_bigger_than_a_page(self):
+        GroupActivity.objects.bulk_create([
+            GroupActivity(group=self.group, verb="MEMBER_ADDED", target_id=i) for i in range(60)
+        ])
+        url = reverse("groups:group_activity_api", args=[self.group.id])
+
+        first = self.client.get(url, {"since": 0}).json()
+        self.assertEqual((len(first["events"]), first["next_cursor"], first["has_more"]), (50, 0, True))
+        self.assertEqual(first["after"], first["events"][-1]["id"])
+
+        rest = self.client.get(url, {"since": first["next_cursor"], "after": first["after"]}).json()
+        self.assertEqual((len(rest["events"]), rest["next_cursor"], rest["has_more"]), (10, 0, False))
+        self.assertIsNone(rest["after"])
+        self.assertEqual(
+            [e["target"] for e in first["events"] + rest["events"]], list(range(60))
+        )
+
+    def test_events_are_append_only(self):
+        event = GroupActivity.objects.create(group=self.group, verb="EXPENSE_ADDED")
+
+        with self.assertRaises(ValueError):
+            event.save()
+
+
+class LargeGroupMemberTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@paynion.test", username="admin", full_name="Admin", password="x"
+        )
+        self.anita = User.objects.create_user(
+            email="anita@paynion.test", username="anita", full_name="Anita Rao", password="x"
+        )
+        self.outsider = User.objects.create_user(
+            email="andrew@elsewhere.test", username="andrew", full_name="Andrew", password="x"
+        )
+        self.group = Group.objects.create(title="Society", created_by=self.admin)
+        self.group.members.add(self.admin, self.anita)
+        repair_group_counters()
+        self.client.force_login(self.admin)
+
+    def search(self, **params):
+        return self.client.get(reverse("groups:member_search"), params)
+
+    def test_prefix_search_on_name_and_email(self):
+        names = lambda response: [u["full_name"] for u in response.json()["results"]]
+
+        self.assertEqual(names(self.search(q="an")), ["Andrew", "Anita Rao"])
+        self.assertEqual(names(self.search(q="anita@")), ["Anita Rao"])
+        self.assertEqual(names(self.search(q="rao")), [])
+        self.assertEqual(names(self.search(q="a")), [])
+        self.assertEqual(names(self.search(q="an", group=self.group.id)), ["Anita Rao"])
+
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.search(q="an", group=self.group.id).status_code, 403)
+
+    def test_preview_returns_first_members_and_count(self):
+        response = self.client.get(
+            reverse("groups:group_member_preview", args=[self.group.id]), {"n": 1}
+        ).json()
+
+        self.assertEqual([u["full_name"] for u in response["members"]], ["Admin"])
+        self.assertEqual(response["member_count"], 2)
+
+    def test_large_group_expense_form_uses_picker_and_split_all(self):
+        Group.objects.filter(id=self.group.id).update(member_count=500)
+        self.group.refresh_from_db()
+
+        html = str(ExpenseForm(group=self.group)["split_between"])
+        self.assertIn("member-picker", html)
+        self.assertNotIn("Anita Rao", html)
+
+        form = ExpenseForm(
+            {"amount": "90.00", "description": "Maintenance", "split_type": "equal", "split_all": "on"},
+            group=self.group,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(set(form.cleaned_data["split_between"]), {self.admin, self.anita})
+
+        form = ExpenseForm(
+            {"amount": "90.00", "description": "Maintenance", "split_type": "custom", "split_all": "on"},
+            group=self.group,
+        )
+        self.assertFalse(form.is_valid())
+
+    def test_create_group_form_switches_to_picker(self):
+        User.objects.bulk_create([
+            User(email=f"bulk{i}@paynion.test", username=f"bulk{i}", full_name=f"Bulk {i}")
+            for i in range(60)
+        ])
+
+        response = self.client.get(reverse("groups:create_group"))
+
+        self.assertContains(response, "member-picker")
+        self.assertNotContains(response, "Bulk 42")
+
+    def test_picker_rerenders_with_invalid_selection(self):
+        User.objects.bulk_create([
+            User(email=f"bulk{i}@paynion.test", username=f"bulk{i}", full_name=f"Bulk {i}")
+            for i in range(60)
+        ])
+
+        form = GroupCreateForm(data={"title": "Trip", "members": ["abc", str(self.anita.id)]})
+
+        self.assertFalse(form.is_valid())
+        html = str(form["members"])
+        self.assertIn("Anita Rao", html)
+        self.assertNotIn("Bulk 42", html)
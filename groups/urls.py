@@ -10,7 +10,13 @@ urlpatterns = [
     path("delete/<int:group_id>/", views.delete_group, name="delete_group"),
     path("all/", views.view_all_group, name="view_all_group"),
     path("detail/<int:group_id>/", views.group_detail, name="group_detail"),
+    path("detail/<int:group_id>/expenses/", views.group_expenses_api, name="group_expenses_api"),
+    path("detail/<int:group_id>/members/", views.group_member_preview, name="group_member_preview"),
+    path("members/search/", views.member_search, name="member_search"),
+    path("detail/<int:group_id>/activity/", views.group_activity_api, name="group_activity_api"),
+    path("detail/<int:group_id>/balances/", views.group_balances_as_of, name="group_balances_as_of"),
     path("add_member/<int:group_id>/", views.add_member, name="add_member"),
+    path("add_members/<int:group_id>/", views.bulk_add_members, name="bulk_add_members"),
     path("remove_member/<int:group_id>/<int:user_id>/", views.remove_member, name="remove_member"),
     path("invite/send/<int:group_id>/", views.send_group_invite, name="send_invite"),
     path("invite/accept/<uuid:token>/", views.accept_group_invite, name="accept_invite"),
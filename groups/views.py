@@ -1,31 +1,47 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from expenses.utils import calculate_group_balances, calculate_settlements
-from .forms import GroupCreateForm
+from .forms import GroupCreateForm, BulkMemberForm
 from django.conf import settings
-from django.core.mail import send_mail
+from accounts.mail import queue_email, queue_emails
 from .models import Group, GroupInvite
-from django.http import HttpResponse
+from .invites import invalidate_pending_invites
+from . import activity, counters
+from .members import member_json, member_preview, preview_prefetch, search_users, MEMBER_PREVIEW_SIZE
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time
+from expenses.snapshots import balances_as_of
 from django.urls import reverse
 from django.utils.http import urlencode
-from payments.models import Settlement
+from payments.models import Payment, Settlement
 from django.db import transaction
+from paynion.pagination import keyset_page
 
 User = get_user_model()
 
+EXPENSE_PAGE_SIZE = 20
+
 
 @login_required
 def create_group(request):
     if request.method == "POST":
         form = GroupCreateForm(request.POST)
         if form.is_valid():
-            group = form.save(commit=False)
-            group.created_by = request.user
-            group.save()
-            form.save_m2m()
+            with transaction.atomic():
+                group = form.save(commit=False)
+                group.created_by = request.user
+                group.save()
+                form.save_m2m()
+                counters.recount_members(group)
+                activity.record_all(activity.member_entries(
+                    group, request.user, set(), {user.id for user in form.cleaned_data["members"]}
+                ))
             return redirect("accounts:dashboard")
     else:
         form = GroupCreateForm()
@@ -44,7 +60,13 @@ def edit_group(request, group_id):
     if request.method == "POST":
         form = GroupCreateForm(request.POST, instance=group)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                before = set(group.members.values_list("id", flat=True))
+                form.save()
+                counters.recount_members(group)
+                activity.record_all(activity.member_entries(
+                    group, request.user, before, {user.id for user in form.cleaned_data["members"]}
+                ))
             return redirect("groups:group_detail", group_id=group.id)
     else:
         form = GroupCreateForm(instance=group)
@@ -72,14 +94,14 @@ def delete_group(request, group_id):
 
 @login_required
 def view_all_group(request):
-    user_groups = Group.objects.filter(members=request.user)
+    user_groups = Group.objects.filter(members=request.user).prefetch_related(preview_prefetch(3))
     show_add_expense = request.GET.get("from") == "add_expense"
 
     groups_data = []
 
     for group in user_groups:
-        # 1. Total Spending (All expenses in this group)
-        total_spending = group.expenses.aggregate(total=models.Sum('amount'))['total'] or 0
+        # 1. Total Spending (maintained counter column)
+        total_spending = group.total_spending
 
         # 2. User's Net Balance in this group
         # Calculate balances for the whole group
@@ -87,8 +109,8 @@ def view_all_group(request):
         # Get current user's balance from that dictionary
         net_balance = group_balances.get(request.user, 0)
 
-        # 3. Members Preview (All members, or limited set)
-        members = group.members.all()
+        # 3. Members Preview (first few; member_count covers the rest)
+        members = group.preview_members
 
         groups_data.append({
             "group": group,
@@ -96,7 +118,7 @@ def view_all_group(request):
             "net_balance": net_balance,
             "abs_net_balance": abs(net_balance),
             "members": members,
-            "member_count": members.count()
+            "member_count": group.member_count
         })
 
     return render(request, "groups/all_groups.html", {
@@ -113,51 +135,73 @@ def view_all_group(request):
 def group_detail(request, group_id):
     group = get_object_or_404(Group, id=group_id)
 
-    expenses = group.expenses.all().order_by("-created_at")
+    # Members once for the whole page; expenses one keyset page at a time
+    members = list(group.members.all())
+    expenses, next_cursor = keyset_page(
+        group.expenses.select_related("paid_by"), request.GET.get("cursor"), EXPENSE_PAGE_SIZE
+    )
     balances = calculate_group_balances(group)
 
     # Calculate fresh settlements from balances
     calculated_settlements = calculate_settlements(balances)
 
+    suggested = {(s["from"].id, s["to"].id): s for s in calculated_settlements}
+
     with transaction.atomic():
 
-        # Fetch existing ACTIVE settlements (important)
-        existing_settlements = Settlement.objects.filter(
-            group=group,
-            status__in=["PENDING", "PAID_REQUESTED"]
+        # Lock the PENDING rows first so a concurrent "mark as paid" either
+        # finishes before we look, or waits and then finds the row gone
+        pending = list(
+            Settlement.objects.select_for_update().filter(group=group, status="PENDING")
+        )
+        in_flow = set(
+            Settlement.objects.filter(group=group, status="PAID_REQUESTED")
+            .values_list("payer_id", "receiver_id")
         )
 
-        # Delete ONLY those pending settlements
-        # which are NOT in payment flow
-        existing_settlements.filter(status="PENDING").delete()
+        # A PENDING row survives while it still matches the suggestion, so
+        # its id and created_at stay stable across page views (payment
+        # intents, reconciliation and reminders all key on them). A row
+        # whose debt changed is replaced, and any "Pay Now" intent opened
+        # for its old amount is expired with it
+        kept, stale = set(), []
+        for row in pending:
+            pair = (row.payer_id, row.receiver_id)
+            if pair not in kept and suggested.get(pair, {}).get("amount") == row.amount:
+                kept.add(pair)
+            else:
+                stale.append(row.id)
+
+        Payment.objects.filter(settlement_id__in=stale, status="PENDING").update(status="EXPIRED")
+        Settlement.objects.filter(id__in=stale, status="PENDING").delete()
 
         # Create new settlements ONLY if they don't already exist
-        for s in calculated_settlements:
-            already_exists = existing_settlements.filter(
+        in_flow.update(kept)
+        Settlement.objects.bulk_create([
+            Settlement(
+                group=group,
                 payer=s["from"],
-                receiver=s["to"]
-            ).exists()
-
-            if not already_exists:
-                Settlement.objects.create(
-                    group=group,
-                    payer=s["from"],
-                    receiver=s["to"],
-                    amount=s["amount"],
-                    status="PENDING"
-                )
+                receiver=s["to"],
+                amount=s["amount"],
+                status="PENDING"
+            )
+            for pair, s in suggested.items()
+            if pair not in in_flow
+        ])
 
     # Fetch active settlements for UI
     settlements = Settlement.objects.filter(
         group=group,
         status__in=["PENDING", "PAID_REQUESTED"]
-    )
+    ).select_related("payer", "receiver")
 
     is_admin = request.user == group.created_by
 
     return render(request, "groups/group_detail.html", {
         "group": group,
+        "members": members,
         "expenses": expenses,
+        "next_cursor": next_cursor,
         "balances": balances,
         "settlements": settlements,
         "is_admin": is_admin,
@@ -166,6 +210,185 @@ def group_detail(request, group_id):
 
 
 
+@login_required
+def group_expenses_api(request, group_id):
+    """
+    "Load more" for the group detail expense feed.
+    ?cursor=<next_cursor from the previous page>
+    """
+    group = get_object_or_404(Group, id=group_id)
+
+    if not group.members.filter(id=request.user.id).exists():
+        return JsonResponse({"error": "Not a member of this group."}, status=403)
+
+    expenses, next_cursor = keyset_page(
+        group.expenses.select_related("paid_by"), request.GET.get("cursor"), EXPENSE_PAGE_SIZE
+    )
+
+    return JsonResponse({
+        "expenses": [
+            {
+                "id": expense.id,
+                "description": expense.description,
+                "amount": f"{expense.amount:.2f}",
+                "paid_by": expense.paid_by.full_name,
+                "created_at": expense.created_at.isoformat(),
+                "edit_url": reverse("expenses:edit_expense", args=[expense.id]),
+                "delete_url": reverse("expenses:delete_expense", args=[expense.id]),
+            }
+            for expense in expenses
+        ],
+        "next_cursor": next_cursor,
+    })
+
+
+
+
+@login_required
+def member_search(request):
+    """
+    Prefix search for member pickers.
+      ?q=<name or email prefix>
+      ?group=<id>   only members of that group (you must be one too)
+    """
+    group = None
+    if request.GET.get("group"):
+        group = get_object_or_404(Group, id=request.GET["group"])
+        if not group.members.filter(id=request.user.id).exists():
+            return JsonResponse({"error": "Not a member of this group."}, status=403)
+
+    # Outside a group an empty query would just list the user table
+    query = request.GET.get("q", "")
+    if group is None and len(query.strip()) < 2:
+        return JsonResponse({"results": []})
+
+    return JsonResponse({"results": [member_json(user) for user in search_users(query, group)]})
+
+
+@login_required
+def group_member_preview(request, group_id):
+    """
+    First ?n= members (default MEMBER_PREVIEW_SIZE, max 20) plus the total.
+    """
+    group = get_object_or_404(Group, id=group_id)
+
+    if not group.members.filter(id=request.user.id).exists():
+        return JsonResponse({"error": "Not a member of this group."}, status=403)
+
+    try:
+        size = min(max(int(request.GET.get("n", MEMBER_PREVIEW_SIZE)), 1), 20)
+    except ValueError:
+        return JsonResponse({"error": "Invalid 'n' value."}, status=400)
+
+    members, member_count = member_preview(group, size)
+
+    return JsonResponse({
+        "members": [member_json(user) for user in members],
+        "member_count": member_count,
+    })
+
+
+
+
+USER_FIELDS = ("payer", "receiver")
+
+
+@login_required
+def group_activity_api(request, group_id):
+    """
+    Group timeline, newest first.
+      ?before=<next_cursor>   older page
+      ?since=<next_cursor>    only events after it, oldest first (polling;
+                              recent events repeat across polls - dedupe on id)
+      &after=<after>          next page of a polled burst bigger than one page
+    User ids in the events resolve through the "users" map.
+    """
+    group = get_object_or_404(Group, id=group_id)
+
+    if not group.members.filter(id=request.user.id).exists():
+        return JsonResponse({"error": "Not a member of this group."}, status=403)
+
+    try:
+        since = int(request.GET["since"]) if request.GET.get("since") else None
+        before = int(request.GET["before"]) if request.GET.get("before") else None
+        after = int(request.GET["after"]) if request.GET.get("after") else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    events, next_cursor, has_more = activity.feed(group, since=since, before=before, after=after)
+
+    user_ids = set()
+    for event in events:
+        user_ids.add(event.actor_id)
+        if event.verb.startswith("MEMBER_"):
+            user_ids.add(event.target_id)
+        user_ids.update(event.data.get(field) for field in USER_FIELDS)
+    user_ids.discard(None)
+
+    return JsonResponse({
+        "events": [
+            {
+                "id": event.id,
+                "verb": event.verb,
+                "actor": event.actor_id,
+                "target": event.target_id,
+                "data": event.data,
+                "at": event.created_at.isoformat(),
+            }
+            for event in events
+        ],
+        "users": {
+            user_id: full_name
+            for user_id, full_name in User.objects.filter(id__in=user_ids).values_list("id", "full_name")
+        },
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        # Polling only: rest of this burst is ?since=<next_cursor>&after=<after>
+        "after": events[-1].id if since is not None and has_more else None,
+    })
+
+
+
+
+@login_required
+def group_balances_as_of(request, group_id):
+    """
+    ?at=<ISO datetime or YYYY-MM-DD> (a date means end of that day).
+    Defaults to now.
+    """
+    group = get_object_or_404(Group, id=group_id)
+
+    if not group.members.filter(id=request.user.id).exists():
+        return JsonResponse({"error": "Not a member of this group."}, status=403)
+
+    at = timezone.now()
+    raw = request.GET.get("at")
+    if raw:
+        at = parse_datetime(raw)
+        if at is None:
+            day = parse_date(raw)
+            if day is None:
+                return JsonResponse({"error": "Invalid 'at' value."}, status=400)
+            at = datetime.combine(day, time.max)
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+
+    balances, snapshot = balances_as_of(group, at)
+    names = dict(User.objects.filter(id__in=balances).values_list("id", "full_name"))
+
+    return JsonResponse({
+        "group": group.id,
+        "as_of": at.isoformat(),
+        "snapshot_at": snapshot.taken_at.isoformat() if snapshot else None,
+        "balances": [
+            {"user_id": user_id, "full_name": names.get(user_id), "amount": f"{amount:.2f}"}
+            for user_id, amount in sorted(balances.items(), key=lambda item: -item[1])
+        ],
+    })
+
+
+
+
 @login_required
 def add_member(request, group_id):
     group = get_object_or_404(Group, id=group_id)
@@ -183,11 +406,86 @@ def add_member(request, group_id):
             messages.error(request, "User not found.")
             return redirect("groups:group_detail", group_id=group.id)
 
-        if user in group.members.all():
-            messages.warning(request, "User already exists in this group.")
-        else:
-            group.members.add(user)
+        with transaction.atomic():
+            added = counters.add_members(group, [user])
+            if added:
+                activity.record(group, "MEMBER_ADDED", request.user, user)
+
+        if added:
             messages.success(request, "Member added successfully.")
+        else:
+            messages.warning(request, "User already exists in this group.")
+
+    return redirect("groups:group_detail", group_id=group.id)
+
+
+@login_required
+def bulk_add_members(request, group_id):
+    group = get_object_or_404(Group, id=group_id)
+
+    if request.user != group.created_by:
+        messages.error(request, "You are not allowed to add members.")
+        return redirect("groups:group_detail", group_id=group.id)
+
+    if request.method != "POST":
+        return redirect("groups:group_detail", group_id=group.id)
+
+    form = BulkMemberForm(request.POST, request.FILES)
+    if not form.is_valid():
+        for error in form.non_field_errors():
+            messages.error(request, error)
+        return redirect("groups:group_detail", group_id=group.id)
+
+    emails = form.cleaned_data["email_list"]
+
+    # One query to resolve every address (emails are compared lower-cased;
+    # the form already lower-cases the pasted list)
+    users = list(User.objects.annotate(email_lower=Lower("email")).filter(email_lower__in=emails))
+
+    # Everyone without an account gets an invite (unless one is already open)
+    registered = {u.email.lower() for u in users}
+    already_invited = set(
+        GroupInvite.objects.annotate(email_lower=Lower("email"))
+        .filter(group=group, email_lower__in=emails, is_accepted=False, expires_at__gt=timezone.now())
+        .values_list("email_lower", flat=True)
+    )
+    to_invite = [e for e in emails if e not in registered and e not in already_invited]
+
+    with transaction.atomic():
+        # One query to see who is already in, one INSERT, one counter UPDATE
+        new_members = counters.add_members(group, users)
+        activity.record_all(
+            activity.entry(group, "MEMBER_ADDED", request.user, user)
+            for user in new_members
+        )
+
+        invites = GroupInvite.objects.bulk_create([
+            GroupInvite(email=email, group=group, invited_by=request.user)
+            for email in to_invite
+        ])
+
+        queue_emails(
+            (
+                invite.email,
+                f"Invite to join {group.title}",
+                invite_email_body(
+                    group,
+                    request.build_absolute_uri(reverse("groups:accept_invite", args=[invite.token])),
+                ),
+            )
+            for invite in invites
+        )
+
+    invalidate_pending_invites(*to_invite)
+
+    summary = [f"{len(new_members)} member(s) added", f"{len(invites)} invite(s) sent"]
+    skipped = len(users) - len(new_members) + len(already_invited)
+    if skipped:
+        summary.append(f"{skipped} already in group or invited")
+    messages.success(request, ", ".join(summary) + ".")
+
+    if form.cleaned_data["invalid"]:
+        messages.warning(request, "Skipped invalid: " + ", ".join(form.cleaned_data["invalid"][:10]))
 
     return redirect("groups:group_detail", group_id=group.id)
 
@@ -205,7 +503,10 @@ def remove_member(request, group_id, user_id):
         messages.error(request, "Group creator cannot be removed.")
         return redirect("groups:group_detail", group_id=group.id)
 
-    group.members.remove(user)
+    with transaction.atomic():
+        if counters.remove_member(group, user):
+            activity.record(group, "MEMBER_REMOVED", request.user, user)
+
     messages.success(request, "Member removed successfully.")
 
     return redirect("groups:group_detail", group_id=group.id)
@@ -213,51 +514,73 @@ def remove_member(request, group_id, user_id):
 
 
 
+def invite_email_body(group, invite_link):
+    return f"""
+You have been invited to join the group "{group.title}"
+
+Click below to accept the invite:
+{invite_link}
+
+If you are not logged in, you will be asked to login or signup first.
+"""
+
+
 @login_required
 def send_group_invite(request, group_id):
     if request.method == "POST":
         email = request.POST.get("email")
         group = get_object_or_404(Group, id=group_id)
         invite = GroupInvite.objects.create(email=email,group=group,invited_by=request.user)
+        invalidate_pending_invites(email)
 
-        invite_link = f"http://127.0.0.1:8000/groups/invite/accept/{invite.token}/"
+        invite_link = request.build_absolute_uri(
+            reverse("groups:accept_invite", args=[invite.token])
+        )
 
-        send_mail(
+        # Delivered by the send_queued_emails worker, not in this request
+        queue_email(
+            to_email=email,
             subject=f"Invite to join {group.title}",
-            message=f"""
-You have been invited to join the group "{group.title}"
-
-Click below to accept the invite:
-{invite_link}
-
-If you are not logged in, you will be asked to login or signup first.
-""",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False
+            body=invite_email_body(group, invite_link),
         )
 
+        messages.success(request, f"Invite sent to {email}.")
         return redirect("groups:group_detail", group_id=group.id)
 
 
 @login_required
 def accept_group_invite(request, token):
-    invite = get_object_or_404(GroupInvite, token=token, is_accepted=False)
+    invite = GroupInvite.objects.select_related("group").filter(token=token, is_accepted=False).first()
+
+    # Withdrawn / already used: the dashboard may still have it cached
+    if invite is None:
+        invalidate_pending_invites(request.user.email)
+        messages.info(request, "This invitation is no longer available.")
+        return redirect("accounts:dashboard")
 
-    if invite.email != request.user.email:
+    if invite.email.lower() != request.user.email.lower():
         messages.error(request, "This invitation is not for your email address.")
         return redirect("accounts:dashboard")
 
+    if invite.is_expired:
+        invalidate_pending_invites(invite.email)
+        messages.error(request, "This invitation has expired. Ask the group admin to invite you again.")
+        return redirect("accounts:dashboard")
+
     if request.method == "POST":
         if request.POST.get("action") == "accept":
-            invite.group.members.add(request.user)
-            invite.is_accepted = True
-            invite.save()
+            with transaction.atomic():
+                if counters.add_members(invite.group, [request.user]):
+                    activity.record(invite.group, "MEMBER_JOINED", request.user, request.user)
+                invite.is_accepted = True
+                invite.save()
+            invalidate_pending_invites(invite.email)
             messages.success(request, "You have successfully joined the group!")
             return redirect("groups:group_detail", group_id=invite.group.id)
 
         else:
             invite.delete()
+            invalidate_pending_invites(invite.email)
             messages.info(request, "Invitation rejected.")
             return redirect("accounts:dashboard")
 
@@ -0,0 +1,29 @@
+from django import forms
+from django.forms.models import ModelChoiceIterator
+
+
+class MemberPickerWidget(forms.SelectMultiple):
+    """
+    Search-as-you-type replacement for CheckboxSelectMultiple.
+
+    Only the currently selected users are rendered (one pk__in query);
+    everyone else is found through the groups:member_search API.
+    """
+    template_name = "groups/widgets/member_picker.html"
+
+    def __init__(self, search_url="", attrs=None):
+        super().__init__(attrs)
+        self.search_url = search_url
+
+    def optgroups(self, name, value, attrs=None):
+        if isinstance(self.choices, ModelChoiceIterator):
+            # Bound forms re-render whatever was posted - skip junk pks
+            selected = [v for v in value if str(v).isdigit()]
+            queryset = self.choices.queryset.filter(pk__in=selected) if selected else []
+            self.choices = [(user.pk, user.full_name) for user in queryset]
+        return super().optgroups(name, value, attrs)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["search_url"] = self.search_url
+        return context
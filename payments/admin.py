@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, Settlement, PaymentHistory
+from .models import Payment, Settlement, PaymentHistory, PaymentWebhookEvent
 
 # Register your models here.
 
@@ -15,7 +15,7 @@ class PaymentAdmin(admin.ModelAdmin):
 @admin.register(Settlement)
 class SettlementAdmin(admin.ModelAdmin):
     list_display = ('group', 'payer', 'receiver', 'amount', 'payment_mode', 'status', 'created_at', 'paid_requested_at')
-    search_fields = ('group__title', 'payer__full_name', 'receiver__full_name')
+    search_fields = ('group__title', 'payer__full_name', 'receiver__full_name', 'transaction_ref')
     list_filter = ('payment_mode', 'status', 'created_at')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'paid_requested_at')
@@ -25,4 +25,13 @@ class SettlementAdmin(admin.ModelAdmin):
 class PaymentHistoryAdmin(admin.ModelAdmin):
     list_display = ('settlement', 'paid_by', 'received_by', 'amount', 'payment_mode')
     search_fields = ('paid_by__full_name', 'received_by__full_name', 'settlement__id')
-    ordering = ('-settlement__created_at',)
\ No newline at end of file
+    ordering = ('-settlement__created_at',)
+
+
+@admin.register(PaymentWebhookEvent)
+class PaymentWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'event_type', 'status', 'attempts', 'received_at', 'processed_at')
+    search_fields = ('event_id', 'event_type')
+    list_filter = ('status', 'event_type', 'received_at')
+    ordering = ('-received_at',)
+    readonly_fields = ('event_id', 'event_type', 'payload', 'received_at')
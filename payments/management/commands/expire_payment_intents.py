@@ -0,0 +1,44 @@
+"""
+expire_payment_intents.py
+-------------------------
+Django management command to expire PENDING payments nobody completed.
+
+Every "Pay Now" click opens a PENDING Payment. Ones that were never
+confirmed are marked EXPIRED in batches so they stop matching new intents
+and don't pile up. Schedule it (cron) e.g. once an hour.
+
+Usage:
+    python manage.py expire_payment_intents
+    python manage.py expire_payment_intents --older-than-hours 48 --batch-size 500
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.services import expire_stale_payment_intents
+
+
+class Command(BaseCommand):
+    help = "Marks stale PENDING payment intents as EXPIRED in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-hours",
+            type=int,
+            default=settings.PAYMENT_INTENT_TTL_HOURS,
+            help="Expire PENDING payments created more than this many hours ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows updated per UPDATE statement.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["older_than_hours"])
+        expired = expire_stale_payment_intents(cutoff, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"✓ Expired {expired} stale payment intent(s)"))
@@ -0,0 +1,48 @@
+"""
+process_payment_webhooks.py
+---------------------------
+Django management command (background worker) that applies stored payment
+gateway webhook events to Payment / Settlement.
+
+The webhook view only records events; run this alongside the web server.
+Several copies can run at once - each claims different events.
+
+Usage:
+    python manage.py process_payment_webhooks            # drain once and exit
+    python manage.py process_payment_webhooks --loop     # keep polling
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.webhooks import process_webhook_events
+
+
+class Command(BaseCommand):
+    help = "Applies received payment webhook events."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new events.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when there is nothing to do (with --loop).",
+        )
+        parser.add_argument("--batch-size", type=int, default=100, help="Events claimed per batch.")
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            handled = process_webhook_events(batch_size=options["batch_size"])
+            total += handled
+
+            if handled:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Processed {total} webhook event(s)"))
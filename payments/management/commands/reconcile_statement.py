@@ -0,0 +1,74 @@
+"""
+reconcile_statement.py
+----------------------
+Django management command to confirm payments from a bank / UPI statement.
+
+Streams the statement CSV and matches every credit to an open Payment
+(PENDING) or Settlement (PENDING / PAID_REQUESTED) on amount, receiver
+UPI ID and time window. Matches become SUCCESS / SETTLED and get the
+statement reference (UTR) stored in transaction_ref.
+
+Expected columns (common bank export names are also recognised):
+    date, amount, upi_id, reference
+
+Usage:
+    python manage.py reconcile_statement statement.csv
+    python manage.py reconcile_statement statement.csv --window-days 5 --dry-run
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.reconciliation import reconcile_statement
+
+
+class Command(BaseCommand):
+    help = "Matches a bank/UPI statement CSV to open payments and settlements."
+
+    def add_arguments(self, parser):
+        parser.add_argument("statement", type=str, help="Path to the statement CSV.")
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            default=settings.RECONCILIATION_WINDOW_DAYS,
+            help="How many days after a payment was started its credit may appear.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Statement rows matched and written per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report matches without updating anything.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["statement"], "rb") as f:
+                stats = reconcile_statement(
+                    f,
+                    window=timedelta(days=options["window_days"]),
+                    chunk_size=options["chunk_size"],
+                    dry_run=options["dry_run"],
+                )
+        except FileNotFoundError:
+            raise CommandError(f"Statement '{options['statement']}' not found.")
+        except UnicodeDecodeError:
+            raise CommandError(f"Statement '{options['statement']}' is not a UTF-8 CSV file.")
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {prefix}{stats['rows']} rows: "
+            f"{stats['matched_payments']} payments, {stats['matched_settlements']} settlements matched"
+        ))
+        self.stdout.write(
+            f"   {stats['unmatched']} unmatched · {stats['invalid']} invalid · "
+            f"{stats['already_applied']} already applied"
+        )
@@ -0,0 +1,56 @@
+"""
+remind_overdue_settlements.py
+-----------------------------
+Django management command to nudge users about settlements left open.
+
+PENDING settlements older than SETTLEMENT_REMINDER_PENDING_DAYS remind the
+payer; PAID_REQUESTED ones older than SETTLEMENT_REMINDER_PAID_REQUESTED_DAYS
+remind the receiver to confirm. Each user gets in-app notifications plus one
+digest email (queued; delivered by send_queued_emails). A settlement is not
+reminded again for SETTLEMENT_REMINDER_REPEAT_DAYS. Schedule it (cron) e.g.
+once a day.
+
+Usage:
+    python manage.py remind_overdue_settlements
+    python manage.py remind_overdue_settlements --chunk-size 500 --no-email
+    python manage.py remind_overdue_settlements --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from payments.reminders import send_overdue_reminders
+
+
+class Command(BaseCommand):
+    help = "Sends reminders (notifications + digest emails) for overdue settlements."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Settlements loaded and written per chunk.",
+        )
+        parser.add_argument(
+            "--no-email",
+            action="store_true",
+            help="Only create in-app notifications.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count overdue settlements without notifying anyone.",
+        )
+
+    def handle(self, *args, **options):
+        stats = send_overdue_reminders(
+            chunk_size=options["chunk_size"],
+            send_email=not options["no_email"],
+            dry_run=options["dry_run"],
+        )
+
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {prefix}{stats['settlements']} overdue settlement(s), "
+            f"{stats['notifications']} notification(s), {stats['emails']} digest email(s) queued"
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 06:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0009_group_last_settled_at'),
+        ('payments', '0005_payment_intent_idempotency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymenthistory',
+            index=models.Index(fields=['paid_by', 'confirmed_at'], name='payments_pa_paid_by_3983c6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenthistory',
+            index=models.Index(fields=['received_by', 'confirmed_at'], name='payments_pa_receive_c99f5b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='settlement',
+            index=models.Index(fields=['payer', 'status'], name='payments_se_payer_i_9256b4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='settlement',
+            index=models.Index(fields=['receiver', 'status'], name='payments_se_receive_ab774b_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_history_and_settlement_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settlement',
+            name='transaction_ref',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
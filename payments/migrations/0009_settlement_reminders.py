@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-19 07:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0009_group_last_settled_at'),
+        ('payments', '0008_paymentwebhookevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settlement',
+            name='reminded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='settlement',
+            index=models.Index(fields=['status', 'created_at'], name='payments_se_status_9484ea_idx'),
+        ),
+    ]
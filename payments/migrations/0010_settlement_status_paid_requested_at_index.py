@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-19 07:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0012_group_activity'),
+        ('payments', '0009_settlement_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='settlement',
+            index=models.Index(fields=['status', 'paid_requested_at'], name='payments_se_status_0af8af_idx'),
+        ),
+    ]
@@ -18,12 +18,26 @@ class Payment(models.Model):
             ("PENDING", "Pending"),
             ("SUCCESS", "Success"),
             ("FAILED", "Failed"),
+            ("EXPIRED", "Expired"),
         ],
         default="PENDING"
     )
     transaction_ref = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Idempotency key parts: a repeat "Pay Now" for the same settlement
+    # (or the same client token) reuses this row instead of adding another
+    settlement = models.ForeignKey(
+        "Settlement", on_delete=models.SET_NULL, null=True, blank=True, related_name="payments"
+    )
+    client_token = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["payer", "receiver", "status", "created_at"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
+
 
 
 
@@ -59,6 +73,16 @@ class Settlement(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     paid_requested_at = models.DateTimeField(null=True, blank=True)
     settled_at = models.DateTimeField(null=True, blank=True)
+    transaction_ref = models.CharField(max_length=100, blank=True, null=True)
+    reminded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["payer", "status"]),
+            models.Index(fields=["receiver", "status"]),
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["status", "paid_requested_at"]),
+        ]
 
 
 
@@ -82,3 +106,42 @@ class PaymentHistory(models.Model):
 
     requested_at = models.DateTimeField()
     confirmed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["paid_by", "confirmed_at"]),
+            models.Index(fields=["received_by", "confirmed_at"]),
+        ]
+
+
+
+
+class PaymentWebhookEvent(models.Model):
+    """
+    Raw payment gateway callbacks, stored once per event_id before any
+    processing so gateway retries are no-ops.
+    """
+    STATUS_CHOICES = [
+        ("RECEIVED", "Received"),
+        ("PROCESSED", "Processed"),
+        ("IGNORED", "Ignored"),
+        ("FAILED", "Failed"),
+    ]
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="RECEIVED")
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id})"
@@ -0,0 +1,298 @@
+"""
+Bank / UPI statement reconciliation.
+
+Streams a statement CSV row by row and matches each credit to an open
+Payment (PENDING) or Settlement (PENDING / PAID_REQUESTED) on
+amount + receiver UPI ID + time window.
+
+Memory stays bounded however long the statement is: only the OPEN records
+are held in an in-memory index, and matches are written back in chunks.
+"""
+
+import csv
+import io
+from bisect import insort
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from expenses.balances import record_settlements
+from expenses.snapshots import take_group_snapshot
+from groups import activity
+from groups.models import Group
+from .models import Payment, Settlement, PaymentHistory
+
+# Accepted header names per field (compared lower-cased and stripped)
+STATEMENT_COLUMNS = {
+    "date": ("date", "txn date", "transaction date", "value date", "timestamp"),
+    "amount": ("amount", "credit", "credit amount", "txn amount"),
+    "upi_id": ("upi_id", "upi id", "vpa", "payee vpa", "receiver vpa"),
+    "reference": ("reference", "ref no", "utr", "rrn", "transaction id", "transaction_ref"),
+}
+
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d/%m/%y", "%d %b %Y", "%d-%b-%Y")
+
+
+def _parse_statement_time(value):
+    """
+    Returns the (start, end) interval a statement timestamp covers.
+    Statements with dates only cover the whole day.
+    """
+    value = (value or "").strip()
+
+    parsed = parse_datetime(value)
+    if parsed:
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed, parsed
+
+    for fmt in DATE_FORMATS:
+        try:
+            day = datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        return start, start + timedelta(days=1)
+
+    return None
+
+
+def _resolve_columns(fieldnames):
+    lookup = {name.strip().lower(): name for name in fieldnames or []}
+    columns = {}
+
+    for field, aliases in STATEMENT_COLUMNS.items():
+        for alias in aliases:
+            if alias in lookup:
+                columns[field] = lookup[alias]
+                break
+
+    missing = {"date", "amount", "upi_id"} - set(columns)
+    if missing:
+        raise ValueError(f"Statement is missing column(s): {', '.join(sorted(missing))}")
+
+    return columns
+
+
+class OpenRecordIndex:
+    """
+    (amount, upi_id) → list of (opened_at, kind, id, linked settlement id), oldest first.
+    """
+
+    def __init__(self):
+        self.entries = defaultdict(list)
+
+    def add(self, amount, upi_id, opened_at, kind, pk, settlement_id=None):
+        if upi_id:
+            insort(self.entries[(amount, upi_id.strip().lower())], (opened_at, kind, pk, settlement_id))
+
+    def take(self, amount, upi_id, start, end, window):
+        """
+        Remove and return (kind, id, linked settlement id) of the oldest
+        record opened no later than the statement row and no earlier than
+        `window` before it, or None.
+        """
+        candidates = self.entries.get((amount, upi_id.strip().lower()))
+        if not candidates:
+            return None
+
+        for i, (opened_at, kind, pk, settlement_id) in enumerate(candidates):
+            if opened_at <= end and start <= opened_at + window:
+                return candidates.pop(i)[1:]
+
+        return None
+
+
+def build_open_record_index(receiver=None):
+    """
+    A "Pay Now" intent and the open settlement it pays for are ONE record
+    (one credit settles both, as on the webhook path); every other open
+    payment or settlement is a record of its own.
+    """
+    index = OpenRecordIndex()
+
+    payments = Payment.objects.filter(status="PENDING")
+    settlements = Settlement.objects.filter(status__in=["PENDING", "PAID_REQUESTED"])
+    if receiver is not None:
+        payments = payments.filter(receiver=receiver)
+        settlements = settlements.filter(receiver=receiver)
+
+    linked = set()
+    rows = payments.values(
+        "id", "amount", "upi_id", "created_at", "settlement_id", "settlement__status", "settlement__amount"
+    ).iterator(chunk_size=2000)
+    for row in rows:
+        settlement_id = None
+        if row["settlement__status"] in ("PENDING", "PAID_REQUESTED") and row["settlement__amount"] == row["amount"]:
+            settlement_id = row["settlement_id"]
+            linked.add(settlement_id)
+        index.add(row["amount"], row["upi_id"], row["created_at"], "payment", row["id"], settlement_id)
+
+    rows = settlements.values(
+        "id", "amount", "receiver__upi_id", "created_at", "paid_requested_at"
+    ).iterator(chunk_size=2000)
+    for row in rows:
+        if row["id"] in linked:
+            continue
+        # group_detail keeps a PENDING row (and its created_at) for as long
+        # as the debt it shows is unchanged, so this is when the debt opened
+        opened_at = row["paid_requested_at"] or row["created_at"]
+        index.add(row["amount"], row["receiver__upi_id"], opened_at, "settlement", row["id"])
+
+    return index
+
+
+def _already_applied(references):
+    if not references:
+        return set()
+
+    used = set(
+        Payment.objects.filter(transaction_ref__in=references).values_list("transaction_ref", flat=True)
+    )
+    used.update(
+        Settlement.objects.filter(transaction_ref__in=references).values_list("transaction_ref", flat=True)
+    )
+    return used
+
+
+def _apply_matches(payment_refs, settlement_refs):
+    """
+    Write one chunk of matches: payments → SUCCESS, settlements → SETTLED
+    (with their PaymentHistory rows and the group checkpoint).
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update().filter(id__in=payment_refs, status="PENDING")
+        )
+        for payment in payments:
+            payment.status = "SUCCESS"
+            payment.transaction_ref = payment_refs[payment.id]
+        Payment.objects.bulk_update(payments, ["status", "transaction_ref"])
+
+        settlements = list(
+            Settlement.objects.select_for_update().filter(
+                id__in=settlement_refs, status__in=["PENDING", "PAID_REQUESTED"]
+            )
+        )
+        for settlement in settlements:
+            settlement.status = "SETTLED"
+            settlement.payment_mode = "UPI"
+            settlement.paid_requested_at = settlement.paid_requested_at or now
+            settlement.settled_at = now
+            settlement.transaction_ref = settlement_refs[settlement.id]
+        Settlement.objects.bulk_update(
+            settlements, ["status", "payment_mode", "paid_requested_at", "settled_at", "transaction_ref"]
+        )
+
+        PaymentHistory.objects.bulk_create([
+            PaymentHistory(
+                settlement=settlement,
+                paid_by_id=settlement.payer_id,
+                received_by_id=settlement.receiver_id,
+                amount=settlement.amount,
+                payment_mode="UPI",
+                requested_at=settlement.paid_requested_at,
+            )
+            for settlement in settlements
+        ])
+
+        group_ids = {settlement.group_id for settlement in settlements}
+        if group_ids:
+            Group.objects.filter(id__in=group_ids).update(last_settled_at=now)
+        record_settlements(settlements)
+        for group_id in group_ids:
+            take_group_snapshot(group_id, reason="SETTLEMENT")
+        activity.record_all(activity.settlement_entry(settlement, "SETTLED") for settlement in settlements)
+
+    return len(payments), len(settlements)
+
+
+def reconcile_statement(stream, receiver=None, window=timedelta(days=3), chunk_size=1000, dry_run=False):
+    """
+    Match a statement CSV (binary or text stream) against open records.
+
+    receiver: only match records paid TO this user (for self-service uploads)
+    window:   how long after a payment intent / "mark as paid" the money may land
+
+    Returns: dict of counters
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    reader = csv.DictReader(stream)
+    columns = _resolve_columns(reader.fieldnames)
+    index = build_open_record_index(receiver)
+
+    stats = {"rows": 0, "matched_payments": 0, "matched_settlements": 0,
+             "unmatched": 0, "invalid": 0, "already_applied": 0}
+
+    def flush(chunk):
+        used = _already_applied([row["reference"] for row in chunk if row["reference"]])
+        payment_refs, settlement_refs = {}, {}
+
+        for row in chunk:
+            if row["reference"] and row["reference"] in used:
+                stats["already_applied"] += 1
+                continue
+
+            match = index.take(row["amount"], row["upi_id"], row["start"], row["end"], window)
+            if match is None:
+                stats["unmatched"] += 1
+                continue
+
+            kind, pk, linked_settlement = match
+            target = payment_refs if kind == "payment" else settlement_refs
+            target[pk] = row["reference"] or None
+            if linked_settlement:
+                settlement_refs[linked_settlement] = row["reference"] or None
+
+            if row["reference"]:
+                # Same UTR twice in one statement must not settle two records
+                used.add(row["reference"])
+
+        if dry_run:
+            stats["matched_payments"] += len(payment_refs)
+            stats["matched_settlements"] += len(settlement_refs)
+            return
+
+        payments, settlements = _apply_matches(payment_refs, settlement_refs)
+        stats["matched_payments"] += payments
+        stats["matched_settlements"] += settlements
+
+    chunk = []
+    for raw in reader:
+        stats["rows"] += 1
+
+        interval = _parse_statement_time(raw.get(columns["date"]))
+        upi_id = (raw.get(columns["upi_id"]) or "").strip()
+        try:
+            amount = Decimal((raw.get(columns["amount"]) or "").replace(",", "").strip()).quantize(Decimal("0.01"))
+        except InvalidOperation:
+            amount = None
+
+        if interval is None or amount is None or amount <= 0 or not upi_id:
+            stats["invalid"] += 1
+            continue
+
+        chunk.append({
+            "start": interval[0],
+            "end": interval[1],
+            "amount": amount,
+            "upi_id": upi_id,
+            "reference": (raw.get(columns["reference"]) or "").strip() if "reference" in columns else "",
+        })
+
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+
+    if chunk:
+        flush(chunk)
+
+    return stats
@@ -0,0 +1,118 @@
+"""
+Overdue settlement reminders.
+
+Finds settlements that have sat open too long (via the (status, created_at)
+and (status, paid_requested_at) indexes), drops an in-app Notification for whoever has to act and sends each
+of those users ONE digest email (via the outbound email queue) listing all
+of their overdue settlements.
+
+Settlements are walked in id-ordered chunks so a run over tens of thousands
+of rows never holds more than one chunk of model instances; only the short
+per-user digest lines are kept until the end.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.mail import queue_emails
+from accounts.models import Notification
+from accounts.notifications import notify_all
+from .models import Settlement
+
+
+def overdue_settlements(now=None):
+    now = now or timezone.now()
+    repeat_cutoff = now - timedelta(days=settings.SETTLEMENT_REMINDER_REPEAT_DAYS)
+
+    return (
+        Settlement.objects
+        .filter(
+            Q(status="PENDING",
+              created_at__lt=now - timedelta(days=settings.SETTLEMENT_REMINDER_PENDING_DAYS))
+            # The receiver's clock starts when the payer marked it paid
+            | Q(status="PAID_REQUESTED",
+                paid_requested_at__lt=now - timedelta(days=settings.SETTLEMENT_REMINDER_PAID_REQUESTED_DAYS))
+        )
+        .filter(Q(reminded_at__isnull=True) | Q(reminded_at__lt=repeat_cutoff))
+    )
+
+
+def _reminder(settlement):
+    """
+    Returns: (user to remind, message)
+    """
+    group = settlement.group.title
+    amount = f"₹{settlement.amount:.2f}"
+
+    if settlement.status == "PENDING":
+        return settlement.payer, (
+            f"Reminder: you owe {amount} to {settlement.receiver.full_name} in '{group}'"
+        )
+
+    return settlement.receiver, (
+        f"Reminder: {settlement.payer.full_name} marked {amount} as paid in '{group}' - please confirm"
+    )
+
+
+def queue_digests(digests):
+    """
+    digests: {email: [line, ...]}
+
+    Queues one email per user; the send_queued_emails worker delivers
+    them in batches over one connection.
+    Returns: number of emails queued
+    """
+    return len(queue_emails(
+        (
+            email,
+            f"You have {len(lines)} open settlement(s) on Paynion",
+            "\n".join(["Hi,", "", "These settlements are still open:", ""]
+                      + [f"  • {line}" for line in lines]
+                      + ["", "Open Paynion to settle up."]),
+        )
+        for email, lines in digests.items()
+    ))
+
+
+def send_overdue_reminders(now=None, chunk_size=1000, send_email=True, dry_run=False):
+    """
+    Returns: dict of counters
+    """
+    now = now or timezone.now()
+    stats = {"settlements": 0, "notifications": 0, "emails": 0}
+    digests = defaultdict(list)
+
+    base = overdue_settlements(now).select_related("group", "payer", "receiver").order_by("id")
+    last_id = 0
+
+    while True:
+        chunk = list(base.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+
+        notifications = []
+        for settlement in chunk:
+            user, message = _reminder(settlement)
+            notifications.append(Notification(user=user, message=message[:255]))
+            digests[user.email].append(message.replace("Reminder: ", "", 1))
+
+        stats["settlements"] += len(chunk)
+        stats["notifications"] += len(notifications)
+
+        if dry_run:
+            continue
+
+        with transaction.atomic():
+            notify_all(notifications)
+            Settlement.objects.filter(id__in=[s.id for s in chunk]).update(reminded_at=now)
+
+    if send_email and digests and not dry_run:
+        stats["emails"] = queue_digests(digests)
+
+    return stats
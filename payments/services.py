@@ -0,0 +1,246 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from expenses.balances import record_settlements
+from expenses.snapshots import take_group_snapshot
+from groups import activity
+from groups.models import Group
+from .models import Payment, Settlement, PaymentHistory
+
+User = get_user_model()
+
+
+def get_or_create_payment_intent(payer, receiver, amount, settlement=None, client_token=None):
+    """
+    Return the open PENDING payment for this (payer, receiver, amount,
+    client token) if one was created inside the intent window, otherwise
+    create it.
+
+    The settlement is attached, not matched on: the same debt can be shown
+    under a different settlement row between two page loads, and that must
+    not open a second intent.
+
+    Returns: (payment, created)
+    """
+    window_start = timezone.now() - timedelta(minutes=settings.PAYMENT_INTENT_WINDOW_MINUTES)
+
+    with transaction.atomic():
+        # Lock the payer row so two parallel clicks can't both miss the lookup
+        User.objects.select_for_update().filter(pk=payer.pk).first()
+
+        intents = Payment.objects.filter(
+            payer=payer,
+            receiver=receiver,
+            amount=amount,
+            status="PENDING",
+            created_at__gte=window_start,
+        )
+
+        if client_token:
+            intents = intents.filter(client_token=client_token)
+
+        payment = intents.order_by("-created_at").first()
+        if payment is not None:
+            if settlement is not None and payment.settlement_id != settlement.id:
+                payment.settlement = settlement
+                payment.save(update_fields=["settlement"])
+            return payment, False
+
+        payment = Payment.objects.create(
+            payer=payer,
+            receiver=receiver,
+            amount=amount,
+            upi_id=receiver.upi_id,
+            status="PENDING",
+            settlement=settlement,
+            client_token=client_token,
+        )
+        return payment, True
+
+
+def expire_stale_payment_intents(older_than, batch_size=1000):
+    """
+    Mark PENDING payments created before `older_than` as EXPIRED,
+    batch_size rows per UPDATE so the table is never locked for long.
+
+    Returns: number of payments expired
+    """
+    expired = 0
+
+    while True:
+        ids = list(
+            Payment.objects
+            .filter(status="PENDING", created_at__lt=older_than)
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return expired
+
+        expired += Payment.objects.filter(id__in=ids, status="PENDING").update(status="EXPIRED")
+
+
+# =================== SETTLEMENT STATE MACHINE ===================
+#
+#   PENDING ──request_payment──▶ PAID_REQUESTED ──accept──▶ SETTLED
+#      ▲                               │
+#      └────────────reject─────────────┘
+#
+# Every transition is a single conditional UPDATE ... WHERE status=<from>,
+# so concurrent clicks resolve in one round trip: exactly one caller sees
+# a changed row, everyone else gets SettlementTransitionError.
+
+class SettlementTransitionError(Exception):
+    pass
+
+
+def _transition(settlement_id, from_statuses, filters, **changes):
+    updated = Settlement.objects.filter(
+        id=settlement_id, status__in=from_statuses, **filters
+    ).update(**changes)
+
+    if not updated:
+        raise SettlementTransitionError("This settlement has already been updated.")
+
+
+def _settle(settlement_id, from_statuses, filters, payment_mode=None, transaction_ref=None, actor=None):
+    """
+    Move a settlement to SETTLED and write its PaymentHistory row and the
+    group checkpoint in the same transaction.
+    """
+    now = timezone.now()
+    changes = {"status": "SETTLED", "settled_at": now}
+    if payment_mode:
+        changes["payment_mode"] = payment_mode
+    if transaction_ref:
+        changes["transaction_ref"] = transaction_ref
+
+    with transaction.atomic():
+        _transition(settlement_id, from_statuses, filters, **changes)
+
+        settlement = Settlement.objects.get(id=settlement_id)
+        PaymentHistory.objects.create(
+            settlement=settlement,
+            paid_by_id=settlement.payer_id,
+            received_by_id=settlement.receiver_id,
+            amount=settlement.amount,
+            payment_mode=settlement.payment_mode,
+            requested_at=settlement.paid_requested_at or now,
+        )
+        Group.objects.filter(id=settlement.group_id).update(last_settled_at=now)
+        record_settlements([settlement])
+        take_group_snapshot(settlement.group_id, reason="SETTLEMENT")
+        activity.settlement_entry(settlement, "SETTLED", actor).save()
+
+    return settlement
+
+
+def request_settlement_payment(settlement_id, payer, payment_mode):
+    """
+    PENDING → PAID_REQUESTED (payer says "I have paid").
+    """
+    with transaction.atomic():
+        _transition(
+            settlement_id, ["PENDING"], {"payer": payer},
+            status="PAID_REQUESTED",
+            payment_mode=payment_mode,
+            paid_requested_at=timezone.now(),
+        )
+        settlement = Settlement.objects.get(id=settlement_id)
+        activity.settlement_entry(settlement, "PAYMENT_REQUESTED", payer).save()
+
+
+def accept_settlement_payment(settlement_id, receiver):
+    """
+    PAID_REQUESTED → SETTLED (receiver confirms the money arrived).
+    """
+    return _settle(settlement_id, ["PAID_REQUESTED"], {"receiver": receiver}, actor=receiver)
+
+
+def reject_settlement_payment(settlement_id, receiver):
+    """
+    PAID_REQUESTED → PENDING (receiver did not get the money).
+    """
+    with transaction.atomic():
+        _transition(
+            settlement_id, ["PAID_REQUESTED"], {"receiver": receiver},
+            status="PENDING",
+            paid_requested_at=None,
+        )
+        settlement = Settlement.objects.get(id=settlement_id)
+        activity.settlement_entry(settlement, "PAYMENT_REJECTED", receiver).save()
+
+
+def settle_from_gateway(settlement_id, transaction_ref=None):
+    """
+    Mark an open settlement SETTLED after the gateway confirmed the money
+    moved. Repeats (and races) are a no-op.
+
+    Returns: True if this call settled it
+    """
+    try:
+        _settle(
+            settlement_id, ["PENDING", "PAID_REQUESTED"], {},
+            payment_mode="UPI", transaction_ref=transaction_ref,
+        )
+    except SettlementTransitionError:
+        return False
+
+    return True
+
+
+def bulk_settle(group, settlement_ids, payment_mode="CASH", actor=None):
+    """
+    Admin "settle all": move the given open settlements of `group` straight
+    to SETTLED in one transaction - one bulk UPDATE, one bulk INSERT of
+    PaymentHistory rows and a single group checkpoint.
+
+    Rows another request already settled are skipped, not double-counted.
+
+    Returns: number of settlements settled
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        settlements = list(
+            Settlement.objects.select_for_update().filter(
+                group=group,
+                id__in=settlement_ids,
+                status__in=["PENDING", "PAID_REQUESTED"],
+            )
+        )
+        if not settlements:
+            return 0
+
+        for settlement in settlements:
+            settlement.status = "SETTLED"
+            settlement.payment_mode = settlement.payment_mode or payment_mode
+            settlement.paid_requested_at = settlement.paid_requested_at or now
+            settlement.settled_at = now
+        Settlement.objects.bulk_update(
+            settlements, ["status", "payment_mode", "paid_requested_at", "settled_at"]
+        )
+
+        PaymentHistory.objects.bulk_create([
+            PaymentHistory(
+                settlement=settlement,
+                paid_by_id=settlement.payer_id,
+                received_by_id=settlement.receiver_id,
+                amount=settlement.amount,
+                payment_mode=settlement.payment_mode,
+                requested_at=settlement.paid_requested_at,
+            )
+            for settlement in settlements
+        ])
+
+        Group.objects.filter(id=group.id).update(last_settled_at=now)
+        record_settlements(settlements)
+        take_group_snapshot(group, reason="SETTLEMENT")
+        activity.record_all(
+            activity.settlement_entry(settlement, "SETTLED", actor) for settlement in settlements
+        )
+
+    return len(settlements)
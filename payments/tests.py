@@ -1,3 +1,1009 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from expenses.models import Expense, ExpenseSplit
+from expenses.balances import friend_balances, rebuild_pairwise_balances
+from expenses.models import PairwiseBalance
+from expenses.utils import calculate_user_settle_up
+from accounts.mail import deliver_queued_emails
+from accounts.models import Notification
+from groups.models import Group
+from paynion.pagination import encode_cursor
+from .models import Payment, Settlement, PaymentHistory, PaymentWebhookEvent
+from .services import (
+    request_settlement_payment,
+    accept_settlement_payment,
+    reject_settlement_payment,
+    bulk_settle,
+    expire_stale_payment_intents,
+    SettlementTransitionError,
+)
+from .reconciliation import reconcile_statement
+from .reminders import send_overdue_reminders
+from .views import HISTORY_PAGE_SIZE
+from .webhooks import sign_webhook_body, process_webhook_events
+
+User = get_user_model()
+
+WEBHOOK_SECRET = "test-webhook-secret"
+
+
+class FakeGateway:
+    """
+    Stands in for Razorpay: builds signed webhook calls the way the real
+    gateway sends them, including retries of the same event.
+    """
+
+    def __init__(self, client, secret=WEBHOOK_SECRET):
+        self.client = client
+        self.secret = secret
+
+    def event(self, event_type, payment, amount=None, event_id=None, notes=None):
+        amount = payment.amount if amount is None else amount
+        return {
+            "id": event_id or f"evt_{uuid.uuid4().hex[:14]}",
+            "event": event_type,
+            "payload": {
+                "payment": {
+                    "entity": {
+                        "id": f"pay_{payment.id}",
+                        "amount": int(Decimal(amount) * 100),
+                        "currency": "INR",
+                        "notes": notes or {"payment_id": payment.id},
+                    }
+                }
+            },
+        }
+
+    def send(self, event, signature=None):
+        body = json.dumps(event).encode()
+        return self.client.post(
+            reverse("payments:payment_webhook"),
+            data=body,
+            content_type="application/json",
+            HTTP_X_RAZORPAY_SIGNATURE=signature or sign_webhook_body(body, self.secret),
+            HTTP_X_RAZORPAY_EVENT_ID=event["id"],
+        )
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class PaymentWebhookTests(TestCase):
+
+    def setUp(self):
+        self.payer = User.objects.create_user(
+            email="payer@paynion.test", username="payer", full_name="Payer", password="x"
+        )
+        self.receiver = User.objects.create_user(
+            email="receiver@paynion.test", username="receiver", full_name="Receiver",
+            password="x", upi_id="receiver@upi"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.payer)
+        self.settlement = Settlement.objects.create(
+            group=self.group, payer=self.payer, receiver=self.receiver, amount=Decimal("250.00")
+        )
+        self.payment = Payment.objects.create(
+            payer=self.payer, receiver=self.receiver, amount=Decimal("250.00"),
+            upi_id="receiver@upi", settlement=self.settlement
+        )
+        self.gateway = FakeGateway(self.client)
+
+    def test_rejects_bad_signature(self):
+        response = self.gateway.send(self.gateway.event("payment.captured", self.payment), signature="nope")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentWebhookEvent.objects.exists())
+
+    def test_retried_event_is_stored_once(self):
+        event = self.gateway.event("payment.captured", self.payment)
+
+        first = self.gateway.send(event)
+        second = self.gateway.send(event)
+
+        self.assertEqual(first.json()["status"], "ok")
+        self.assertEqual(second.json()["status"], "duplicate")
+        self.assertEqual(PaymentWebhookEvent.objects.count(), 1)
+
+    def test_captured_event_settles_payment_and_settlement(self):
+        self.gateway.send(self.gateway.event("payment.captured", self.payment))
+
+        # Nothing is applied until the worker runs
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "PENDING")
+
+        self.assertEqual(process_webhook_events(), 1)
+
+        self.payment.refresh_from_db()
+        self.settlement.refresh_from_db()
+        self.assertEqual(self.payment.status, "SUCCESS")
+        self.assertEqual(self.payment.transaction_ref, f"pay_{self.payment.id}")
+        self.assertEqual(self.settlement.status, "SETTLED")
+        self.assertEqual(PaymentHistory.objects.filter(settlement=self.settlement).count(), 1)
+
+    def test_failed_event_marks_payment_failed(self):
+        self.gateway.send(self.gateway.event("payment.failed", self.payment))
+        process_webhook_events()
+
+        self.payment.refresh_from_db()
+        self.settlement.refresh_from_db()
+        self.assertEqual(self.payment.status, "FAILED")
+        self.assertEqual(self.settlement.status, "PENDING")
+
+    def test_amount_mismatch_is_not_applied(self):
+        self.gateway.send(self.gateway.event("payment.captured", self.payment, amount="1.00"))
+        process_webhook_events()
+
+        self.payment.refresh_from_db()
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual(self.payment.status, "PENDING")
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("Amount mismatch", event.last_error)
+
+    def test_settlement_in_notes_must_belong_to_the_payment(self):
+        other = Settlement.objects.create(
+            group=self.group, payer=self.payer, receiver=self.receiver, amount=Decimal("250.00")
+        )
+        notes = {"payment_id": self.payment.id, "settlement_id": other.id}
+        self.gateway.send(self.gateway.event("payment.captured", self.payment, notes=notes))
+        process_webhook_events()
+
+        other.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual(other.status, "PENDING")
+        self.assertEqual(self.payment.status, "PENDING")
+        self.assertIn("not linked", PaymentWebhookEvent.objects.get().last_error)
+
+    def test_short_amount_does_not_settle(self):
+        # Intent for less than the settlement it was attached to
+        self.payment.amount = Decimal("100.00")
+        self.payment.save(update_fields=["amount"])
+        self.gateway.send(self.gateway.event("payment.captured", self.payment))
+        process_webhook_events()
+
+        self.settlement.refresh_from_db()
+        self.assertEqual(self.settlement.status, "PENDING")
+        self.assertIn("Amount mismatch for settlement", PaymentWebhookEvent.objects.get().last_error)
+        self.assertFalse(PaymentHistory.objects.exists())
+
+    def test_event_naming_only_a_settlement_is_rejected(self):
+        notes = {"settlement_id": self.settlement.id}
+        self.gateway.send(self.gateway.event("payment.captured", self.payment, notes=notes))
+        process_webhook_events()
+
+        self.settlement.refresh_from_db()
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual(self.settlement.status, "PENDING")
+        self.assertEqual(event.status, "RECEIVED")
+        self.assertIn("no payment_id", event.last_error)
+        self.assertFalse(PaymentHistory.objects.exists())
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class SettlementStateMachineTests(TransactionTestCase):
+    """
+    Real threads, real transactions: every contended transition must have
+    exactly one winner.
+    """
+
+    THREADS = 8
+
+    def setUp(self):
+        self.payer = User.objects.create_user(
+            email="payer@paynion.test", username="payer", full_name="Payer", password="x"
+        )
+        self.receiver = User.objects.create_user(
+            email="receiver@paynion.test", username="receiver", full_name="Receiver", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.payer)
+        self.settlement = Settlement.objects.create(
+            group=self.group, payer=self.payer, receiver=self.receiver, amount=Decimal("250.00")
+        )
+
+    def hammer(self, action):
+        """
+        Run `action` from THREADS threads released at the same moment.
+        Returns: (successes, transition errors)
+        """
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                barrier.wait()
+                action()
+                outcome = "ok"
+            except SettlementTransitionError:
+                outcome = "conflict"
+            except Exception as exc:
+                outcome = exc
+            finally:
+                connection.close()
+
+            with lock:
+                outcomes.append(outcome)
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        self.assertEqual(errors, [])
+        return outcomes.count("ok"), outcomes.count("conflict")
+
+    def test_concurrent_mark_as_paid_has_one_winner(self):
+        ok, conflicts = self.hammer(
+            lambda: request_settlement_payment(self.settlement.id, self.payer, "UPI")
+        )
+
+        self.assertEqual((ok, conflicts), (1, self.THREADS - 1))
+        self.settlement.refresh_from_db()
+        self.assertEqual(self.settlement.status, "PAID_REQUESTED")
+
+    def test_concurrent_accept_writes_one_history_row(self):
+        request_settlement_payment(self.settlement.id, self.payer, "CASH")
+
+        ok, conflicts = self.hammer(
+            lambda: accept_settlement_payment(self.settlement.id, self.receiver)
+        )
+
+        self.assertEqual((ok, conflicts), (1, self.THREADS - 1))
+        self.settlement.refresh_from_db()
+        self.assertEqual(self.settlement.status, "SETTLED")
+        self.assertEqual(PaymentHistory.objects.filter(settlement=self.settlement).count(), 1)
+
+    def test_accept_and_reject_race_has_one_winner(self):
+        request_settlement_payment(self.settlement.id, self.payer, "UPI")
+        calls = iter([accept_settlement_payment, reject_settlement_payment] * self.THREADS)
+        calls_lock = threading.Lock()
+
+        def accept_or_reject():
+            with calls_lock:
+                call = next(calls)
+            call(self.settlement.id, self.receiver)
+
+        ok, conflicts = self.hammer(accept_or_reject)
+
+        # A reject reopens the settlement, so a later "accept" can't win
+        # (it needs PAID_REQUESTED) - at most one transition ever succeeds
+        self.assertEqual(ok, 1)
+        self.settlement.refresh_from_db()
+        history = PaymentHistory.objects.filter(settlement=self.settlement).count()
+        self.assertEqual(history, 1 if self.settlement.status == "SETTLED" else 0)
+
+    def test_only_the_receiver_can_accept(self):
+        request_settlement_payment(self.settlement.id, self.payer, "UPI")
+
+        with self.assertRaises(SettlementTransitionError):
+            accept_settlement_payment(self.settlement.id, self.payer)
+
+
+class BulkSettleTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email="admin@paynion.test", username="admin", full_name="Admin", password="x"
+        )
+        self.other = User.objects.create_user(
+            email="other@paynion.test", username="other", full_name="Other", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.admin)
+        self.settlements = [
+            Settlement.objects.create(
+                group=self.group, payer=self.other, receiver=self.admin, amount=Decimal(amount)
+            )
+            for amount in ("100.00", "40.00", "15.50")
+        ]
+
+    def test_settles_selected_in_one_go(self):
+        ids = [s.id for s in self.settlements[:2]]
+
+        with self.assertNumQueries(18):
+            # savepoint, lock, bulk update, bulk insert, checkpoint,
+            # one pairwise balance upsert (update + savepoint/insert/release),
+            # balance snapshot (lookup + 5 replay aggregates + insert), release
+            settled = bulk_settle(self.group, ids, "CASH")
+
+        self.assertEqual(settled, 2)
+        self.assertEqual(PaymentHistory.objects.count(), 2)
+        self.assertEqual(
+            Settlement.objects.filter(group=self.group, status="SETTLED").count(), 2
+        )
+        self.group.refresh_from_db()
+        self.assertIsNotNone(self.group.last_settled_at)
+
+    def test_repeat_does_not_duplicate_history(self):
+        ids = [s.id for s in self.settlements]
+
+        self.assertEqual(bulk_settle(self.group, ids), 3)
+        self.assertEqual(bulk_settle(self.group, ids), 0)
+        self.assertEqual(PaymentHistory.objects.count(), 3)
+
+    def test_only_admin_can_settle_all(self):
+        self.client.force_login(self.other)
+
+        self.client.post(
+            reverse("payments:settle_all", args=[self.group.id]),
+            {"settlement_ids": [s.id for s in self.settlements], "payment_mode": "CASH"},
+        )
+
+        self.assertFalse(PaymentHistory.objects.exists())
+
+
+class SettleUpPlanTests(TestCase):
+
+    def setUp(self):
+        self.me = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.trip = self.group("Trip")
+        self.flat = self.group("Flat")
+
+        # Trip: friend paid 200, split equally -> I owe 100
+        self.expense(self.trip, self.friend, "200.00")
+        # Flat: I paid 60, split equally -> friend owes me 30
+        self.expense(self.flat, self.me, "60.00")
+
+    def group(self, title):
+        group = Group.objects.create(title=title, created_by=self.me)
+        group.members.add(self.me, self.friend)
+        return group
+
+    def expense(self, group, paid_by, amount):
+        expense = Expense.objects.create(
+            group=group, amount=Decimal(amount), description="x", paid_by=paid_by
+        )
+        for user in (self.me, self.friend):
+            ExpenseSplit.objects.create(expense=expense, user=user, amount=Decimal(amount) / 2)
+
+    def test_nets_across_groups_in_constant_queries(self):
+        with self.assertNumQueries(4):
+            plan = calculate_user_settle_up(self.me)
+
+        self.assertEqual(len(plan["transfers"]), 1)
+        transfer = plan["transfers"][0]
+        self.assertEqual((transfer["from"], transfer["to"], transfer["amount"]), (self.me, self.friend, 70.0))
+
+        by_group = {row["group"].title: row["amount"] for row in plan["breakdown"][self.friend.id]}
+        self.assertEqual(by_group, {"Trip": -100.0, "Flat": 30.0})
+
+    def test_settled_groups_are_ignored(self):
+        self.trip.last_settled_at = timezone.now()
+        self.trip.save()
+
+        plan = calculate_user_settle_up(self.me)
+
+        transfer = plan["transfers"][0]
+        self.assertEqual((transfer["from"], transfer["amount"]), (self.friend, 30.0))
+
+    def test_api(self):
+        self.client.force_login(self.me)
+
+        data = self.client.get(reverse("payments:settle_up_api")).json()
+
+        self.assertEqual(data["transfers"][0]["amount"], 70.0)
+        self.assertEqual(len(data["transfers"][0]["groups"]), 2)
+
+        page = self.client.get(reverse("payments:settle_up"))
+        self.assertContains(page, "You pay <strong>Friend</strong>")
+
+    def test_matches_the_group_page_transfers(self):
+        a, b = (
+            User.objects.create_user(email=f"{name}@paynion.test", username=name, full_name=name, password="x")
+            for name in ("a", "b")
+        )
+        party = self.group("Party")
+        party.members.add(a, b)
+
+        # me +50, friend +30, a -40, b -40: the pairing depends on the order
+        dinner = Expense.objects.create(group=party, amount=Decimal("80.00"), description="x", paid_by=self.me)
+        cab = Expense.objects.create(group=party, amount=Decimal("30.00"), description="x", paid_by=self.friend)
+        for expense, user, amount in ((dinner, self.me, "30.00"), (dinner, a, "25.00"), (dinner, b, "25.00"),
+                                      (cab, a, "15.00"), (cab, b, "15.00")):
+            ExpenseSplit.objects.create(expense=expense, user=user, amount=Decimal(amount))
+
+        self.client.force_login(b)
+        self.client.get(reverse("groups:group_detail", args=[party.id]))
+        shown = {
+            (s.receiver_id, -s.amount)
+            for s in Settlement.objects.filter(group=party, payer=b)
+        }
+
+        self.assertEqual(len(shown), 2)
+
+        plan = calculate_user_settle_up(b)
+        planned = {
+            (pk, row["amount"])
+            for pk, rows in plan["breakdown"].items() for row in rows if row["group"] == party
+        }
+        self.assertEqual(planned, shown)
+
+
+class PairwiseBalanceTests(TestCase):
+
+    def setUp(self):
+        self.me = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.me)
+        self.group.members.add(self.me, self.friend)
+        self.client.force_login(self.me)
+
+    def add_expense(self, amount):
+        self.client.post(reverse("expenses:add_expense", args=[self.group.id]), {
+            "amount": amount,
+            "description": "Dinner",
+            "split_type": "equal",
+            "split_between": [self.me.id, self.friend.id],
+        })
+        return Expense.objects.latest("id")
+
+    def test_expense_writes_keep_balance_in_sync(self):
+        expense = self.add_expense("300.00")
+        self.assertEqual(friend_balances(self.me), {self.friend.id: Decimal("150.00")})
+
+        self.client.post(reverse("expenses:edit_expense", args=[expense.id]), {
+            "amount": "100.00",
+            "description": "Dinner",
+            "split_type": "equal",
+            "split_between": [self.me.id, self.friend.id],
+        })
+        self.assertEqual(friend_balances(self.me), {self.friend.id: Decimal("50.00")})
+        self.assertEqual(friend_balances(self.friend), {self.me.id: Decimal("-50.00")})
+
+        self.client.post(reverse("expenses:delete_expense", args=[expense.id]))
+        self.assertEqual(friend_balances(self.me), {})
+
+    def test_settlement_confirmation_reduces_debt(self):
+        self.add_expense("300.00")
+        settlement = Settlement.objects.create(
+            group=self.group, payer=self.friend, receiver=self.me, amount=Decimal("150.00")
+        )
+
+        bulk_settle(self.group, [settlement.id])
+
+        self.assertEqual(friend_balances(self.me), {})
+
+    def test_rebuild_matches_maintained_table(self):
+        self.add_expense("300.00")
+        self.add_expense("45.50")
+        maintained = friend_balances(self.me)
+
+        PairwiseBalance.objects.all().delete()
+        rebuild_pairwise_balances()
+
+        self.assertEqual(friend_balances(self.me), maintained)
+
+    def test_api_and_profile(self):
+        self.add_expense("300.00")
+
+        data = self.client.get(reverse("accounts:friend_balances_api"), {"friend": self.friend.id}).json()
+
+        self.assertEqual(data["balances"][0]["amount"], "150.00")
+        self.assertEqual(data["balances"][0]["direction"], "owes_you")
+        self.assertEqual(data["groups"], [{"group_id": self.group.id, "amount": "150.00"}])
+
+        profile = self.client.get(reverse("accounts:profile"))
+        self.assertContains(profile, "Who Owes Me Most")
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    SETTLEMENT_REMINDER_PENDING_DAYS=3,
+    SETTLEMENT_REMINDER_PAID_REQUESTED_DAYS=2,
+    SETTLEMENT_REMINDER_REPEAT_DAYS=7,
+)
+class OverdueReminderTests(TestCase):
+
+    def setUp(self):
+        self.payer = User.objects.create_user(
+            email="payer@paynion.test", username="payer", full_name="Payer", password="x"
+        )
+        self.receiver = User.objects.create_user(
+            email="receiver@paynion.test", username="receiver", full_name="Receiver", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.payer)
+
+    def settlement(self, days_old, status="PENDING", requested_days_ago=None):
+        settlement = Settlement.objects.create(
+            group=self.group, payer=self.payer, receiver=self.receiver,
+            amount=Decimal("10.00"), status=status,
+        )
+        if requested_days_ago is None and status == "PAID_REQUESTED":
+            requested_days_ago = days_old
+        Settlement.objects.filter(id=settlement.id).update(
+            created_at=timezone.now() - timedelta(days=days_old),
+            paid_requested_at=(
+                None if requested_days_ago is None
+                else timezone.now() - timedelta(days=requested_days_ago)
+            ),
+        )
+        return settlement
+
+    def test_one_digest_per_user_across_chunks(self):
+        for _ in range(5):
+            self.settlement(days_old=4)
+        self.settlement(days_old=1)                              # not overdue yet
+        self.settlement(days_old=3, status="PAID_REQUESTED")     # receiver must confirm
+
+        stats = send_overdue_reminders(chunk_size=2)
+
+        self.assertEqual(stats["settlements"], 6)
+        self.assertEqual(Notification.objects.filter(user=self.payer).count(), 5)
+        self.assertEqual(Notification.objects.filter(user=self.receiver).count(), 1)
+        self.assertEqual(stats["emails"], 2)
+
+        deliver_queued_emails()
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [self.payer.email, self.receiver.email])
+
+    def test_not_reminded_again_before_repeat_window(self):
+        self.settlement(days_old=4)
+
+        send_overdue_reminders()
+        stats = send_overdue_reminders()
+
+        self.assertEqual(stats["settlements"], 0)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_paid_requested_waits_from_the_request(self):
+        self.settlement(days_old=10, status="PAID_REQUESTED", requested_days_ago=1)
+
+        self.assertEqual(send_overdue_reminders()["settlements"], 0)
+
+    def test_viewing_the_group_keeps_the_reminder_state(self):
+        self.group.members.add(self.payer, self.receiver)
+        expense = Expense.objects.create(
+            group=self.group, paid_by=self.receiver, amount=Decimal("20.00"), description="Dinner"
+        )
+        for user in (self.payer, self.receiver):
+            ExpenseSplit.objects.create(expense=expense, user=user, amount=Decimal("10.00"))
+        self.settlement(days_old=4)
+
+        self.assertEqual(send_overdue_reminders()["settlements"], 1)
+
+        self.client.force_login(self.payer)
+        self.client.get(reverse("groups:group_detail", args=[self.group.id]))
+
+        self.assertEqual(send_overdue_reminders()["settlements"], 0)
+        self.assertEqual(Settlement.objects.filter(group=self.group).count(), 1)
+
+
+class UpiQrTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x"
+        )
+        self.client.force_login(self.user)
+
+    def qr(self, **params):
+        query = {"pa": "friend@upi", "pn": "Friend", "am": "150.00", **params}
+        return self.client.get(reverse("payments:upi_qr"), query)
+
+    def test_serves_cacheable_svg_and_png(self):
+        svg = self.qr()
+        self.assertEqual(svg.status_code, 200)
+        self.assertEqual(svg["Content-Type"], "image/svg+xml")
+        self.assertIn("immutable", svg["Cache-Control"])
+
+        png = self.qr(fmt="png")
+        self.assertEqual(png["Content-Type"], "image/png")
+        self.assertNotEqual(svg["ETag"], png["ETag"])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.qr()["ETag"]
+
+        response = self.client.get(
+            reverse("payments:upi_qr"), {"pa": "friend@upi", "pn": "Friend", "am": "150.00"},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_rejects_invalid_parameters(self):
+        for params in ({"am": "NaN"}, {"am": "Infinity"}, {"am": "-5"}, {"am": "0"},
+                       {"am": "abc"}, {"pa": ""}, {"fmt": "gif"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.qr(**params).status_code, 400)
+
+
+
+class PaymentIntentTests(TestCase):
+
+    def setUp(self):
+        self.me = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x", upi_id="me@upi"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.me)
+        self.group.members.add(self.me, self.friend)
+        self.client.force_login(self.me)
+        self.add_expense("300.00")
+        self.client.force_login(self.friend)
+
+    def add_expense(self, amount):
+        self.client.post(reverse("expenses:add_expense", args=[self.group.id]), {
+            "amount": amount,
+            "description": "Dinner",
+            "split_type": "equal",
+            "split_between": [self.me.id, self.friend.id],
+        })
+
+    def view_group(self):
+        self.client.get(reverse("groups:group_detail", args=[self.group.id]))
+        return Settlement.objects.get(group=self.group, status="PENDING")
+
+    def pay(self, settlement_id, amount="150.00"):
+        return self.client.post(reverse("payments:upi_pay"), {
+            "to_user_id": self.me.id, "settlement_id": settlement_id, "amount": amount,
+        })
+
+    def test_group_page_keeps_unchanged_settlements(self):
+        first = self.view_group()
+        second = self.view_group()
+
+        self.assertEqual((first.id, first.created_at), (second.id, second.created_at))
+        self.assertEqual(first.amount, Decimal("150.00"))
+
+    def test_stale_settlement_id_reuses_the_open_intent(self):
+        settlement = self.view_group()
+
+        self.assertEqual(self.pay(settlement.id + 1000).status_code, 200)
+        self.assertEqual(self.pay(settlement.id).status_code, 200)
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.settlement_id, settlement.id)
+
+    def test_open_intent_keeps_its_settlement_while_the_debt_is_unchanged(self):
+        settlement = self.view_group()
+        self.pay(settlement.id)
+
+        self.assertEqual(self.view_group().id, settlement.id)
+        self.assertEqual(Payment.objects.get().settlement_id, settlement.id)
+
+    def test_changed_debt_replaces_the_settlement_and_expires_its_intent(self):
+        old = self.view_group()
+        self.pay(old.id)
+
+        self.client.force_login(self.me)
+        self.add_expense("100.00")
+        self.client.force_login(self.friend)
+        current = self.view_group()
+
+        self.assertEqual(current.amount, Decimal("200.00"))
+        self.assertEqual(Payment.objects.get().status, "EXPIRED")
+
+        self.pay(current.id, "200.00")
+        self.assertEqual(Payment.objects.get(status="PENDING").settlement_id, current.id)
+
+    def test_rejects_invalid_amounts(self):
+        settlement = self.view_group()
+
+        for amount in ("NaN", "Infinity", "-5", "0", "abc"):
+            with self.subTest(amount=amount):
+                self.assertEqual(self.pay(settlement.id, amount).status_code, 400)
+
+        self.assertFalse(Payment.objects.exists())
+
+
+class ExpirePaymentIntentTests(TestCase):
+
+    def setUp(self):
+        self.payer = User.objects.create_user(
+            email="payer@paynion.test", username="payer", full_name="Payer", password="x"
+        )
+        self.receiver = User.objects.create_user(
+            email="receiver@paynion.test", username="receiver", full_name="Receiver",
+            password="x", upi_id="receiver@upi"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.payer)
+        self.settlement = Settlement.objects.create(
+            group=self.group, payer=self.payer, receiver=self.receiver, amount=Decimal("250.00")
+        )
+
+    def intent(self, hours_old):
+        payment = Payment.objects.create(
+            payer=self.payer, receiver=self.receiver, amount=Decimal("250.00"),
+            upi_id="receiver@upi", settlement=self.settlement
+        )
+        Payment.objects.filter(id=payment.id).update(created_at=timezone.now() - timedelta(hours=hours_old))
+        return payment
+
+    def statuses(self):
+        return list(Payment.objects.order_by("id").values_list("status", flat=True))
+
+    def test_only_intents_past_the_ttl_expire(self):
+        self.intent(hours_old=30)
+        self.intent(hours_old=25)
+        self.intent(hours_old=23)
+        done = self.intent(hours_old=30)
+        Payment.objects.filter(id=done.id).update(status="SUCCESS")
+
+        expired = expire_stale_payment_intents(timezone.now() - timedelta(hours=24), batch_size=1)
+
+        self.assertEqual(expired, 2)
+        self.assertEqual(self.statuses(), ["EXPIRED", "EXPIRED", "PENDING", "SUCCESS"])
+
+    def test_command_leaves_the_settlement_open_and_linked(self):
+        stale = self.intent(hours_old=48)
+        out = io.StringIO()
+
+        call_command("expire_payment_intents", "--older-than-hours", "24", stdout=out)
+
+        self.assertIn("Expired 1", out.getvalue())
+        stale.refresh_from_db()
+        self.settlement.refresh_from_db()
+        self.assertEqual((stale.status, stale.settlement_id), ("EXPIRED", self.settlement.id))
+        self.assertEqual(self.settlement.status, "PENDING")
+
+        # A fresh Pay Now for the same debt opens a new intent
+        self.client.force_login(self.payer)
+        self.client.post(reverse("payments:upi_pay"), {
+            "to_user_id": self.receiver.id, "settlement_id": self.settlement.id, "amount": "250.00",
+        })
+        self.assertEqual(self.statuses(), ["EXPIRED", "PENDING"])
+
+
+class ReconciliationTests(TestCase):
+
+    def setUp(self):
+        self.me = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x", upi_id="Me@UPI"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.me)
+        self.opened_at = timezone.now() - timedelta(days=1)
+
+    def settlement(self, amount, opened_at=None):
+        settlement = Settlement.objects.create(
+            group=self.group, payer=self.friend, receiver=self.me, amount=Decimal(amount)
+        )
+        Settlement.objects.filter(id=settlement.id).update(created_at=opened_at or self.opened_at)
+        return settlement
+
+    def reconcile(self, rows, **kwargs):
+        lines = ["date,amount,upi_id,reference"]
+        lines += [",".join(row) for row in rows]
+        return reconcile_statement(io.BytesIO("\n".join(lines).encode()), **kwargs)
+
+    def credit(self, amount, reference="", upi_id="me@upi", at=None):
+        at = at or self.opened_at + timedelta(hours=2)
+        return (at.isoformat(), amount, upi_id, reference)
+
+    def status(self, settlement):
+        settlement.refresh_from_db()
+        return settlement.status
+
+    def test_matches_on_amount_and_upi_id(self):
+        dinner = self.settlement("150.00")
+        taxi = self.settlement("40.00")
+
+        stats = self.reconcile([
+            self.credit("150.00", "UTR1"),
+            self.credit("40.00", "UTR2", upi_id="someone@upi"),
+            self.credit("41.00", "UTR3"),
+        ])
+
+        self.assertEqual(stats["matched_settlements"], 1)
+        self.assertEqual(stats["unmatched"], 2)
+        self.assertEqual(self.status(dinner), "SETTLED")
+        self.assertEqual(dinner.transaction_ref, "UTR1")
+        self.assertEqual(self.status(taxi), "PENDING")
+        self.assertEqual(PaymentHistory.objects.count(), 1)
+
+    def test_same_reference_is_applied_once(self):
+        first = self.settlement("150.00")
+        second = self.settlement("150.00")
+
+        stats = self.reconcile([self.credit("150.00", "UTR1"), self.credit("150.00", "UTR1")])
+        self.assertEqual((stats["matched_settlements"], stats["already_applied"]), (1, 1))
+
+        stats = self.reconcile([self.credit("150.00", "UTR1")])
+        self.assertEqual((stats["matched_settlements"], stats["already_applied"]), (0, 1))
+        self.assertEqual([self.status(first), self.status(second)], ["SETTLED", "PENDING"])
+
+    def test_credit_must_land_inside_the_window(self):
+        settlement = self.settlement("150.00")
+
+        stats = self.reconcile([
+            self.credit("150.00", "EARLY", at=self.opened_at - timedelta(hours=1)),
+            self.credit("150.00", "LATE", at=self.opened_at + timedelta(days=4)),
+        ], window=timedelta(days=3))
+
+        self.assertEqual(stats["unmatched"], 2)
+        self.assertEqual(self.status(settlement), "PENDING")
+
+    def test_chunks_are_written_separately_and_deduped_across_chunks(self):
+        settlements = [self.settlement("150.00") for _ in range(3)]
+
+        stats = self.reconcile([
+            self.credit("150.00", "UTR1"),
+            self.credit("150.00", "UTR2"),
+            self.credit("150.00", "UTR1"),
+            self.credit("150.00", "UTR3"),
+        ], chunk_size=1)
+
+        self.assertEqual((stats["matched_settlements"], stats["already_applied"]), (3, 1))
+        self.assertEqual({self.status(s) for s in settlements}, {"SETTLED"})
+
+    def test_pay_now_intent_and_its_settlement_are_one_record(self):
+        linked = self.settlement("150.00")
+        payment = Payment.objects.create(
+            payer=self.friend, receiver=self.me, amount=Decimal("150.00"), upi_id="me@upi", settlement=linked
+        )
+        Payment.objects.filter(id=payment.id).update(created_at=self.opened_at + timedelta(hours=1))
+        other = self.settlement("150.00", opened_at=self.opened_at + timedelta(minutes=90))
+
+        stats = self.reconcile([self.credit("150.00", "UTR1")])
+
+        self.assertEqual((stats["matched_payments"], stats["matched_settlements"]), (1, 1))
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.transaction_ref), ("SUCCESS", "UTR1"))
+        self.assertEqual(self.status(linked), "SETTLED")
+        self.assertEqual(linked.transaction_ref, "UTR1")
+        self.assertEqual(self.status(other), "PENDING")
+        self.assertEqual(PaymentHistory.objects.get().settlement, linked)
+
+    def test_group_page_does_not_reset_the_window(self):
+        self.group.members.add(self.me, self.friend)
+        expense = Expense.objects.create(
+            group=self.group, paid_by=self.me, amount=Decimal("300.00"), description="Dinner"
+        )
+        for user in (self.me, self.friend):
+            ExpenseSplit.objects.create(expense=expense, user=user, amount=Decimal("150.00"))
+        settlement = self.settlement("150.00", opened_at=timezone.now() - timedelta(days=2))
+
+        self.client.force_login(self.friend)
+        self.client.get(reverse("groups:group_detail", args=[self.group.id]))
+
+        stats = self.reconcile(
+            [self.credit("150.00", "UTR1", at=timezone.now())], window=timedelta(days=2, hours=1)
+        )
+        self.assertEqual(stats["matched_settlements"], 1)
+        self.assertEqual(self.status(settlement), "SETTLED")
+
+    def test_command_rejects_non_utf8_statement(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as f:
+            f.write("date,amount,upi_id\n2026-01-01,150.00,caf\xe9@upi\n".encode("latin-1"))
+        self.addCleanup(os.remove, f.name)
+
+        with self.assertRaisesMessage(CommandError, "not a UTF-8 CSV"):
+            call_command("reconcile_statement", f.name, stdout=io.StringIO())
+
+
+class PaymentHistoryPageTests(TestCase):
+
+    def setUp(self):
+        self.me = User.objects.create_user(
+            email="me@paynion.test", username="me", full_name="Me", password="x"
+        )
+        self.friend = User.objects.create_user(
+            email="friend@paynion.test", username="friend", full_name="Friend", password="x"
+        )
+        self.stranger = User.objects.create_user(
+            email="stranger@paynion.test", username="stranger", full_name="Stranger", password="x"
+        )
+        self.group = Group.objects.create(title="Trip", created_by=self.me)
+        self.confirmed_at = timezone.now() - timedelta(days=1)
+        self.client.force_login(self.me)
+
+    def history(self, payer, receiver, amount="10.00", confirmed_at=None, status="SETTLED"):
+        settlement = Settlement.objects.create(
+            group=self.group, payer=payer, receiver=receiver, amount=Decimal(amount), status=status
+        )
+        row = PaymentHistory.objects.create(
+            settlement=settlement, paid_by=payer, received_by=receiver,
+            amount=settlement.amount, requested_at=self.confirmed_at,
+        )
+        PaymentHistory.objects.filter(id=row.id).update(confirmed_at=confirmed_at or self.confirmed_at)
+        row.refresh_from_db()
+        return row
+
+    def page(self, cursor=None):
+        params = {"cursor": cursor} if cursor is not None else {}
+        response = self.client.get(reverse("payments:payment_history"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_pages_walk_every_row_once_across_equal_timestamps(self):
+        # Half the rows share one confirmed_at, straddling the page boundary
+        rows = [
+            self.history(self.friend, self.me, confirmed_at=self.confirmed_at + timedelta(minutes=i))
+            for i in range(HISTORY_PAGE_SIZE // 2)
+        ]
+        rows += [self.history(self.me, self.friend) for _ in range(HISTORY_PAGE_SIZE // 2 + 5)]
+
+        first = self.page()
+        second = self.page(first["next_cursor"])
+
+        self.assertEqual(len(first["history"]), HISTORY_PAGE_SIZE)
+        self.assertEqual(len(second["history"]), 5)
+        self.assertIsNone(second["next_cursor"])
+        self.assertEqual((first["is_first_page"], second["is_first_page"]), (True, False))
+
+        shown = first["history"] + second["history"]
+        expected = sorted(rows, key=lambda row: (row.confirmed_at, row.id), reverse=True)
+        self.assertEqual([row.id for row in shown], [row.id for row in expected])
+
+    def test_exactly_one_full_page_has_no_next_cursor(self):
+        for _ in range(HISTORY_PAGE_SIZE):
+            self.history(self.friend, self.me)
+
+        context = self.page()
+        self.assertEqual(len(context["history"]), HISTORY_PAGE_SIZE)
+        self.assertIsNone(context["next_cursor"])
+
+    def test_malformed_cursor_falls_back_to_the_first_page(self):
+        rows = [self.history(self.friend, self.me) for _ in range(3)]
+
+        def b64(raw):
+            return base64.urlsafe_b64encode(raw).decode()
+
+        for cursor in (
+            "not-a-cursor",
+            "!!!",
+            b64(b"no separator"),
+            b64(b"2026-01-01T00:00:00+00:00|abc"),
+            b64(b"2026-13-45T00:00:00+00:00|1"),
+            b64(b"\xff\xfe|1"),
+        ):
+            with self.subTest(cursor=cursor):
+                context = self.page(cursor)
+                self.assertEqual({row.id for row in context["history"]}, {row.id for row in rows})
+                self.assertIsNone(context["next_cursor"])
+
+    def test_tampered_cursor_cannot_reach_other_users_rows(self):
+        mine = self.history(self.friend, self.me, confirmed_at=self.confirmed_at - timedelta(hours=1))
+        theirs = self.history(self.stranger, self.friend)
+        self.history(self.stranger, self.friend, confirmed_at=self.confirmed_at - timedelta(hours=2))
+
+        context = self.page(encode_cursor(theirs.confirmed_at, theirs.id))
+        self.assertEqual([row.id for row in context["history"]], [mine.id])
+
+    def test_totals_and_pending_count_are_scoped_to_the_user(self):
+        self.history(self.friend, self.me, "150.00")
+        self.history(self.friend, self.me, "25.50")
+        self.history(self.me, self.friend, "40.00")
+        self.history(self.stranger, self.friend, "999.00")
+
+        Settlement.objects.create(group=self.group, payer=self.me, receiver=self.friend, amount=Decimal("5.00"))
+        Settlement.objects.create(group=self.group, payer=self.friend, receiver=self.me, amount=Decimal("6.00"))
+        Settlement.objects.create(
+            group=self.group, payer=self.friend, receiver=self.me, amount=Decimal("7.00"), status="PAID_REQUESTED"
+        )
+        Settlement.objects.create(group=self.group, payer=self.stranger, receiver=self.friend, amount=Decimal("8.00"))
+
+        context = self.page()
+        self.assertEqual(context["total_inflow"], Decimal("175.50"))
+        self.assertEqual(context["total_outflow"], Decimal("40.00"))
+        self.assertEqual(context["pending_count"], 2)
+
+    def test_totals_are_zero_without_history(self):
+        context = self.page()
+        self.assertEqual((context["total_inflow"], context["total_outflow"], context["pending_count"]), (0, 0, 0))
@@ -5,8 +5,14 @@ app_name = "payments"
 
 urlpatterns = [
     path("upi-pay/", views.upi_pay, name="upi_pay"),
+    path("upi-qr/", views.upi_qr, name="upi_qr"),
     path("settlement/<int:settlement_id>/paid/", views.mark_as_paid, name="mark_as_paid"),
     path("settlement/<int:settlement_id>/accept/", views.accept_payment, name="accept_payment"),
     path("settlement/<int:settlement_id>/reject/", views.reject_payment, name="reject_payment"),
+    path("group/<int:group_id>/settle-all/", views.settle_all, name="settle_all"),
+    path("settle-up/", views.settle_up, name="settle_up"),
+    path("api/settle-up/", views.settle_up_api, name="settle_up_api"),
     path("history/", views.payment_history, name="payment_history"),
+    path("reconcile/", views.reconcile_upload, name="reconcile_upload"),
+    path("webhook/razorpay/", views.payment_webhook, name="payment_webhook"),
 ]
\ No newline at end of file
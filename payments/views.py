@@ -1,20 +1,97 @@
 from django.contrib import messages
-from django.http import HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect, get_object_or_404, render
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Sum, Q
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.csrf import csrf_exempt
 from .models import Settlement, PaymentHistory
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from urllib.parse import urlencode, quote
+import hashlib
+import json
 import qrcode
+import qrcode.image.svg
 import io
-import base64
 
 
-from .models import Payment
+from groups.models import Group
+from .services import (
+    get_or_create_payment_intent,
+    request_settlement_payment,
+    accept_settlement_payment,
+    reject_settlement_payment,
+    bulk_settle,
+    SettlementTransitionError,
+)
+from .reconciliation import reconcile_statement
+from .webhooks import verify_webhook_signature, record_webhook_event
+from datetime import timedelta
+from django.conf import settings
+from paynion.pagination import keyset_page
+from expenses.utils import calculate_user_settle_up
 
 User = get_user_model()
 
+HISTORY_PAGE_SIZE = 20
+
+# QR images never change for the same link, so browsers may keep them for a year
+QR_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def build_upi_params(upi_id, name, amount):
+    return {"pa": upi_id, "pn": name, "am": amount, "cu": "INR"}
+
+
+def build_upi_link(params):
+    return "upi://pay?" + urlencode(params, quote_via=quote)
+
+
+@lru_cache(maxsize=512)
+def render_upi_qr(upi_link, fmt):
+    """
+    Render (and memoise) the QR code for a UPI link as SVG or PNG bytes.
+    """
+    buffer = io.BytesIO()
+
+    if fmt == "svg":
+        qrcode.make(upi_link, image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qrcode.make(upi_link).save(buffer, format="PNG")
+
+    return buffer.getvalue()
+
+
+def _upi_qr_params(request):
+    """
+    Read and validate the UPI link parameters from the query string.
+    Returns (params, fmt) or (None, None) if they are invalid.
+    """
+    upi_id = request.GET.get("pa", "").strip()
+    name = request.GET.get("pn", "").strip()
+    fmt = request.GET.get("fmt", "svg")
+
+    try:
+        amount = Decimal(request.GET.get("am", ""))
+    except InvalidOperation:
+        return None, None
+
+    # NaN / Infinity parse fine but can't be compared or paid
+    if not upi_id or not amount.is_finite() or amount <= 0 or fmt not in ("svg", "png"):
+        return None, None
+
+    return build_upi_params(upi_id, name, str(amount)), fmt
+
+
+def _upi_qr_etag(request):
+    params, fmt = _upi_qr_params(request)
+    if params is None:
+        return None
+    return hashlib.md5(f"{build_upi_link(params)}|{fmt}".encode()).hexdigest()
+
 
 @login_required
 def upi_pay(request):
@@ -22,42 +99,69 @@ def upi_pay(request):
         return HttpResponseBadRequest("Invalid request")
 
     to_user_id = request.POST.get("to_user_id")
-    amount = request.POST.get("amount")
+    settlement_id = request.POST.get("settlement_id")
+    client_token = request.POST.get("client_token") or None
+
+    try:
+        amount = Decimal(request.POST.get("amount", "")).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return HttpResponseBadRequest("Invalid amount")
+    if not amount.is_finite() or amount <= 0:
+        return HttpResponseBadRequest("Invalid amount")
 
     to_user = get_object_or_404(User, id=to_user_id)
 
     if not to_user.upi_id:
         return HttpResponseBadRequest("Receiver UPI not set")
 
-    payment = Payment.objects.create(
+    # A page left open can carry the id of a row the group page has since
+    # replaced - fall back to the payer's open settlement for the same debt
+    open_settlements = Settlement.objects.filter(
+        payer=request.user, receiver=to_user, status="PENDING"
+    )
+    settlement = None
+    if settlement_id and settlement_id.isdigit():
+        settlement = open_settlements.filter(id=settlement_id).first()
+    if settlement is None:
+        settlement = open_settlements.filter(amount=amount).order_by("-id").first()
+
+    # Refreshes and double-clicks reuse the open intent (and its cached QR)
+    payment, _ = get_or_create_payment_intent(
         payer=request.user,
         receiver=to_user,
         amount=amount,
-        upi_id=to_user.upi_id,
-        status="PENDING"
-    )
-
-    upi_link = (
-        f"upi://pay?"
-        f"pa={to_user.upi_id}&"
-        f"pn={to_user.full_name}&"
-        f"am={amount}&"
-        f"cu=INR"
+        settlement=settlement,
+        client_token=client_token,
     )
 
-    # QR Code for desktop
-    qr = qrcode.make(upi_link)
-    buffer = io.BytesIO()
-    qr.save(buffer, format="PNG")
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+    upi_params = build_upi_params(to_user.upi_id, to_user.full_name, amount)
+    upi_link = build_upi_link(upi_params)
 
+    # QR Code for desktop (served and cached separately by upi_qr)
     return render(request, "payments/upi_redirect.html", {
         "upi_link": upi_link,
-        "qr_code": qr_base64,
+        "qr_query": urlencode(upi_params),
         "payment": payment
     })
 
 
+@login_required
+@condition(etag_func=_upi_qr_etag)
+def upi_qr(request):
+    """
+    QR image for a UPI link, keyed by its parameters (?pa=&pn=&am=&fmt=svg|png).
+    """
+    params, fmt = _upi_qr_params(request)
+
+    if params is None:
+        return HttpResponseBadRequest("Invalid UPI parameters")
+
+    content_type = "image/svg+xml" if fmt == "svg" else "image/png"
+    response = HttpResponse(render_upi_qr(build_upi_link(params), fmt), content_type=content_type)
+    patch_cache_control(response, private=True, max_age=QR_CACHE_MAX_AGE, immutable=True)
+    return response
+
+
 
 
 
@@ -74,15 +178,16 @@ def mark_as_paid(request, settlement_id):
 
     if payment_mode not in ["UPI", "CASH"]:
         messages.error(request, "Please select payment mode.")
-        return redirect("groups:group_detail", group_id=settlement.group.id)
-    
-    settlement.payment_mode = payment_mode
-    settlement.status = "PAID_REQUESTED"
-    settlement.paid_requested_at = timezone.now()
-    settlement.save()
+        return redirect("groups:group_detail", group_id=settlement.group_id)
+
+    try:
+        request_settlement_payment(settlement.id, request.user, payment_mode)
+    except SettlementTransitionError:
+        messages.error(request, "This settlement is no longer pending.")
+        return redirect("groups:group_detail", group_id=settlement.group_id)
 
     messages.success(request, "Payment request sent to receiver.")
-    return redirect("groups:group_detail", group_id=settlement.group.id)
+    return redirect("groups:group_detail", group_id=settlement.group_id)
 
 
 
@@ -93,26 +198,16 @@ def accept_payment(request, settlement_id):
 
     if request.user != settlement.receiver:
         messages.error(request, "You are not allowed.")
-        return redirect("dashboard")
-
-    settlement.status = "SETTLED"
-    settlement.settled_at = timezone.now()
-    settlement.save()
-
-    PaymentHistory.objects.create(
-        settlement=settlement,
-        paid_by=settlement.payer,
-        received_by=settlement.receiver,
-        amount=settlement.amount,
-        payment_mode=settlement.payment_mode,
-        requested_at=settlement.paid_requested_at
-    )
+        return redirect("accounts:dashboard")
 
-    settlement.group.last_settled_at = settlement.settled_at
-    settlement.group.save()
+    try:
+        accept_settlement_payment(settlement.id, request.user)
+    except SettlementTransitionError:
+        messages.error(request, "This payment is no longer awaiting confirmation.")
+        return redirect("groups:group_detail", group_id=settlement.group_id)
 
     messages.success(request, "Payment confirmed successfully.")
-    return redirect("groups:group_detail", group_id=settlement.group.id)
+    return redirect("groups:group_detail", group_id=settlement.group_id)
 
 
 
@@ -124,46 +219,193 @@ def reject_payment(request, settlement_id):
 
     if request.user != settlement.receiver:
         messages.error(request, "You are not allowed.")
-        return redirect("dashboard")
+        return redirect("accounts:dashboard")
 
-    settlement.status = "PENDING"
-    settlement.paid_requested_at = None
-    settlement.save()
+    try:
+        reject_settlement_payment(settlement.id, request.user)
+    except SettlementTransitionError:
+        messages.error(request, "This payment is no longer awaiting confirmation.")
+        return redirect("groups:group_detail", group_id=settlement.group_id)
 
     messages.info(request, "Payment rejected. Settlement reopened.")
-    return redirect("groups:group_detail", group_id=settlement.group.id)
+    return redirect("groups:group_detail", group_id=settlement.group_id)
+
+
+
+
+@login_required
+@require_POST
+def settle_all(request, group_id):
+    group = get_object_or_404(Group, id=group_id)
+
+    if request.user != group.created_by:
+        messages.error(request, "Only the group admin can settle all payments.")
+        return redirect("groups:group_detail", group_id=group.id)
+
+    payment_mode = request.POST.get("payment_mode", "CASH")
+    if payment_mode not in ["UPI", "CASH"]:
+        messages.error(request, "Please select payment mode.")
+        return redirect("groups:group_detail", group_id=group.id)
+
+    settlement_ids = [
+        int(value) for value in request.POST.getlist("settlement_ids") if value.isdigit()
+    ]
+    if not settlement_ids:
+        messages.error(request, "Select at least one settlement.")
+        return redirect("groups:group_detail", group_id=group.id)
+
+    settled = bulk_settle(group, settlement_ids, payment_mode, actor=request.user)
+
+    if settled:
+        messages.success(request, f"{settled} settlement(s) marked as settled.")
+    else:
+        messages.info(request, "Those settlements were already settled.")
+    return redirect("groups:group_detail", group_id=group.id)
+
+
+
+
+@login_required
+def settle_up(request):
+    plan = calculate_user_settle_up(request.user)
+
+    rows = []
+    for transfer in plan["transfers"]:
+        counterparty = transfer["to"] if transfer["from"] == request.user else transfer["from"]
+        rows.append({
+            "transfer": transfer,
+            "counterparty": counterparty,
+            "you_pay": transfer["from"] == request.user,
+            "groups": plan["breakdown"][counterparty.id],
+        })
+
+    return render(request, "payments/settle_up.html", {
+        "rows": rows,
+        "total_to_pay": sum(row["transfer"]["amount"] for row in rows if row["you_pay"]),
+        "total_to_receive": sum(row["transfer"]["amount"] for row in rows if not row["you_pay"]),
+    })
+
+
+@login_required
+def settle_up_api(request):
+    plan = calculate_user_settle_up(request.user)
+
+    def person(user):
+        return {"id": user.id, "full_name": user.full_name, "upi_id": user.upi_id}
+
+    transfers = []
+    for transfer in plan["transfers"]:
+        counterparty = transfer["to"] if transfer["from"] == request.user else transfer["from"]
+        transfers.append({
+            "from": person(transfer["from"]),
+            "to": person(transfer["to"]),
+            "amount": float(transfer["amount"]),
+            "groups": [
+                {"id": row["group"].id, "title": row["group"].title, "amount": float(row["amount"])}
+                for row in plan["breakdown"][counterparty.id]
+            ],
+        })
+
+    return JsonResponse({"transfers": transfers})
 
 
 
 
 @login_required
 def payment_history(request):
-    history = PaymentHistory.objects.filter(
-        paid_by=request.user
-    ) | PaymentHistory.objects.filter(
-        received_by=request.user
-    )
+    user = request.user
+    mine = Q(paid_by=user) | Q(received_by=user)
 
-    history = history.select_related(
+    history = PaymentHistory.objects.filter(mine).select_related(
         "paid_by", "received_by", "settlement", "settlement__group"
-    ).order_by("-confirmed_at")
+    )
 
-    # Calculate totals for the summary cards
-    total_inflow = PaymentHistory.objects.filter(
-        received_by=request.user
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    # Keyset pagination: newest first, page cost doesn't grow with history
+    page, next_cursor = keyset_page(
+        history, request.GET.get("cursor"), HISTORY_PAGE_SIZE, field="confirmed_at"
+    )
 
-    total_outflow = PaymentHistory.objects.filter(
-        paid_by=request.user
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    # Calculate totals for the summary cards (one conditional aggregate)
+    totals = PaymentHistory.objects.filter(mine).aggregate(
+        total_inflow=Sum("amount", filter=Q(received_by=user)),
+        total_outflow=Sum("amount", filter=Q(paid_by=user)),
+    )
 
     pending_count = Settlement.objects.filter(
+        Q(payer=user) | Q(receiver=user),
         status="PENDING"
     ).count()
 
     return render(request, "payments/payment_history.html", {
-        "history": history,
-        "total_inflow": total_inflow,
-        "total_outflow": total_outflow,
+        "history": page,
+        "next_cursor": next_cursor,
+        "is_first_page": not request.GET.get("cursor"),
+        "total_inflow": totals["total_inflow"] or 0,
+        "total_outflow": totals["total_outflow"] or 0,
         "pending_count": pending_count
     })
+
+
+
+
+@login_required
+def reconcile_upload(request):
+    """
+    Upload your bank / UPI statement CSV to auto-confirm payments made TO you.
+    """
+    if request.method == "POST":
+        statement = request.FILES.get("statement")
+
+        if not statement:
+            messages.error(request, "Please choose a statement CSV.")
+            return redirect("payments:reconcile_upload")
+
+        try:
+            stats = reconcile_statement(
+                statement.file,
+                receiver=request.user,
+                window=timedelta(days=settings.RECONCILIATION_WINDOW_DAYS),
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            messages.error(request, f"Could not read statement: {e}")
+            return redirect("payments:reconcile_upload")
+
+        messages.success(
+            request,
+            f"Statement processed: {stats['matched_payments'] + stats['matched_settlements']} "
+            f"payments confirmed, {stats['unmatched']} rows unmatched."
+        )
+        return redirect("payments:payment_history")
+
+    return render(request, "payments/reconcile.html")
+
+
+
+
+@csrf_exempt
+@require_POST
+def payment_webhook(request):
+    """
+    Razorpay status callback. Only verifies and stores the event; the
+    process_payment_webhooks worker applies it, so this answers in ms.
+    """
+    if not verify_webhook_signature(
+        request.body,
+        request.headers.get("X-Razorpay-Signature", ""),
+        settings.RAZORPAY_WEBHOOK_SECRET,
+    ):
+        return HttpResponseBadRequest("Invalid signature")
+
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid payload")
+
+    event_id = request.headers.get("X-Razorpay-Event-Id") or payload.get("id")
+    if not event_id:
+        return HttpResponseBadRequest("Missing event id")
+
+    created = record_webhook_event(event_id, payload)
+
+    # Duplicates still get a 200 so the gateway stops retrying
+    return JsonResponse({"status": "ok" if created else "duplicate"})
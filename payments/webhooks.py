@@ -0,0 +1,157 @@
+"""
+Payment gateway (Razorpay) webhook handling.
+
+The HTTP view only verifies the signature and stores the raw event
+(PaymentWebhookEvent, unique per event_id) so it can answer in a few ms.
+process_webhook_events() - run by the process_payment_webhooks worker -
+applies the stored events to Payment / Settlement afterwards.
+
+Gateway payments are linked to ours through the order/payment `notes`:
+    {"payment_id": <Payment.id>, "settlement_id": <Settlement.id>}
+"""
+
+import hashlib
+import hmac
+import logging
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Payment, PaymentWebhookEvent
+from .services import settle_from_gateway
+
+logger = logging.getLogger(__name__)
+
+SUCCESS_EVENTS = ("payment.captured", "order.paid")
+FAILURE_EVENTS = ("payment.failed",)
+
+
+def sign_webhook_body(body, secret):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_webhook_signature(body, signature, secret):
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign_webhook_body(body, secret), signature)
+
+
+def record_webhook_event(event_id, payload):
+    """
+    Store the event unless we already have it. Returns True if new.
+    """
+    _, created = PaymentWebhookEvent.objects.get_or_create(
+        event_id=event_id,
+        defaults={"event_type": payload.get("event", ""), "payload": payload},
+    )
+    return created
+
+
+def _payment_entity(payload):
+    return (payload.get("payload") or {}).get("payment", {}).get("entity") or {}
+
+
+def _captured_amount(entity):
+    # Gateway amounts are in paise
+    try:
+        return Decimal(entity["amount"]) / 100
+    except (KeyError, TypeError, InvalidOperation):
+        return None
+
+
+def apply_webhook_event(event):
+    """
+    Apply one event. Returns the final status (PROCESSED / IGNORED);
+    raises ValueError when the event can't be applied.
+
+    Captured money is applied only through our own Payment row (notes
+    naming just a settlement are rejected); its settlement is settled only
+    when the captured amount covers it exactly.
+    """
+    entity = _payment_entity(event.payload)
+    notes = entity.get("notes") or {}
+    gateway_ref = entity.get("id")
+
+    if event.event_type not in SUCCESS_EVENTS + FAILURE_EVENTS:
+        return "IGNORED"
+
+    payment = None
+    if notes.get("payment_id"):
+        payment = Payment.objects.select_related("settlement").filter(id=notes["payment_id"]).first()
+        if payment is None:
+            raise ValueError(f"Unknown payment {notes['payment_id']}")
+
+    if event.event_type in FAILURE_EVENTS:
+        if payment is not None:
+            Payment.objects.filter(id=payment.id, status="PENDING").update(
+                status="FAILED", transaction_ref=gateway_ref
+            )
+        return "PROCESSED"
+
+    # Money we can't tie to one of our own payments is never applied
+    if payment is None:
+        raise ValueError("Captured event has no payment_id")
+
+    amount = _captured_amount(entity)
+    if amount != payment.amount:
+        raise ValueError(f"Amount mismatch for payment {payment.id}")
+    if notes.get("settlement_id") and str(notes["settlement_id"]) != str(payment.settlement_id):
+        raise ValueError(f"Settlement {notes['settlement_id']} is not linked to payment {payment.id}")
+
+    settlement = payment.settlement
+    if settlement is not None and amount != settlement.amount:
+        raise ValueError(f"Amount mismatch for settlement {settlement.id}")
+
+    Payment.objects.filter(id=payment.id).exclude(status="SUCCESS").update(
+        status="SUCCESS", transaction_ref=gateway_ref
+    )
+
+    if settlement is not None:
+        settle_from_gateway(settlement.id, transaction_ref=gateway_ref)
+
+    return "PROCESSED"
+
+
+def process_webhook_events(batch_size=100):
+    """
+    Apply up to batch_size RECEIVED events, oldest first.
+    Safe to run from several workers: claimed rows are skipped by the others.
+
+    Returns: number of events handled
+    """
+    handled = 0
+    now = timezone.now()
+
+    with transaction.atomic():
+        events = list(
+            PaymentWebhookEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(status="RECEIVED")
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by("id")[:batch_size]
+        )
+
+        for event in events:
+            event.attempts += 1
+
+            try:
+                with transaction.atomic():
+                    event.status = apply_webhook_event(event)
+                event.processed_at = timezone.now()
+                event.last_error = None
+            except Exception as e:
+                logger.warning("Webhook event %s failed: %s", event.event_id, e)
+                event.last_error = str(e)
+                # Back off 2, 4, 8... seconds before the next try
+                event.next_attempt_at = now + timedelta(seconds=2 ** event.attempts)
+                if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                    event.status = "FAILED"
+
+            event.save(update_fields=["status", "attempts", "last_error", "next_attempt_at", "processed_at"])
+            handled += 1
+
+    return handled
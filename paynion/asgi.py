@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paynion.settings')
 
 application = get_asgi_application()
+
+# Load the OCR engine once per worker instead of on the first bill scan
+from expenses.ocr_backends import warm_up_ocr_backend
+
+warm_up_ocr_backend()
@@ -0,0 +1,61 @@
+"""
+Keyset ("cursor") pagination shared by the list views and JSON feeds.
+
+Pages are ordered newest first by (<field>, id) and the cursor remembers
+the last row shown, so fetching page N costs the same as page 1 instead
+of growing with OFFSET.
+"""
+
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(value, pk):
+    raw = f"{value.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns (datetime, pk) or None if the cursor is missing or malformed.
+    """
+    if not cursor:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        value, pk = raw.rsplit("|", 1)
+        value = parse_datetime(value)
+        return (value, int(pk)) if value else None
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor, page_size, field="created_at"):
+    """
+    Return one page of `queryset` ordered by -field, -id.
+
+    Returns: (items, next_cursor) - next_cursor is None on the last page
+    """
+    queryset = queryset.order_by(f"-{field}", "-id")
+
+    position = decode_cursor(cursor)
+    if position:
+        value, pk = position
+        queryset = queryset.filter(
+            Q(**{f"{field}__lt": value}) | Q(**{field: value, "id__lt": pk})
+        )
+
+    # One extra row tells us whether there is a next page, without a COUNT
+    items = list(queryset[:page_size + 1])
+    has_more = len(items) > page_size
+    items = items[:page_size]
+
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+
+    return items, next_cursor
@@ -158,3 +158,69 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
+
+
+
+# Bill scanning (OCR)
+OCR_BATCH_MAX_FILES = 50
+OCR_BATCH_WORKERS = int(os.getenv("OCR_BATCH_WORKERS", os.cpu_count() or 1))
+
+# Show the OCR backend chosen at startup (tesserocr or the pytesseract fallback)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "expenses.ocr_backends": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+
+# Payments
+PAYMENT_INTENT_WINDOW_MINUTES = 15   # repeat "Pay Now" inside this window reuses the PENDING payment
+PAYMENT_INTENT_TTL_HOURS = 24        # PENDING payments older than this are expired by cleanup
+RECONCILIATION_WINDOW_DAYS = 3       # statement credit may land this long after the payment was started
+WEBHOOK_MAX_ATTEMPTS = 5             # give up on a gateway event after this many failed applies
+SETTLEMENT_REMINDER_PENDING_DAYS = 3          # remind the payer once a PENDING settlement is this old
+SETTLEMENT_REMINDER_PAID_REQUESTED_DAYS = 2   # remind the receiver to confirm after this long
+SETTLEMENT_REMINDER_REPEAT_DAYS = 7           # don't remind about the same settlement more often than this
+
+
+# Outbound email queue
+EMAIL_QUEUE_MAX_ATTEMPTS = 5         # give up on a queued email after this many failed sends
+EMAIL_QUEUE_BATCH_SIZE = 100         # emails sent per SMTP connection by the worker
+EMAIL_QUEUE_CLAIM_MINUTES = 10       # a SENDING row whose worker died is retried after this
+
+
+# Shared cache - the unread-notification counters and pending-invite flags
+# must be the same for every worker process. Redis when REDIS_URL is set,
+# otherwise the database (run `python manage.py createcachetable` once).
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "paynion_cache",
+        }
+    }
+
+
+# Group invites
+GROUP_INVITE_TTL_DAYS = 14           # unaccepted invites stop working after this
+PENDING_INVITE_CACHE_SECONDS = 300   # dashboard's cached "has a pending invite" flag
+
+
+# Expense archive
+EXPENSE_ARCHIVE_AFTER_DAYS = 90      # settled expenses older than this move to the archive tables
+
+
+# Notifications
+NOTIFICATION_UNREAD_CACHE_SECONDS = 3600   # cached per-user unread counter (dropped on every write)
+NOTIFICATION_RETENTION_DAYS = 90           # read notifications older than this are pruned